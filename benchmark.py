@@ -0,0 +1,236 @@
+import argparse
+import io
+import json
+import os
+import platform
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stderr
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from compiled import compile_network
+from context import InferenceContext
+from experiments import run_vignettes_experiment_raw
+from helpers import get_symptom_nodes
+from inference import (
+    expected_counterfactuals,
+    expected_disablement,
+    expected_sufficiency,
+    get_evidence_from_casecard,
+    posterior_inference,
+)
+from preprocessing import convert_symptom_severity
+from synthetic import generate_dataset
+
+BENCHMARK_FILE = "benchmark_results.json"
+BASE_SIZE = (50, 100, 150)  # risks, diseases, symptoms at scale 1
+
+
+# ------------------------------------------------------------------------
+# TIMING HELPERS
+# ------------------------------------------------------------------------
+def best_of(fn, repeat=3):
+    """Best wall-clock time of fn() over `repeat` runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(fn):
+    """Peak traced allocation (bytes) while running fn()."""
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def thread_throughput(context, net_name, cards, threads, repeat=3):
+    """
+    Casecards per second scored by `threads` threads sharing one
+    InferenceContext, each scoring all of `cards`. The NumPy kernels drop
+    the GIL and an untimed context takes no locks, so this should grow
+    close to linearly with the threads, up to the core count.
+    """
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        def run():
+            list(pool.map(lambda _: context.scores(net_name, cards), range(threads)))
+
+        run()  # start the threads outside the timing
+        seconds = best_of(run, repeat)
+    return threads * len(cards) / seconds
+
+
+# ------------------------------------------------------------------------
+# BENCHMARK ONE SIZE
+# ------------------------------------------------------------------------
+def benchmark_size(scale, n_vignettes=50, repeat=3, seed=0, reference=False, threads=()):
+    """
+    Time every pipeline stage on a synthetic network of the given scale,
+    and the threaded InferenceContext throughput for each count in `threads`.
+    """
+    sizes = tuple(int(n * scale) for n in BASE_SIZE)
+    network_data, vignettes = generate_dataset({"A": sizes}, n_vignettes=n_vignettes, seed=seed)
+    cards = [v["card"] for v in vignettes.values()]
+    network = network_data["A"]
+    vignettes = convert_symptom_severity(vignettes)
+
+    diseases = [nid for nid, node in network.items() if node["label"] == "Disease"]
+    symptoms = get_symptom_nodes(network)
+    evidence = [get_evidence_from_casecard(v["card"]) for v in vignettes.values()]
+    compiled = compile_network(network)
+
+    def per_vignette(fn, net):
+        return best_of(lambda: [fn(net, e) for e in evidence], repeat) / len(evidence)
+
+    def run_all():
+        with redirect_stderr(io.StringIO()):  # keep tqdm out of the report
+            run_vignettes_experiment_raw(vignettes, network_data)
+
+    record = {
+        "scale": scale,
+        "n_risks": sizes[0],
+        "n_diseases": sizes[1],
+        "n_symptoms": sizes[2],
+        "n_edges": int(len(compiled.indices)),
+        "n_vignettes": n_vignettes,
+        "compile_s": best_of(lambda: compile_network(network), repeat),
+        "evidence_s": best_of(
+            lambda: [get_evidence_from_casecard(v["card"]) for v in vignettes.values()], repeat
+        ) / n_vignettes,
+        "posterior_s": per_vignette(posterior_inference, compiled),
+        "disablement_s": per_vignette(
+            lambda net, e: expected_disablement(net, e, diseases, symptoms), compiled
+        ),
+        "sufficiency_s": per_vignette(
+            lambda net, e: expected_sufficiency(net, e, diseases, symptoms), compiled
+        ),
+        "counterfactuals_s": per_vignette(
+            lambda net, e: expected_counterfactuals(net, e, diseases, symptoms), compiled
+        ),
+    }
+
+    run_s = best_of(run_all, repeat)
+    record["run_s"] = run_s
+    record["vignettes_per_s"] = n_vignettes / run_s if run_s else float("inf")
+    record["peak_memory_bytes"] = peak_memory(run_all)
+
+    if threads:
+        context = InferenceContext({"A": compiled})
+        rates = [thread_throughput(context, "A", cards, t, repeat) for t in threads]
+        # Relative to the first count; efficiency 1.0 is linear scaling
+        record["threads"] = [
+            {"threads": t, "cards_per_s": rate, "speedup": rate / rates[0],
+             "efficiency": rate / rates[0] * threads[0] / t}
+            for t, rate in zip(threads, rates)
+        ]
+
+    if reference:
+        # Original dict-of-dicts path (deepcopy per intervention); slow, so
+        # measured on a single vignette and a single repeat
+        e = evidence[0]
+        record["reference_posterior_s"] = best_of(lambda: posterior_inference(network, e), 1)
+        record["reference_disablement_s"] = best_of(
+            lambda: expected_disablement(network, e, diseases, symptoms), 1
+        )
+    return record
+
+
+def run_benchmarks(scales, n_vignettes=50, repeat=3, seed=0, reference_max_scale=0.0,
+                   threads=()):
+    results = []
+    for scale in scales:
+        print(f"> Benchmarking scale {scale:g} ...")
+        record = benchmark_size(
+            scale, n_vignettes=n_vignettes, repeat=repeat, seed=seed,
+            reference=scale <= reference_max_scale, threads=threads,
+        )
+        print(
+            f"  {record['n_diseases']} diseases, {record['n_edges']} edges: "
+            f"{record['vignettes_per_s']:.1f} vignettes/s, "
+            f"peak {record['peak_memory_bytes'] / 2**20:.1f} MiB"
+        )
+        for row in record.get("threads", []):
+            print(
+                f"  {row['threads']:3d} threads: {row['cards_per_s']:.1f} cards/s, "
+                f"speedup {row['speedup']:.2f} (efficiency {row['efficiency']:.2f})"
+            )
+        results.append(record)
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": seed,
+            "repeat": repeat,
+            "base_size": BASE_SIZE,
+        },
+        "results": results,
+    }
+
+
+# ------------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------------
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the inference pipeline on synthetic data")
+    parser.add_argument(
+        "--scales", type=float, nargs="+", default=[1, 2, 4],
+        help=f"Network size multipliers of the base size {BASE_SIZE} (risks, diseases, symptoms)"
+    )
+    parser.add_argument(
+        "--vignettes", type=int, default=50,
+        help="Synthetic casecards per size"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="Timing repeats (best run is kept)"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="Seed for the network and casecard generators"
+    )
+    parser.add_argument(
+        "--reference-max-scale", type=float, default=0.0,
+        help="Also time the original dict-based path for scales up to this value"
+    )
+    parser.add_argument(
+        "--threads", type=int, nargs="+", default=[],
+        help="Also measure InferenceContext throughput with these thread counts "
+             "(e.g. 1 2 4 8; speedups are relative to the first)"
+    )
+    parser.add_argument(
+        "--results", type=Path, default=Path("my_results"),
+        help="Output folder for benchmark_results.json"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if any(t < 1 for t in args.threads):
+        raise SystemExit("--threads counts must be at least 1")
+    args.results.mkdir(parents=True, exist_ok=True)
+    report = run_benchmarks(
+        args.scales, n_vignettes=args.vignettes, repeat=args.repeat,
+        seed=args.seed, reference_max_scale=args.reference_max_scale, threads=args.threads,
+    )
+    path = args.results / BENCHMARK_FILE
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n>> Benchmark results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
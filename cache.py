@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from constants import NETWORKS_FILE
+
+# ------------------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------------------
+CACHE_DIRNAME = "cache"       # on-disk layer lives under the results folder
+DEFAULT_CACHE_SIZE = 1024     # in-memory LRU entries
+CACHE_VERSION = 1             # bump when the cached value layout changes
+
+
+# ------------------------------------------------------------------------
+# KEYS
+# ------------------------------------------------------------------------
+def evidence_key(network_name, evidence: dict, **options) -> str:
+    """
+    Content hash of (network name, evidence) with canonical key order.
+    Run options that change the scores (e.g. top_k pruning, multilayer
+    propagation) are part of the key when set; None means the default.
+    """
+    parts = [network_name, evidence]
+    options = {name: value for name, value in options.items() if value is not None}
+    if options:
+        parts.append(options)
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def file_digest(path) -> str:
+    """sha256 of a file's bytes."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def config_fingerprint(datapath, filename=NETWORKS_FILE) -> str:
+    """
+    Fingerprint of everything a cached result depends on besides the
+    evidence: the network file contents, RISK_BOOST and SEVERITY_MAPPING.
+    Any change yields a new fingerprint, so old entries are never read.
+    """
+    import inference
+    import preprocessing
+
+    payload = json.dumps(
+        {
+            "version": CACHE_VERSION,
+            "networks": file_digest(Path(datapath) / filename),
+            "risk_boost": inference.RISK_BOOST,
+            "severity_mapping": preprocessing.SEVERITY_MAPPING,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ------------------------------------------------------------------------
+# CACHE
+# ------------------------------------------------------------------------
+class ResultCache:
+    """
+    Two-level cache of per-evidence results:
+
+      - an in-memory LRU bounded to `maxsize` entries
+      - an optional on-disk layer (one pickle per key) in `directory`,
+        namespaced by the config fingerprint
+
+    Entries written under another fingerprint are simply never looked up,
+    which is how network / RISK_BOOST / SEVERITY_MAPPING changes invalidate
+    the cache.
+    """
+
+    def __init__(self, fingerprint: str, maxsize=DEFAULT_CACHE_SIZE, directory=None):
+        self.fingerprint = fingerprint
+        self.maxsize = maxsize
+        self.directory = None
+        if directory is not None:
+            self.directory = Path(directory) / fingerprint[:16]
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _disk_path(self, key):
+        return self.directory / f"{key}.p"
+
+    def get(self, key):
+        """Return the cached value for key, or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        if self.directory is not None:
+            path = self._disk_path(key)
+            if path.exists():
+                try:
+                    with open(path, "rb") as f:
+                        value = pickle.load(f)
+                except (OSError, EOFError, pickle.UnpicklingError):
+                    value = None
+                if value is not None:
+                    self._remember(key, value)
+                    with self._lock:
+                        self.hits += 1
+                    return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """Store value in memory and, if enabled, on disk."""
+        self._remember(key, value)
+        if self.directory is not None:
+            # Write-then-rename so concurrent workers never read a partial file
+            path = self._disk_path(key)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f)
+            os.replace(tmp, path)
+
+    def _remember(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    def __len__(self):
+        return len(self._memory)
+
+    def __getstate__(self):
+        # Ship only the configuration to pool workers; each starts empty
+        state = self.__dict__.copy()
+        state["_memory"] = OrderedDict()
+        state["_lock"] = None
+        state["hits"] = state["misses"] = 0
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def make_result_cache(datapath, maxsize=DEFAULT_CACHE_SIZE, results_dir=None):
+    """
+    Build a ResultCache for the networks under datapath. The on-disk layer is
+    enabled when results_dir is given and lives in results_dir / "cache".
+    """
+    directory = Path(results_dir) / CACHE_DIRNAME if results_dir is not None else None
+    return ResultCache(config_fingerprint(datapath), maxsize=maxsize, directory=directory)
@@ -0,0 +1,261 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+METHODS = ("posterior", "disablement", "sufficiency")
+# Full precision by default: float32 ties posteriors closer than ~1e-7 and
+# changes ranks. NaN marks a node that has no score for that vignette.
+SCORE_DTYPE = np.float64
+
+# What a run keeps per vignette:
+#   full     → every scored node (Symptom and Risk posteriors included)
+#   diseases → Disease scores only
+#   top_k    → the K best diseases per method, plus the true disease's
+#              rank and score
+STORE_FULL = "full"
+STORE_DISEASES = "diseases"
+STORE_TOP_K = "top_k"
+STORE_MODES = (STORE_FULL, STORE_DISEASES, STORE_TOP_K)
+DEFAULT_STORE_TOP_K = 20
+
+
+# ------------------------------------------------------------------------
+# COLUMNAR RESULTS
+# ------------------------------------------------------------------------
+class ColumnarResults(Mapping):
+    """
+    Results stored as one dense (vignettes × nodes) score matrix per method,
+    all sharing one node-ID index. Read-only Mapping view with the same shape
+    as experimental_results.json ({v_id: {method: {node_id: score}}}), so the
+    existing analysis code can use it unchanged; rows are only turned into
+    dicts when accessed.
+    """
+
+    def __init__(self, vignette_ids, ids, scores: dict):
+        self.vignette_ids = [str(v) for v in vignette_ids]
+        self.ids = [str(i) for i in ids]
+        self.scores = scores
+        self.row = {v_id: r for r, v_id in enumerate(self.vignette_ids)}
+        self.col = {nid: c for c, nid in enumerate(self.ids)}
+
+    def matrix(self, method) -> np.ndarray:
+        return self.scores[method]
+
+    def row_dict(self, method, row: int) -> dict:
+        values = self.scores[method][row]
+        present = np.flatnonzero(~np.isnan(values))
+        return {self.ids[c]: float(values[c]) for c in present}
+
+    def __getitem__(self, v_id):
+        r = self.row[v_id]
+        return {method: self.row_dict(method, r) for method in self.scores}
+
+    def __iter__(self):
+        return iter(self.vignette_ids)
+
+    def __len__(self):
+        return len(self.vignette_ids)
+
+
+class ColumnarBuilder:
+    """
+    Accumulates {v_id: {node_id: score}} dicts one method at a time and pads
+    them onto a shared node index. Rows with the same key order (i.e. the
+    same network) reuse one column lookup.
+    """
+
+    def __init__(self, vignette_ids):
+        self.vignette_ids = list(vignette_ids)
+        self.index = {}
+        self._methods = {}
+        self._cols_cache = {}
+
+    def _columns(self, keys):
+        cols = self._cols_cache.get(keys)
+        if cols is None:
+            cols = np.array(
+                [self.index.setdefault(k, len(self.index)) for k in keys], dtype=np.intp
+            )
+            self._cols_cache[keys] = cols
+        return cols
+
+    def add_method(self, method, results: dict):
+        rows = []
+        for v_id in self.vignette_ids:
+            scores = results.get(v_id, {})
+            cols = self._columns(tuple(scores))
+            vals = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+            rows.append((cols, vals))
+        self._methods[method] = rows
+
+    def build(self, dtype=SCORE_DTYPE) -> ColumnarResults:
+        n_rows, n_cols = len(self.vignette_ids), len(self.index)
+        scores = {}
+        for method, rows in self._methods.items():
+            matrix = np.full((n_rows, n_cols), np.nan, dtype=dtype)
+            for r, (cols, vals) in enumerate(rows):
+                matrix[r, cols] = vals
+            scores[method] = matrix
+        return ColumnarResults(self.vignette_ids, list(self.index), scores)
+
+
+def build_columnar(posteriors, disablements, sufficiencies, dtype=SCORE_DTYPE):
+    """Columnar form of the three per-method result dicts."""
+    builder = ColumnarBuilder(posteriors)
+    for method, results in zip(METHODS, (posteriors, disablements, sufficiencies)):
+        builder.add_method(method, results)
+    return builder.build(dtype)
+
+
+# ------------------------------------------------------------------------
+# .npz I/O
+# ------------------------------------------------------------------------
+def save_columnar(results: ColumnarResults, path):
+    """Write an uncompressed .npz: vignette_ids, ids and one matrix per method."""
+    np.savez(
+        path,
+        vignette_ids=np.array(results.vignette_ids, dtype=str),
+        ids=np.array(results.ids, dtype=str),
+        **{method: results.scores[method] for method in results.scores},
+    )
+
+
+def load_columnar(path) -> ColumnarResults:
+    """Load a results .npz written by save_columnar."""
+    with np.load(path, allow_pickle=False) as data:
+        scores = {method: data[method] for method in METHODS if method in data.files}
+        return ColumnarResults(data["vignette_ids"].tolist(), data["ids"].tolist(), scores)
+
+
+# ------------------------------------------------------------------------
+# TOP-K RESULTS (memory-bounded)
+# ------------------------------------------------------------------------
+def disease_scores(posterior: dict, diseases) -> dict:
+    """The posterior restricted to the diseases (e.g. the keys of a disablement dict)."""
+    return {d: posterior[d] for d in diseases if d in posterior}
+
+
+def top_k_entry(scores: dict, k, true_id=None) -> dict:
+    """
+    The k best (id, score) pairs of one method, in a stable descending
+    order (ties keep dict order, like sorted()), and the 0-based rank and
+    score of true_id in that order (-1 / None when it was not scored).
+    NaN scores (diseases skipped by --prune-top-k) are never kept.
+    """
+    ids = list(scores)
+    values = np.fromiter(scores.values(), dtype=np.float64, count=len(ids))
+    order = np.argsort(-values, kind="stable")
+    order = order[~np.isnan(values[order])]
+    entry = {"top": [[ids[i], float(values[i])] for i in order[:k]], "true_rank": -1,
+             "true_score": None}
+    if true_id in scores and not np.isnan(scores[true_id]):
+        t = scores[true_id]
+        pos = ids.index(true_id)
+        entry["true_rank"] = int((values > t).sum() + (values[:pos] == t).sum())
+        entry["true_score"] = float(t)
+    return entry
+
+
+class TopKResults(Mapping):
+    """
+    The K best diseases per vignette and method against one shared disease
+    index: (vignettes × K) int32 columns (-1 pads) and SCORE_DTYPE scores, plus
+    each vignette's true-disease rank (exact, over all diseases) and score.
+    As a Mapping it looks like experimental_results.json restricted to
+    each vignette's top K.
+    """
+
+    def __init__(self, vignette_ids, ids, top_cols: dict, top_scores: dict,
+                 true_ranks: dict, true_scores: dict):
+        self.vignette_ids = [str(v) for v in vignette_ids]
+        self.ids = [str(i) for i in ids]
+        self.top_cols = top_cols
+        self.top_scores = top_scores
+        self.true_ranks = true_ranks
+        self.true_scores = true_scores
+        self.row = {v_id: r for r, v_id in enumerate(self.vignette_ids)}
+        self.col = {nid: c for c, nid in enumerate(self.ids)}
+
+    @property
+    def methods(self):
+        return tuple(self.top_cols)
+
+    def row_dict(self, method, row: int) -> dict:
+        cols, values = self.top_cols[method][row], self.top_scores[method][row]
+        return {self.ids[c]: float(v) for c, v in zip(cols, values) if c >= 0}
+
+    def __getitem__(self, v_id):
+        r = self.row[v_id]
+        return {method: self.row_dict(method, r) for method in self.top_cols}
+
+    def __iter__(self):
+        return iter(self.vignette_ids)
+
+    def __len__(self):
+        return len(self.vignette_ids)
+
+
+class TopKBuilder:
+    """Packs top_k_entry records (one per vignette and method) into a TopKResults."""
+
+    def __init__(self, k):
+        self.k = k
+        self.vignette_ids = []
+        self.index = {}
+        self._rows = {method: [] for method in METHODS}
+
+    def add(self, v_id, entries: dict):
+        self.vignette_ids.append(v_id)
+        for method in METHODS:
+            entry = entries[method]
+            cols = [self.index.setdefault(nid, len(self.index)) for nid, _ in entry["top"]]
+            scores = [score for _, score in entry["top"]]
+            true_score = entry["true_score"]
+            self._rows[method].append((
+                cols, scores, entry["true_rank"], np.nan if true_score is None else true_score
+            ))
+
+    def build(self, dtype=SCORE_DTYPE) -> TopKResults:
+        n = len(self.vignette_ids)
+        top_cols, top_scores, true_ranks, true_scores = {}, {}, {}, {}
+        for method, rows in self._rows.items():
+            cols = np.full((n, self.k), -1, dtype=np.int32)
+            scores = np.full((n, self.k), np.nan, dtype=dtype)
+            for r, (c, v, _, _) in enumerate(rows):
+                cols[r, :len(c)] = c
+                scores[r, :len(v)] = v
+            top_cols[method], top_scores[method] = cols, scores
+            true_ranks[method] = np.array([row[2] for row in rows], dtype=np.int32)
+            true_scores[method] = np.array([row[3] for row in rows], dtype=dtype)
+        return TopKResults(
+            self.vignette_ids, list(self.index), top_cols, top_scores, true_ranks, true_scores
+        )
+
+
+def save_top_k(results: TopKResults, path):
+    """Write an uncompressed .npz: vignette_ids, ids and four arrays per method."""
+    arrays = {}
+    for method in results.methods:
+        arrays[f"{method}_top_cols"] = results.top_cols[method]
+        arrays[f"{method}_top_scores"] = results.top_scores[method]
+        arrays[f"{method}_true_rank"] = results.true_ranks[method]
+        arrays[f"{method}_true_score"] = results.true_scores[method]
+    np.savez(
+        path,
+        vignette_ids=np.array(results.vignette_ids, dtype=str),
+        ids=np.array(results.ids, dtype=str),
+        **arrays,
+    )
+
+
+def load_top_k(path) -> TopKResults:
+    """Load a top-K results .npz written by save_top_k."""
+    with np.load(path, allow_pickle=False) as data:
+        methods = [m for m in METHODS if f"{m}_top_cols" in data.files]
+        return TopKResults(
+            data["vignette_ids"].tolist(), data["ids"].tolist(),
+            {m: data[f"{m}_top_cols"] for m in methods},
+            {m: data[f"{m}_top_scores"] for m in methods},
+            {m: data[f"{m}_true_rank"] for m in methods},
+            {m: data[f"{m}_true_score"] for m in methods},
+        )
@@ -0,0 +1,290 @@
+import numpy as np
+
+# ------------------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------------------
+EPSILON = 1e-9  # same epsilon as helpers.noisy_or
+
+SCORED_LABELS = ("Disease", "Symptom", "Risk")
+
+# Propagation modes:
+#   one_hop    → a node's Noisy-OR reads its parents' *evidence* (the
+#                original posterior_inference); unobserved parents count 0
+#   multilayer → nodes are evaluated in topological order and read their
+#                parents' computed values; observed nodes are clamped
+ONE_HOP = "one_hop"
+MULTILAYER = "multilayer"
+PROPAGATION_MODES = (ONE_HOP, MULTILAYER)
+
+# Everything a CompiledNetwork derives from the network dict besides
+# node_ids / labels; enough to rebuild it without the dict (see networks.py)
+ARRAY_FIELDS = (
+    "disease_idx", "symptom_idx", "risk_idx", "noisy_or_mask", "scored_idx", "link",
+    "indptr", "indices", "has_parents", "edge_parents", "edge_link", "segment_starts",
+)
+
+
+def _link_strength(node: dict) -> float:
+    """1 − CPT[parent=0], or NaN when CPT[0] is not a scalar."""
+    leak = node.get("cpt", [1.0, 0.0])[0]
+    if isinstance(leak, (list, tuple, dict)):
+        return np.nan
+    return 1.0 - leak
+
+
+# ------------------------------------------------------------------------
+# COMPILED NETWORK
+# ------------------------------------------------------------------------
+class CompiledNetwork:
+    """
+    Array-backed view of one network dict, built once and reused for every
+    vignette:
+
+      - node_ids / index : node ID <-> integer position
+      - link             : 1 − CPT[parent=0] per node (float64, contiguous)
+      - indptr / indices : parent structure in CSR form, i.e. the parents of
+                           node i are indices[indptr[i]:indptr[i + 1]]
+
+    A posterior pass is then a gather over `indices`, a clamp and a
+    segmented product, instead of a dict walk per node.
+    """
+
+    def __init__(self, network: dict):
+        self.node_ids = list(network)
+        self.index = {nid: i for i, nid in enumerate(self.node_ids)}
+        n = len(self.node_ids)
+
+        labels = [network[nid].get("label") for nid in self.node_ids]
+        self.labels = labels
+        self.disease_idx = np.array(
+            [i for i, lab in enumerate(labels) if lab == "Disease"], dtype=np.intp
+        )
+        self.symptom_idx = np.array(
+            [i for i, lab in enumerate(labels) if lab == "Symptom"], dtype=np.intp
+        )
+        self.risk_idx = np.array(
+            [i for i, lab in enumerate(labels) if lab == "Risk"], dtype=np.intp
+        )
+        # Disease/Symptom nodes get a Noisy-OR value, Risk nodes echo evidence
+        self.noisy_or_mask = np.array(
+            [lab in ("Disease", "Symptom") for lab in labels], dtype=bool
+        )
+        self.scored_idx = np.array(
+            [i for i, lab in enumerate(labels) if lab in SCORED_LABELS], dtype=np.intp
+        )
+
+        # link_strength = 1 − leak_prob = 1 − CPT[parent=0]; nodes with a
+        # multi-state CPT (e.g. the duration node) get NaN and must never be
+        # used as a parent.
+        self.link = np.array(
+            [_link_strength(network[nid]) for nid in self.node_ids],
+            dtype=np.float64,
+        )
+
+        indptr = np.zeros(n + 1, dtype=np.intp)
+        indices = []
+        for i, nid in enumerate(self.node_ids):
+            parents = network[nid].get("parents", [])
+            indices.extend(self.index[pid] for pid in parents)
+            indptr[i + 1] = len(indices)
+        self.indptr = indptr
+        self.indices = np.array(indices, dtype=np.intp)
+
+        # Only Disease/Symptom nodes with parents get a Noisy-OR product.
+        # Their edges are packed contiguously so that empty segments never
+        # reach np.multiply.reduceat.
+        n_parents = np.diff(indptr)
+        self.has_parents = (n_parents > 0) & self.noisy_or_mask
+        keep = np.repeat(self.has_parents, n_parents)
+        self.edge_parents = self.indices[keep]
+        self.edge_link = self.link[self.edge_parents]
+        if np.isnan(self.edge_link).any():
+            bad = sorted({self.node_ids[i] for i in self.edge_parents[np.isnan(self.edge_link)]})
+            raise ValueError(f"Parent nodes without a scalar leak CPT: {bad}")
+        self.segment_starts = np.zeros(int(self.has_parents.sum()), dtype=np.intp)
+        np.cumsum(n_parents[self.has_parents][:-1], out=self.segment_starts[1:])
+        self._levels = None
+        self._schedule = None
+
+    @classmethod
+    def from_arrays(cls, node_ids, labels, arrays: dict, levels=None):
+        """
+        Rebuild a compiled network from `to_arrays` output (e.g. memory-mapped
+        from the network cache) without the network dict.
+        """
+        self = cls.__new__(cls)
+        self.node_ids = list(node_ids)
+        self.index = {nid: i for i, nid in enumerate(self.node_ids)}
+        self.labels = list(labels)
+        for name in ARRAY_FIELDS:
+            setattr(self, name, arrays[name])
+        self._levels = levels
+        self._schedule = None
+        return self
+
+    def to_arrays(self) -> dict:
+        return {name: getattr(self, name) for name in ARRAY_FIELDS}
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @property
+    def disease_ids(self):
+        return [self.node_ids[i] for i in self.disease_idx]
+
+    @property
+    def symptom_ids(self):
+        return [self.node_ids[i] for i in self.symptom_idx]
+
+    # --------------------------------------------------------------------
+    # EVIDENCE <-> ARRAYS
+    # --------------------------------------------------------------------
+    def observed_mask(self, evidence: dict) -> np.ndarray:
+        """Boolean mask of the nodes that appear in the evidence (any value)."""
+        mask = np.zeros(len(self.node_ids), dtype=bool)
+        for nid in evidence:
+            i = self.index.get(nid)
+            if i is not None:
+                mask[i] = True
+        return mask
+
+    def evidence_vector(self, evidence: dict) -> np.ndarray:
+        """Dense evidence vector aligned with node_ids; unknown IDs are ignored."""
+        x = np.zeros(len(self.node_ids), dtype=np.float64)
+        for nid, value in evidence.items():
+            i = self.index.get(nid)
+            if i is not None:
+                x[i] = value
+        return x
+
+    def to_dict(self, values: np.ndarray, idx=None) -> dict:
+        """Map a value vector back to {node_id: float} over the given indices."""
+        if idx is None:
+            idx = self.scored_idx
+        return {self.node_ids[i]: float(values[i]) for i in idx}
+
+    # --------------------------------------------------------------------
+    # INFERENCE KERNELS
+    # --------------------------------------------------------------------
+    def noisy_or(self, x: np.ndarray, edge_link=None, epsilon=EPSILON) -> np.ndarray:
+        """
+        Vectorized helpers.noisy_or for every Disease/Symptom node at once.
+        `x` is an evidence vector (n,) or a batch of them (B, n); `edge_link`
+        optionally overrides the per-edge link strengths (same leading shape).
+        Returns the Noisy-OR value of each node with parents, ordered as
+        `segment_starts`.
+        """
+        if edge_link is None:
+            edge_link = self.edge_link
+        adjusted = np.minimum(edge_link * x[..., self.edge_parents], 1.0)
+        terms = 1.0 - (1.0 - adjusted) + epsilon
+        if not len(self.segment_starts):
+            return terms[..., :0]
+        return 1.0 - np.multiply.reduceat(terms, self.segment_starts, axis=-1)
+
+    # --------------------------------------------------------------------
+    # MULTI-LAYER PROPAGATION
+    # --------------------------------------------------------------------
+    def topological_levels(self) -> np.ndarray:
+        """
+        Level of every node in the parent DAG: 0 for nodes without parents,
+        otherwise 1 + the deepest parent. Raises ValueError on a cycle.
+        Computed once per network.
+        """
+        if self._levels is None:
+            self._levels = self._compute_levels()
+        return self._levels
+
+    def _compute_levels(self) -> np.ndarray:
+        n = len(self.node_ids)
+        n_parents = np.diff(self.indptr)
+        has = n_parents > 0
+        starts = self.indptr[:-1][has]
+        level = np.zeros(n, dtype=np.intp)
+        for _ in range(n + 1):
+            new = np.zeros(n, dtype=np.intp)
+            if len(starts):
+                new[has] = np.maximum.reduceat(level[self.indices], starts) + 1
+            if np.array_equal(new, level):
+                return level
+            level = new
+        raise ValueError("network has a cycle; multilayer propagation needs a DAG")
+
+    def schedule(self):
+        """
+        Per-level evaluation plan, built once: for each level ≥ 1, the
+        Noisy-OR nodes on it, their packed edge positions, the segment
+        starts within those edges, and the edges' parents and links.
+        """
+        if self._schedule is None:
+            level = self.topological_levels()
+            seg_node = np.flatnonzero(self.has_parents)
+            seg_len = np.diff(np.append(self.segment_starts, len(self.edge_parents)))
+            seg_level = level[seg_node]
+            plan = []
+            for lv in range(1, int(level.max(initial=0)) + 1):
+                segs = np.flatnonzero(seg_level == lv)
+                if not len(segs):
+                    continue
+                lengths = seg_len[segs]
+                edges = np.concatenate([
+                    np.arange(s, s + k) for s, k in zip(self.segment_starts[segs], lengths)
+                ]).astype(np.intp)
+                starts = np.zeros(len(segs), dtype=np.intp)
+                np.cumsum(lengths[:-1], out=starts[1:])
+                plan.append((
+                    seg_node[segs], edges, starts,
+                    self.edge_parents[edges], self.edge_link[edges],
+                ))
+            self._schedule = plan
+        return self._schedule
+
+    def propagate(self, x: np.ndarray, observed: np.ndarray, edge_link=None,
+                  epsilon=EPSILON) -> np.ndarray:
+        """
+        Multi-layer Noisy-OR over an evidence vector (or batch). Nodes are
+        evaluated level by level, each exactly once, from the already
+        computed values of their parents. Observed nodes keep their
+        evidence value; unobserved nodes without a Noisy-OR (no parents, or
+        Risk) are 0, as in the one-hop pass.
+        """
+        if edge_link is not None:
+            # A batch of link overrides (e.g. interventions) shares one evidence row
+            shape = np.broadcast_shapes(x.shape[:-1], edge_link.shape[:-1]) + x.shape[-1:]
+            x = np.broadcast_to(x, shape)
+        observed = np.broadcast_to(observed, x.shape)
+        values = np.where(observed, x, 0.0)
+        for nodes, edges, starts, parents, link in self.schedule():
+            if edge_link is not None:
+                link = edge_link[..., edges]
+            adjusted = np.minimum(link * values[..., parents], 1.0)
+            terms = 1.0 - (1.0 - adjusted) + epsilon
+            computed = 1.0 - np.multiply.reduceat(terms, starts, axis=-1)
+            values[..., nodes] = np.where(observed[..., nodes], x[..., nodes], computed)
+        return values
+
+    def posterior(self, x: np.ndarray, epsilon=EPSILON) -> np.ndarray:
+        """
+        Full posterior pass over an evidence vector (or batch): Noisy-OR for
+        Disease/Symptom nodes, evidence passthrough for Risk nodes, zero
+        elsewhere (including Disease/Symptom nodes without parents).
+        """
+        values = np.zeros(x.shape, dtype=np.float64)
+        values[..., self.has_parents] = self.noisy_or(x, epsilon=epsilon)
+        values[..., self.risk_idx] = x[..., self.risk_idx]
+        return values
+
+
+def compile_network(network: dict) -> CompiledNetwork:
+    """Build the array-backed form of a single network dict (compiled ones pass through)."""
+    if isinstance(network, CompiledNetwork):
+        return network
+    return CompiledNetwork(network)
+
+
+def compile_networks(network_data: dict) -> dict:
+    """
+    Compile every network in a {name: network} mapping. Already compiled
+    networks (e.g. from helpers.load_compiled_networks) are kept as they are.
+    """
+    return {name: compile_network(net) for name, net in network_data.items()}
@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+from synthetic import generate_network
+
+
+# ------------------------------------------------------------------------
+# CASES
+# ------------------------------------------------------------------------
+# With leaks in [0, 1] (as generate_network draws them) an intervention only
+# ever raises children on disable and lowers them on force, so both scores
+# are 0.0 everywhere. Leaks outside [0, 1] (network A has one below 0)
+# give links above 1 or below 0, and non-zero deltas.
+SEEDS = (1, 2, 5)
+
+
+def node_ids(network, label):
+    return [nid for nid, node in network.items() if node["label"] == label]
+
+
+def noisy_or_case(seed, leaks=(-1.5, 2.0)):
+    """A small synthetic network, disease leaks drawn from `leaks`, and evidence."""
+    network = generate_network(6, 10, 15, disease_parents=(1, 4), seed=seed)
+    rng = random.Random(seed)
+    for did in node_ids(network, "Disease"):
+        network[did]["cpt"][0] = rng.uniform(*leaks)
+    evidence = {sid: rng.uniform(0.2, 1.2) for sid in node_ids(network, "Symptom")[:8]}
+    evidence.update((rid, 1.0) for rid in node_ids(network, "Risk")[:3])
+    evidence.update((did, rng.uniform(0.1, 1.0)) for did in node_ids(network, "Disease")[:5])
+    return network, evidence
+
+
+@pytest.fixture(params=SEEDS)
+def case(request):
+    """(network, evidence, diseases, symptoms) for each seed in SEEDS."""
+    network, evidence = noisy_or_case(request.param)
+    return network, evidence, node_ids(network, "Disease"), node_ids(network, "Symptom")
@@ -23,6 +23,12 @@ DATA_PATH = Path(__file__).parent / "data"
 NETWORKS_FILE = "example_networks.json"
 VIGNETTES_FILE = "vignettes.json"
 RESULTS_FILE = "experimental_results.json"
+RESULTS_STREAM_FILE = "experimental_results.jsonl"  # append-only, one vignette per line
+RESULTS_COLUMNAR_FILE = "experimental_results.npz"  # shared node index + score matrices
+RESULTS_TOP_K_FILE = "experimental_results_topk.npz"  # --store top_k: K best diseases per method
+RESULTS_TOP_K_JSON_FILE = "experimental_results_topk.json"  # --store top_k: JSON of the same records
+RESULTS_STATS_FILE = "experimental_statistics.json"  # cached bootstrap CIs and doctor tests
+RESULTS_RUN_FILE = "experimental_run.json"  # run options evaluation depends on (--prune-top-k)
 
 RESULTS_OBS_FILE = "results_obs.p"
 RESULTS_CF_DISABLEMENT_FILE = "results_counter_diss.p"
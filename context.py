@@ -0,0 +1,250 @@
+import copy
+from types import MappingProxyType
+
+import numpy as np
+
+from compiled import CompiledNetwork, MULTILAYER, ONE_HOP, PROPAGATION_MODES
+from counterfactual import engine_for
+from evidence import (
+    EvidenceTemplate,
+    encode_casecards,
+    evidence_settings,
+    parse_casecard,
+    severity_level_value,
+)
+from helpers import load_compiled_networks
+from session import DEFAULT_TOP_K, METHODS
+
+# ------------------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------------------
+# Casecards per (rows × nodes) kernel call. Large blocks keep each call in
+# NumPy's compiled loops (which run without the GIL) for longer, while
+# bounding the (rows × affected edges) temporaries of a counterfactual batch.
+BLOCK_ROWS = 256
+
+# Constructor settings a context copies and `replace` can change
+SETTINGS = ("severity_mapping", "risk_boost", "thresh", "propagation", "block_rows", "timer")
+
+# What a malformed casecard raises while it is parsed
+CARD_ERRORS = (AttributeError, KeyError, TypeError, ValueError)
+
+
+def _readonly(value):
+    """Read-only views of an array, or of the arrays in a list / tuple."""
+    if isinstance(value, np.ndarray):
+        view = value.view()
+        view.setflags(write=False)
+        return view
+    if isinstance(value, (list, tuple)):
+        return type(value)(_readonly(item) for item in value)
+    return value
+
+
+def _freeze(compiled: CompiledNetwork, propagation, timer=None):
+    """
+    A private copy of a compiled network and its engine for a context,
+    whose stage timings go to `timer` (None: not timed).
+    Everything the network creates lazily (counterfactual engine, and for
+    multilayer the levels, schedule and descendant sets) is built first, so
+    concurrent scoring never races on a first use. The copies hold
+    read-only views of the arrays: no memory is duplicated, and the
+    original network (e.g. the one helpers.load_compiled_networks shares)
+    stays writable for its other users.
+    """
+    engine = engine_for(compiled)
+    if propagation == MULTILAYER:
+        compiled.schedule()
+        engine.descendants()
+    frozen, frozen_engine = copy.copy(compiled), copy.copy(engine)
+    for obj in (frozen, frozen_engine):
+        vars(obj).update({name: _readonly(value) for name, value in vars(obj).items()})
+    vars(frozen).pop("_plan", None)
+    frozen._cf_engine = frozen_engine
+    frozen_engine.compiled = frozen
+    frozen_engine.timer = timer
+    return frozen, frozen_engine
+
+
+def _rank_rows(matrix: np.ndarray, disease_ids, top_ks):
+    """session.rank_diseases for every row of a score matrix, with one argsort."""
+    top_ks = [len(disease_ids) if top_k is None else top_k for top_k in top_ks]
+    order = np.argsort(-matrix, axis=1, kind="stable")[:, :max(top_ks, default=0)]
+    return [
+        [[disease_ids[j], float(row[j])] for j in cols[:top_k]]
+        for row, cols, top_k in zip(matrix, order, top_ks)
+    ]
+
+
+# ------------------------------------------------------------------------
+# THREAD-SAFE INFERENCE CONTEXT
+# ------------------------------------------------------------------------
+class InferenceContext:
+    """
+    Compiled networks and scoring settings, fixed at construction, for
+    scoring casecards from many threads at once.
+
+    Nothing in a context changes after __init__: the settings are its own
+    copies (unset ones are taken from inference.RISK_BOOST and
+    preprocessing.SEVERITY_MAPPING when the context is built, and later
+    changes to those globals do not reach it), the networks are a read-only
+    mapping of private copies whose arrays are read-only views, and scoring reads casecards without modifying them (no
+    severity_numeric is attached). Every call works on its own arrays, so
+    threads need no locks, and the NumPy kernels drop the GIL while they
+    run over a block of casecards. `replace` derives a context with other
+    settings that shares the same networks.
+
+    thresh is the symptom-presence threshold of CounterfactualEngine.scores
+    (None, the default, counts every symptom as the pipeline does); it
+    applies to one-hop propagation only.
+
+    Scoring is not timed by default: the process-wide StageTimer takes a
+    lock per stage, which threads would contend on. Pass an
+    instrumentation.StageTimer as `timer` to collect this context's stage
+    timings (it is shared by every thread using the context).
+    """
+
+    __slots__ = ("networks", "engines") + SETTINGS
+
+    def __init__(self, compiled_networks, severity_mapping=None, risk_boost=None, thresh=None,
+                 propagation=ONE_HOP, block_rows=BLOCK_ROWS, timer=None):
+        if propagation not in PROPAGATION_MODES:
+            raise ValueError(f"unknown propagation '{propagation}'")
+        if thresh is not None and propagation == MULTILAYER:
+            raise ValueError("thresh is only supported with one-hop propagation")
+        severity_mapping, risk_boost = evidence_settings(severity_mapping, risk_boost)
+        frozen = {
+            name: _freeze(compiled, propagation, timer)
+            for name, compiled in compiled_networks.items()
+        }
+        init = object.__setattr__
+        init(self, "networks", MappingProxyType({name: c for name, (c, _) in frozen.items()}))
+        init(self, "engines", MappingProxyType({name: e for name, (_, e) in frozen.items()}))
+        init(self, "severity_mapping", MappingProxyType(dict(severity_mapping)))
+        init(self, "risk_boost", float(risk_boost))
+        init(self, "thresh", None if thresh is None else float(thresh))
+        init(self, "propagation", propagation)
+        init(self, "block_rows", max(1, int(block_rows)))
+        init(self, "timer", timer)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("InferenceContext is immutable; use replace() for other settings")
+
+    @classmethod
+    def from_datapath(cls, datapath, **settings):
+        """Context over the validated, cached networks of a data folder."""
+        return cls(load_compiled_networks(datapath), **settings)
+
+    def replace(self, **settings) -> "InferenceContext":
+        """A new context with some settings changed, sharing these networks."""
+        current = {name: getattr(self, name) for name in SETTINGS}
+        return InferenceContext(self.networks, **{**current, **settings})
+
+    # --------------------------------------------------------------------
+    # EVIDENCE
+    # --------------------------------------------------------------------
+    def evidence(self, card) -> dict:
+        """
+        inference.get_evidence_from_casecard under this context's severity
+        mapping and risk boost, for a raw or converted casecard.
+        """
+        symptoms, risks = parse_casecard(card)
+        evidence = {
+            sid: severity_level_value(level, self.severity_mapping) for sid, level in symptoms
+        }
+        evidence.update((rid, self.risk_boost) for rid in risks)
+        return evidence
+
+    # --------------------------------------------------------------------
+    # SCORING
+    # --------------------------------------------------------------------
+    def scores(self, net_name, cards) -> dict:
+        """
+        {method: (cards × diseases) matrix} of posterior, disablement and
+        sufficiency scores for casecards of one network, diseases in
+        compiled.disease_idx order. Raises KeyError for an unknown network.
+        """
+        encoded = encode_casecards(
+            self.networks[net_name], cards,
+            severity_mapping=self.severity_mapping, risk_boost=self.risk_boost,
+        )
+        return self._scores(net_name, encoded)
+
+    def _scores(self, net_name, encoded) -> dict:
+        compiled = self.networks[net_name]
+        engine = self.engines[net_name]
+        disease_idx, symptom_idx = compiled.disease_idx, compiled.symptom_idx
+        out = {method: np.zeros((len(encoded), len(disease_idx))) for method in METHODS}
+
+        for start in range(0, len(encoded), self.block_rows):
+            stop = min(start + self.block_rows, len(encoded))
+            x = encoded.dense(start, stop)
+            if self.propagation == MULTILAYER:
+                observed = encoded.observed(start, stop)
+                for row in range(len(x)):
+                    values = compiled.propagate(x[row], observed[row])
+                    out["posterior"][start + row] = values[disease_idx]
+                    for method, mode in METHODS.items():
+                        if mode is not None:
+                            out[method][start + row] = engine.propagated_scores(
+                                x[row], observed[row], disease_idx, symptom_idx, mode,
+                                factual=values,
+                            )
+                continue
+
+            factual = engine.factual(x)
+            out["posterior"][start:stop] = factual[:, disease_idx]
+            for method, mode in METHODS.items():
+                if mode is not None:
+                    out[method][start:stop] = engine.scores(
+                        x, disease_idx, symptom_idx, mode, factual=factual, thresh=self.thresh,
+                    )
+        return out
+
+    def differentials(self, net_name, cards, top_k=DEFAULT_TOP_K) -> list:
+        """Ranked {method: [[disease_id, score], ...]} per casecard of one network."""
+        top_ks = list(top_k) if isinstance(top_k, (list, tuple)) else [top_k] * len(cards)
+        return self._differentials(net_name, self.scores(net_name, cards), top_ks)
+
+    def _differentials(self, net_name, scores, top_ks) -> list:
+        disease_ids = self.networks[net_name].disease_ids
+        ranked = {
+            method: _rank_rows(matrix, disease_ids, top_ks) for method, matrix in scores.items()
+        }
+        return [{method: ranked[method][row] for method in METHODS} for row in range(len(top_ks))]
+
+    def score_batch(self, requests):
+        """
+        Score a list of (card, top_k) together. Cards are grouped by network
+        and each group is scored as (cards × nodes) array operations.
+        Cards are parsed one at a time: an unknown network or a malformed
+        card gives an error response for that request only. Returns one
+        response dict per request, in order.
+        """
+        responses = [None] * len(requests)
+        groups = {}
+        for i, (card, top_k) in enumerate(requests):
+            net_name = card.get("network_name") if isinstance(card, dict) else None
+            if not isinstance(net_name, str) or net_name not in self.networks:
+                responses[i] = {"error": f"unknown network '{net_name}'"}
+                continue
+            groups.setdefault(net_name, []).append(i)
+
+        for net_name, members in groups.items():
+            template, parsed = EvidenceTemplate(self.networks[net_name]), []
+            for i in members:
+                try:
+                    template.add(requests[i][0])
+                except CARD_ERRORS as exc:
+                    responses[i] = {"error": f"malformed casecard: {exc!r}"}
+                else:
+                    parsed.append(i)
+            if not parsed:
+                continue
+            encoded = template.encode(self.severity_mapping, self.risk_boost)
+            ranked = self._differentials(
+                net_name, self._scores(net_name, encoded), [requests[i][1] for i in parsed],
+            )
+            for i, differential in zip(parsed, ranked):
+                responses[i] = {"network_name": net_name, "batch_size": len(parsed), **differential}
+        return responses
@@ -0,0 +1,485 @@
+import logging
+from contextlib import nullcontext
+
+import numpy as np
+
+from compiled import CompiledNetwork, EPSILON, MULTILAYER, ONE_HOP
+from instrumentation import get_timer
+
+# ------------------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------------------
+# Link strength of an intervened disease, i.e. 1 − CPT[parent=0] for the
+# CPTs that helpers.make_twin_network writes:
+#   disable → CPT = [1.0, 0.0] → link 0.0
+#   force   → CPT = [0.0, 1.0] → link 1.0
+INTERVENTION_LINK = {"disable": 0.0, "force": 1.0}
+
+BATCH_SIZE = 64  # interventions evaluated per (batch × edges) matrix
+
+# Per-network engine structures, stored with the network cache (networks.py)
+ENGINE_ARRAY_FIELDS = (
+    "child_edges", "child_ptr", "seg_node", "seg_end", "seg_len", "edge_child",
+    "affected_ptr", "affected_segs",
+)
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------------------
+# BATCHED TWIN-NETWORK ENGINE
+# ------------------------------------------------------------------------
+class CounterfactualEngine:
+    """
+    Evaluates many single-disease interventions against one factual pass.
+
+    Each intervention only rewrites the CPT row of the intervened node, which
+    in compiled form means the link strength on that node's outgoing edges.
+    A batch of interventions is therefore an (interventions × edges) link
+    matrix; one vectorized Noisy-OR pass over it gives the twin-network
+    values for the whole batch without copying any network dicts.
+
+    `scores` narrows this further: the affected children of every node are
+    precomputed once per network, and only their Noisy-OR products are
+    re-evaluated; all other symptoms reuse the factual values.
+
+    Stage timings go to `timer`, the process-wide StageTimer by default;
+    None records nothing (see context.InferenceContext).
+    """
+
+    def __init__(self, compiled: CompiledNetwork, batch_size=BATCH_SIZE):
+        self.compiled = compiled
+        self.batch_size = batch_size
+        self.timer = get_timer()
+
+        # Outgoing edges per node, grouped by parent (CSR over parents)
+        order = np.argsort(compiled.edge_parents, kind="stable")
+        counts = np.bincount(compiled.edge_parents, minlength=len(compiled))
+        self.child_edges = order
+        self.child_ptr = np.concatenate(([0], np.cumsum(counts))).astype(np.intp)
+
+        # Packed Noisy-OR segments: node, length and end of each
+        n_edges = len(compiled.edge_parents)
+        self.seg_node = np.flatnonzero(compiled.has_parents)
+        self.seg_end = np.append(compiled.segment_starts[1:], n_edges).astype(np.intp)
+        self.seg_len = self.seg_end - compiled.segment_starts
+        edge_seg = np.repeat(np.arange(len(self.seg_node)), self.seg_len)
+        self.edge_child = self.seg_node[edge_seg]
+
+        # Affected set per node (CSR): the segments, i.e. children, whose
+        # Noisy-OR reads this node. In this one-hop pass children read
+        # evidence rather than computed values, so an intervention changes
+        # these children and nothing further downstream.
+        affected = [np.unique(edge_seg[self.edges_of(i)]) for i in range(len(compiled))]
+        self.affected_ptr = np.concatenate(
+            ([0], np.cumsum([len(a) for a in affected]))
+        ).astype(np.intp)
+        self.affected_segs = (
+            np.concatenate(affected).astype(np.intp) if affected else np.zeros(0, dtype=np.intp)
+        )
+        self._descendants = None
+
+    @classmethod
+    def from_arrays(cls, compiled: CompiledNetwork, arrays: dict, batch_size=BATCH_SIZE):
+        """Rebuild an engine from `to_arrays` output without recomputing the affected sets."""
+        self = cls.__new__(cls)
+        self.compiled = compiled
+        self.batch_size = batch_size
+        self.timer = get_timer()
+        for name in ENGINE_ARRAY_FIELDS:
+            setattr(self, name, arrays[name])
+        self._descendants = None
+        return self
+
+    def to_arrays(self) -> dict:
+        return {name: getattr(self, name) for name in ENGINE_ARRAY_FIELDS}
+
+    def __getstate__(self):
+        # A timer holds a lock: a pickled engine (e.g. sent to a pool
+        # worker) reports to the receiving process's timer instead
+        state = dict(vars(self))
+        state["timer"] = self.timer is not None
+        return state
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        self.timer = get_timer() if state["timer"] else None
+
+    def stage(self, name, items=1):
+        """`timer.stage(...)`, or a no-op when timing is off."""
+        if self.timer is None:
+            return nullcontext()
+        return self.timer.stage(name, items)
+
+    def factual(self, x: np.ndarray) -> np.ndarray:
+        """Posterior values of the unmodified network."""
+        return self.compiled.posterior(x)
+
+    def edges_of(self, node_idx: int) -> np.ndarray:
+        """Positions in the packed edge arrays where node_idx is the parent."""
+        return self.child_edges[self.child_ptr[node_idx]:self.child_ptr[node_idx + 1]]
+
+    def twin_values(self, x: np.ndarray, factual: np.ndarray, node_idx, mode: str) -> np.ndarray:
+        """
+        Posterior values of the twin networks for a batch of intervened nodes:
+        returns a (len(node_idx) × nodes) matrix.
+        """
+        compiled = self.compiled
+        node_idx = np.asarray(node_idx, dtype=np.intp)
+        n_batch = len(node_idx)
+
+        edge_lists = [self.edges_of(i) for i in node_idx]
+        rows = np.repeat(np.arange(n_batch), [len(e) for e in edge_lists])
+        cols = np.concatenate(edge_lists) if edge_lists else np.zeros(0, dtype=np.intp)
+
+        link = np.tile(compiled.edge_link, (n_batch, 1))
+        link[rows, cols] = INTERVENTION_LINK[mode]
+
+        values = np.tile(factual, (n_batch, 1))
+        values[:, compiled.has_parents] = compiled.noisy_or(x, edge_link=link)
+        return values
+
+    def scores(self, x: np.ndarray, node_idx, symptom_idx, mode: str, factual=None,
+               thresh=None) -> np.ndarray:
+        """
+        Disablement (mode="disable") or sufficiency (mode="force") score of
+        each intervened node: the summed drop / rise in symptom probability,
+        as in helpers.count_disabled_symptoms.
+
+        Only the intervened node's children are re-evaluated; every other
+        symptom keeps its factual value and contributes a zero delta.
+
+        `x` may be one evidence vector (returns shape (D,)) or a batch of them
+        (returns (B, D)). With `thresh` set, a symptom only counts when it is
+        "present" in the factual world (P >= thresh) for disablement, or
+        absent (P < thresh) for sufficiency; None counts every symptom.
+        """
+        if factual is None:
+            factual = self.factual(x)
+        node_idx = np.asarray(node_idx, dtype=np.intp)
+        is_symptom = self._symptom_mask(symptom_idx)
+        terms = self._terms(x)
+        link = INTERVENTION_LINK[mode]
+
+        out = np.zeros(x.shape[:-1] + (len(node_idx),), dtype=np.float64)
+        for start in range(0, len(node_idx), self.batch_size):
+            batch = node_idx[start:start + self.batch_size]
+            with self.stage(f"counterfactual.{mode}", items=len(batch)):
+                out[..., start:start + len(batch)] = self._batch_scores(
+                    x, factual, terms, batch, link, mode, is_symptom, thresh
+                )
+        return out
+
+    def pruned_scores(self, x: np.ndarray, node_idx, symptom_idx, mode: str, top_k: int,
+                      factual=None):
+        """
+        Top-K pruned form of `scores` for a single evidence vector. Returns
+        (scores, n_skipped).
+
+        Every intervened node first gets a cheap upper bound on its score
+        (see `upper_bounds`). Nodes whose bound is exactly zero provably score
+        0.0 and are never re-evaluated. The rest are evaluated exactly, the
+        K highest factual posteriors first, then in descending bound order,
+        until no remaining bound reaches the current K-th best score.
+
+        The top-K entries (and their order) match `scores` exactly. A skipped
+        node is provably outside the top K but has no score: it reports NaN.
+        """
+        if factual is None:
+            factual = self.factual(x)
+        node_idx = np.asarray(node_idx, dtype=np.intp)
+        is_symptom = self._symptom_mask(symptom_idx)
+        terms = self._terms(x)
+        link = INTERVENTION_LINK[mode]
+
+        bound, zero = self.upper_bounds(x, factual, terms, node_idx, mode, is_symptom)
+        out = np.where(zero, 0.0, bound)
+        known = zero.copy()
+
+        def evaluate(sel):
+            with self.stage(f"counterfactual.{mode}", items=len(sel)):
+                out[sel] = self._batch_scores(
+                    x, factual, terms, node_idx[sel], link, mode, is_symptom
+                )
+            known[sel] = True
+
+        # Seed the K-th best score with the likeliest diseases
+        pending = np.flatnonzero(~zero)
+        seed = pending[np.argsort(-factual[node_idx[pending]], kind="stable")[:top_k]]
+        if len(seed):
+            evaluate(seed)
+
+        while True:
+            exact = out[known]
+            kth = np.partition(exact, -top_k)[-top_k] if len(exact) >= top_k else -np.inf
+            left = np.flatnonzero(~known & (bound >= kth))
+            if not len(left):
+                break
+            evaluate(left[np.argsort(-bound[left], kind="stable")[:self.batch_size]])
+
+        out[~known] = np.nan
+        n_skipped = int(len(node_idx) - np.count_nonzero(known & ~zero))
+        if self.timer is not None:
+            self.timer.record(f"counterfactual.{mode}.skipped", 0.0, items=n_skipped)
+        return out, n_skipped
+
+    def descendants(self):
+        """
+        Descendant segments of every node (CSR: ptr, segs, level of each
+        seg), built once on first multilayer use. Under multi-layer
+        propagation an intervention can change exactly these nodes.
+        """
+        if self._descendants is None:
+            compiled = self.compiled
+            seg_level = compiled.topological_levels()[self.seg_node]
+            seg_of_node = np.full(len(compiled), -1, dtype=np.intp)
+            seg_of_node[self.seg_node] = np.arange(len(self.seg_node))
+            # Children before parents: deepest level first
+            desc = [None] * len(compiled)
+            for i in np.argsort(-compiled.topological_levels(), kind="stable"):
+                children = self.affected_segs[self.affected_ptr[i]:self.affected_ptr[i + 1]]
+                found = set(children.tolist())
+                for seg in children:
+                    found |= desc[self.seg_node[seg]]
+                desc[i] = found
+            lists = [np.array(sorted(d), dtype=np.intp) for d in desc]
+            ptr = np.concatenate(([0], np.cumsum([len(d) for d in lists]))).astype(np.intp)
+            segs = np.concatenate(lists) if lists else np.zeros(0, dtype=np.intp)
+            self._descendants = (ptr, segs, seg_level)
+        return self._descendants
+
+    def propagated_scores(self, x: np.ndarray, observed: np.ndarray, node_idx, symptom_idx,
+                          mode: str, factual=None) -> np.ndarray:
+        """
+        `scores` under multi-layer propagation for one evidence vector.
+        An intervention can now reach every descendant, not just children:
+        for each batch, the twin values start from the factual ones and
+        only (intervention, descendant) pairs are re-evaluated, level by
+        level, reading the twin values of their parents. Observed nodes
+        stay clamped. Equal to a full CompiledNetwork.propagate per twin.
+        """
+        compiled = self.compiled
+        if factual is None:
+            factual = compiled.propagate(x, observed)
+        node_idx = np.asarray(node_idx, dtype=np.intp)
+        symptom_idx = np.asarray(symptom_idx, dtype=np.intp)
+        orig = factual[symptom_idx]
+        link_value = INTERVENTION_LINK[mode]
+        desc_ptr, desc_segs, seg_level = self.descendants()
+
+        out = np.zeros(len(node_idx), dtype=np.float64)
+        for start in range(0, len(node_idx), self.batch_size):
+            batch = node_idx[start:start + self.batch_size]
+            with self.stage(f"counterfactual.{mode}", items=len(batch)):
+                counts = desc_ptr[batch + 1] - desc_ptr[batch]
+                owner = np.repeat(np.arange(len(batch)), counts)
+                segs = desc_segs[_ranges(desc_ptr[batch], counts)]
+                levels = seg_level[segs]
+
+                twin = np.tile(factual, (len(batch), 1))
+                for level in np.unique(levels):
+                    on = levels == level
+                    o, sg = owner[on], segs[on]
+                    lengths = self.seg_len[sg]
+                    edges = _ranges(compiled.segment_starts[sg], lengths)
+                    edge_owner = np.repeat(o, lengths)
+                    parents = compiled.edge_parents[edges]
+                    link = np.where(
+                        parents == batch[edge_owner], link_value, compiled.edge_link[edges]
+                    )
+                    adjusted = np.minimum(link * twin[edge_owner, parents], 1.0)
+                    terms = 1.0 - (1.0 - adjusted) + EPSILON
+                    sub_starts = np.zeros(len(sg), dtype=np.intp)
+                    np.cumsum(lengths[:-1], out=sub_starts[1:])
+                    computed = 1.0 - np.multiply.reduceat(terms, sub_starts)
+                    nodes = self.seg_node[sg]
+                    twin[o, nodes] = np.where(observed[nodes], x[nodes], computed)
+
+                cf = twin[:, symptom_idx]
+                delta = orig - cf if mode == "disable" else cf - orig
+                delta = np.where(delta > 0, delta, 0.0)
+                # running sum, in symptom order, like count_disabled_symptoms
+                if delta.shape[1]:
+                    out[start:start + len(batch)] = np.cumsum(delta, axis=1)[:, -1]
+        return out
+
+    def upper_bounds(self, x, factual, terms, node_idx, mode, is_symptom):
+        """
+        Upper bound on each intervened node's score from its own outgoing
+        edges only, plus a mask of nodes whose score is exactly zero.
+
+        For a child with factual product P and intervened term ratio r, the
+        symptom delta is P·(r − 1) for disablement and P·(1 − r) for
+        sufficiency. A node whose new terms never move the product in the
+        scoring direction cannot produce a positive delta (the products are
+        monotone in each term, also in floating point), so it scores 0.0.
+        This needs positive terms and products; a node with a non-positive
+        one (a parent leak above 1 gives a negative link) gets an infinite
+        bound, so it is always evaluated exactly.
+        """
+        counts = self.child_ptr[node_idx + 1] - self.child_ptr[node_idx]
+        owner = np.repeat(np.arange(len(node_idx)), counts)
+        edges = self.child_edges[_ranges(self.child_ptr[node_idx], counts)]
+        keep = is_symptom[self.edge_child[edges]]
+        owner, edges = owner[keep], edges[keep]
+
+        old = terms[edges]
+        new = 1.0 - (1.0 - np.minimum(INTERVENTION_LINK[mode] * x[node_idx[owner]], 1.0)) + EPSILON
+        if mode == "disable":
+            moves = new > old
+            ratio = np.maximum(new / old, 1.0)
+        else:
+            moves = new < old
+            ratio = np.minimum(new / old, 1.0)
+        signed = (old <= 0) | (new <= 0) | (factual[self.edge_child[edges]] > 1.0)
+        unsafe = np.bincount(owner, weights=signed, minlength=len(node_idx)) > 0
+
+        bound = np.zeros(len(node_idx), dtype=np.float64)
+        zero = (np.bincount(owner, weights=moves, minlength=len(node_idx)) == 0) & ~unsafe
+        if not moves.any():
+            bound[unsafe] = np.inf
+            return bound, zero
+
+        # Combine repeated (node, child) edges; they are adjacent in `edges`
+        child = self.edge_child[edges]
+        starts = np.flatnonzero(
+            np.r_[True, (owner[1:] != owner[:-1]) | (child[1:] != child[:-1])]
+        )
+        r = np.multiply.reduceat(ratio, starts)
+        moved = np.logical_or.reduceat(moves, starts)
+        product = 1.0 - factual[child[starts]]
+        # Small absolute slack covers rounding in P and in the exact deltas
+        delta = np.abs(r - 1.0) * product + 1e-12
+        bound += np.bincount(owner[starts], weights=np.where(moved, delta, 0.0),
+                             minlength=len(node_idx))
+        bound[unsafe] = np.inf
+        return bound, zero
+
+    def _terms(self, x):
+        """Factual per-edge Noisy-OR terms, shared by every intervention."""
+        compiled = self.compiled
+        adjusted = np.minimum(compiled.edge_link * x[..., compiled.edge_parents], 1.0)
+        return 1.0 - (1.0 - adjusted) + EPSILON
+
+    def _symptom_mask(self, symptom_idx):
+        is_symptom = np.zeros(len(self.compiled), dtype=bool)
+        is_symptom[np.asarray(symptom_idx, dtype=np.intp)] = True
+        return is_symptom
+
+    def _batch_scores(self, x, factual, terms, batch, link, mode, is_symptom, thresh=None):
+        """Scores for one batch, re-evaluating only the affected segments."""
+        compiled = self.compiled
+        out = np.zeros(x.shape[:-1] + (len(batch),), dtype=np.float64)
+
+        # (intervention, affected segment) pairs for the whole batch
+        seg_counts = self.affected_ptr[batch + 1] - self.affected_ptr[batch]
+        owner = np.repeat(np.arange(len(batch)), seg_counts)
+        segs = self.affected_segs[_ranges(self.affected_ptr[batch], seg_counts)]
+        if not len(segs):
+            return out
+
+        # Gather the edges of each affected segment, overriding the term of
+        # the intervened parent with its new link strength
+        lengths = self.seg_len[segs]
+        edges = _ranges(compiled.segment_starts[segs], lengths)
+        edge_owner = np.repeat(owner, lengths)
+        target = batch[edge_owner]
+        sub_terms = terms[..., edges]
+        hit = compiled.edge_parents[edges] == target
+        new_adjusted = np.minimum(link * x[..., target[hit]], 1.0)
+        sub_terms[..., hit] = 1.0 - (1.0 - new_adjusted) + EPSILON
+
+        sub_starts = np.zeros(len(segs), dtype=np.intp)
+        np.cumsum(lengths[:-1], out=sub_starts[1:])
+        cf = 1.0 - np.multiply.reduceat(sub_terms, sub_starts, axis=-1)
+
+        nodes = self.seg_node[segs]
+        orig = factual[..., nodes]
+        delta = orig - cf if mode == "disable" else cf - orig
+        counted = (delta > 0) & is_symptom[nodes]
+        if thresh is not None:
+            counted &= (orig >= thresh) if mode == "disable" else (orig < thresh)
+        delta = np.where(counted, delta, 0.0)
+
+        # Sum each intervention's contiguous run of affected segments
+        has = np.flatnonzero(seg_counts)
+        group_starts = (np.cumsum(seg_counts) - seg_counts)[has]
+        out[..., has] = np.add.reduceat(delta, group_starts, axis=-1)
+        return out
+
+
+def _ranges(starts, lengths):
+    """Concatenate arange(start, start + length) for each pair, vectorized."""
+    starts = np.asarray(starts, dtype=np.intp)
+    lengths = np.asarray(lengths, dtype=np.intp)
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.intp)
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return offsets + np.arange(total, dtype=np.intp)
+
+
+# ------------------------------------------------------------------------
+# DICT-LEVEL WRAPPERS
+# ------------------------------------------------------------------------
+def _resolve(compiled: CompiledNetwork, node_ids):
+    """Split IDs into (positions in node_ids, matching network indices)."""
+    pos, idx = [], []
+    for k, nid in enumerate(node_ids):
+        i = compiled.index.get(nid)
+        if i is not None:
+            pos.append(k)
+            idx.append(i)
+    return np.array(pos, dtype=np.intp), np.array(idx, dtype=np.intp)
+
+
+def counterfactual_scores(engine: CounterfactualEngine, evidence: dict,
+                          disease_ids, symptom_nodes, modes=("disable", "force"),
+                          top_k=None, propagation=ONE_HOP):
+    """
+    Compute the factual posterior once and every requested intervention
+    batch against it. Returns {mode: {disease_id: score}}; diseases that are
+    not in the network score 0.0, as an intervention on them is a no-op.
+
+    With `top_k`, only diseases that can still reach the top K are scored
+    exactly (see CounterfactualEngine.pruned_scores); the rest are provably
+    outside the top K and score NaN. Pruning relies on one-hop bounds and is
+    not available with multilayer propagation.
+    """
+    if propagation == MULTILAYER and top_k is not None:
+        raise ValueError("top-K pruning is only available with one-hop propagation")
+    compiled = engine.compiled
+    x = compiled.evidence_vector(evidence)
+    observed = compiled.observed_mask(evidence) if propagation == MULTILAYER else None
+    with engine.stage("counterfactual.factual"):
+        if observed is not None:
+            factual = compiled.propagate(x, observed)
+        else:
+            factual = engine.factual(x)
+    _, symptom_idx = _resolve(compiled, symptom_nodes)
+    pos, disease_idx = _resolve(compiled, disease_ids)
+
+    results = {}
+    for mode in modes:
+        scores = np.zeros(len(disease_ids), dtype=np.float64)
+        if observed is not None:
+            scores[pos] = engine.propagated_scores(
+                x, observed, disease_idx, symptom_idx, mode, factual=factual
+            )
+        elif top_k is None:
+            scores[pos] = engine.scores(x, disease_idx, symptom_idx, mode, factual=factual)
+        else:
+            scores[pos], skipped = engine.pruned_scores(
+                x, disease_idx, symptom_idx, mode, top_k, factual=factual
+            )
+            logger.debug(f"{mode}: skipped {skipped}/{len(disease_idx)} interventions")
+        results[mode] = {did: float(s) for did, s in zip(disease_ids, scores)}
+    return results
+
+
+def engine_for(compiled: CompiledNetwork) -> CounterfactualEngine:
+    """Return the engine attached to a compiled network, building it once."""
+    engine = getattr(compiled, "_cf_engine", None)
+    if engine is None:
+        engine = compiled._cf_engine = CounterfactualEngine(compiled)
+    return engine
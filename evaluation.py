@@ -0,0 +1,216 @@
+import numpy as np
+
+from columnar import METHODS, ColumnarResults, TopKResults, build_columnar
+
+TOP_N = 20
+COUNTERFACTUAL_METHODS = ("disablement", "sufficiency")
+
+
+# ------------------------------------------------------------------------
+# PER-VIGNETTE GROUND TRUTH (built once per results set)
+# ------------------------------------------------------------------------
+class EvaluationData:
+    """
+    Aligns vignette metadata with the columns of a ColumnarResults:
+    true-disease column, rareness label and doctor-differential mask per row.
+    """
+
+    def __init__(self, results: ColumnarResults, vignettes: dict):
+        n_rows, n_cols = len(results.vignette_ids), len(results.ids)
+        self.results = results
+        self.true_col = np.full(n_rows, -1, dtype=np.intp)
+        self.rareness = []
+        self.doctor = np.zeros((n_rows, n_cols), dtype=bool)
+
+        for r, v_id in enumerate(results.vignette_ids):
+            card = vignettes[v_id]["card"]
+            true_disease = card["diseases"][0]
+            self.true_col[r] = results.col.get(true_disease["id"], -1)
+            self.rareness.append(true_disease.get("rareness", "unknown"))
+            for outcome in vignettes[v_id].get("outcomes", []):
+                for d in outcome.get("doctor_diseases", []):
+                    c = results.col.get(d["concept"]["id"])
+                    if c is not None:
+                        self.doctor[r, c] = True
+
+    def true_scores(self, matrix):
+        """Score of the true disease per row (NaN when it was not scored)."""
+        scores = np.full(len(self.true_col), np.nan, dtype=np.float64)
+        has = self.true_col >= 0
+        scores[has] = matrix[np.flatnonzero(has), self.true_col[has]]
+        return scores
+
+
+# ------------------------------------------------------------------------
+# VECTORIZED METRICS
+# ------------------------------------------------------------------------
+def true_disease_ranks(matrix, data: EvaluationData):
+    """
+    0-based rank of the true disease in each row, matching a stable
+    descending sort: ties are broken by column order. Returns (ranks, valid)
+    where valid marks rows whose true disease has a score.
+    """
+    t = data.true_scores(matrix)
+    valid = ~np.isnan(t)
+    cols = np.arange(matrix.shape[1])
+    with np.errstate(invalid="ignore"):
+        greater = (matrix > t[:, None]).sum(axis=1)
+        ties_before = ((matrix == t[:, None]) & (cols < data.true_col[:, None])).sum(axis=1)
+    return greater + ties_before, valid
+
+
+def top_n_curve(ranks, valid, N=TOP_N):
+    """Fraction of valid rows whose true disease is in the top k, k = 1..N."""
+    total = int(valid.sum())
+    if not total:
+        return np.zeros(N)
+    counts = np.bincount(np.minimum(ranks[valid], N), minlength=N + 1)
+    return np.cumsum(counts[:N]) / total
+
+
+def doctor_hits(matrix, data: EvaluationData):
+    """Per row: is the top-scored node in any doctor's differential (False if none scored)."""
+    hits = np.zeros(matrix.shape[0], dtype=bool)
+    rows = np.flatnonzero(~np.isnan(matrix).all(axis=1))
+    if len(rows):
+        hits[rows] = data.doctor[rows, np.nanargmax(matrix[rows], axis=1)]
+    return hits
+
+
+def doctor_agreement(matrix, data: EvaluationData):
+    """Fraction of vignettes whose top-scored node is in any doctor's differential."""
+    n_rows = matrix.shape[0]
+    if not n_rows:
+        return 0.0
+    return float(doctor_hits(matrix, data).sum()) / n_rows
+
+
+def _true_scored(results, data: EvaluationData, method):
+    """Per row: does `method` have a score for the true disease."""
+    if isinstance(results, TopKResults):
+        return ~np.isnan(results.true_scores[method].astype(np.float64))
+    return ~np.isnan(data.true_scores(results.matrix(method)))
+
+
+def row_outcomes(results, data: EvaluationData, method, pruned_top_k=None):
+    """
+    (ranks, valid, doctor_hits) per row for one method, from ColumnarResults
+    or --store top_k TopKResults (whose ranks were recorded at run time).
+
+    `pruned_top_k` is the K of a --prune-top-k run: a counterfactual method
+    leaves the true disease unscored (NaN) exactly when it was pruned, i.e.
+    ranked below the top K, so such rows count with rank K instead of being
+    dropped. Ranks are then only exact up to K.
+    """
+    if isinstance(results, TopKResults):
+        ranks = results.true_ranks[method].astype(np.intp)
+        top = results.top_cols[method][:, 0].astype(np.intp)
+        hits = np.zeros(len(top), dtype=bool)
+        rows = np.flatnonzero(top >= 0)
+        hits[rows] = data.doctor[rows, top[rows]]
+        valid = ranks >= 0
+    else:
+        matrix = results.matrix(method)
+        ranks, valid = true_disease_ranks(matrix, data)
+        hits = doctor_hits(matrix, data)
+    if pruned_top_k is not None and method in COUNTERFACTUAL_METHODS:
+        pruned = ~valid & _true_scored(results, data, "posterior")
+        ranks = np.where(pruned, pruned_top_k, ranks)
+        valid = valid | pruned
+    return ranks, valid, hits
+
+
+def check_pruned_top_n(N, pruned_top_k):
+    """Top-N accuracy of a --prune-top-k run is only known for N <= K."""
+    if pruned_top_k is not None and N > pruned_top_k:
+        raise ValueError(
+            f"top-{N} accuracy needs exact ranks beyond the pruned top {pruned_top_k}"
+        )
+
+
+def rareness_stats(matrix, data: EvaluationData):
+    """{rareness: {"mean", "std"}} of the true disease's score, in first-seen order."""
+    return _rareness_stats(data.true_scores(matrix), data)
+
+
+def _rareness_stats(t, data: EvaluationData):
+    valid = np.flatnonzero(~np.isnan(t))
+    if not len(valid):
+        return {}
+    labels = np.array(data.rareness, dtype=object)[valid]
+    names, first, group = np.unique(labels.astype(str), return_index=True, return_inverse=True)
+    values = t[valid]
+    counts = np.bincount(group)
+    means = np.bincount(group, weights=values) / counts
+    stds = np.sqrt(np.bincount(group, weights=(values - means[group]) ** 2) / counts)
+    return {
+        str(names[g]): {"mean": float(means[g]), "std": float(stds[g])}
+        for g in np.argsort(first)
+    }
+
+
+def as_columnar(results_dict) -> ColumnarResults:
+    """Accept either ColumnarResults or the JSON-shaped dict."""
+    if isinstance(results_dict, ColumnarResults):
+        return results_dict
+    per_method = [
+        {v_id: result.get(method, {}) for v_id, result in results_dict.items()}
+        for method in METHODS
+    ]
+    return build_columnar(*per_method, dtype=np.float64)
+
+
+def evaluate_top_k(results: TopKResults, vignettes, methods=METHODS, N=TOP_N,
+                   pruned_top_k=None):
+    """
+    `evaluate` on --store top_k results: ranks and true-disease scores were
+    recorded over all diseases at run time, and the top entry of each row
+    is its first column, so the metrics match the full-score evaluation.
+    """
+    check_pruned_top_n(N, pruned_top_k)
+    data = EvaluationData(results, vignettes)
+    report = {}
+    for method in methods:
+        ranks, valid, hits = row_outcomes(results, data, method, pruned_top_k)
+        n_rows = len(hits)
+        report[method] = {
+            "topn": top_n_curve(ranks, valid, N),
+            "doctor": float(hits.sum()) / n_rows if n_rows else 0.0,
+            "rareness": _method_rareness(
+                results.true_scores[method].astype(np.float64), data, method, pruned_top_k
+            ),
+        }
+    return report
+
+
+def _method_rareness(t, data: EvaluationData, method, pruned_top_k=None):
+    # Pruned runs only know the scores of each vignette's top K, so a mean
+    # over the scored true diseases would be biased upwards: skip it
+    if pruned_top_k is not None and method in COUNTERFACTUAL_METHODS:
+        return {}
+    return _rareness_stats(t, data)
+
+
+def evaluate(results_dict, vignettes, methods=METHODS, N=TOP_N, pruned_top_k=None):
+    """
+    All evaluation metrics in one vectorized pass per method:
+      {method: {"topn": array(N), "doctor": float, "rareness": {...}}}
+    For a --prune-top-k run pass its K as `pruned_top_k`: N must not exceed
+    it, and the counterfactual methods get no rareness score statistics.
+    """
+    if isinstance(results_dict, TopKResults):
+        return evaluate_top_k(results_dict, vignettes, methods, N, pruned_top_k)
+    check_pruned_top_n(N, pruned_top_k)
+    results = as_columnar(results_dict)
+    data = EvaluationData(results, vignettes)
+    report = {}
+    for method in methods:
+        matrix = results.matrix(method)
+        ranks, valid, hits = row_outcomes(results, data, method, pruned_top_k)
+        n_rows = len(hits)
+        report[method] = {
+            "topn": top_n_curve(ranks, valid, N),
+            "doctor": float(hits.sum()) / n_rows if n_rows else 0.0,
+            "rareness": _method_rareness(data.true_scores(matrix), data, method, pruned_top_k),
+        }
+    return report
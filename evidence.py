@@ -0,0 +1,304 @@
+import hashlib
+import itertools
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+
+from cache import file_digest
+import inference
+import preprocessing
+from compiled import CompiledNetwork
+from preprocessing import iter_vignettes
+
+EVIDENCE_CACHE_PREFIX = "evidence"
+RISK_CODE = -1  # level code of a present risk factor (takes RISK_BOOST)
+
+logger = logging.getLogger(__name__)
+
+
+def evidence_settings(severity_mapping=None, risk_boost=None):
+    """
+    (severity_mapping, risk_boost) with unset values taken from
+    preprocessing.SEVERITY_MAPPING and inference.RISK_BOOST as they are now,
+    so runtime changes apply here as they do in get_evidence_from_casecard.
+    """
+    if severity_mapping is None:
+        severity_mapping = preprocessing.SEVERITY_MAPPING
+    if risk_boost is None:
+        risk_boost = inference.RISK_BOOST
+    return severity_mapping, risk_boost
+
+
+# ------------------------------------------------------------------------
+# PARAMETER-FREE EVIDENCE (parsed once)
+# ------------------------------------------------------------------------
+def parse_casecard(card):
+    """
+    Split a casecard into parameter-free parts, mirroring
+    convert_symptom_severity + get_evidence_from_casecard:
+    ([(symptom_id, severity_level)], [present_risk_id]).
+
+    A symptom's level is its severity name, or, when the card already
+    carries a severity_numeric (as get_evidence_from_casecard prefers), that
+    value as a float. See severity_level_value.
+    """
+    symptoms = []
+    for sym in card.get("symptoms", []):
+        if sym.get("label") == "Super" or sym.get("concept", {}).get("id") is None:
+            continue
+        if "severity_numeric" in sym:
+            level = float(sym["severity_numeric"])
+        else:
+            level = sym.get("severity", "PRESENT").strip().upper()
+        symptoms.append((sym["concept"]["id"], level))
+
+    risks = []
+    for rf in card.get("risk_factors", []):
+        if rf.get("label") != "Risk" or rf.get("concept", {}).get("id") is None:
+            continue
+        if rf.get("presence", "").upper() == "PRESENT":
+            risks.append(rf["concept"]["id"])
+    return symptoms, risks
+
+
+def severity_level_value(level, severity_mapping) -> float:
+    """
+    Evidence value of a parse_casecard level: a severity name goes through
+    `severity_mapping` (1.0 if unknown), a card's own severity_numeric is
+    used as it is, whatever the mapping.
+    """
+    if isinstance(level, str):
+        return severity_mapping.get(level, 1.0)
+    return level
+
+
+class EvidenceTemplate:
+    """
+    Severity level codes and risk-presence flags for a group of casecards,
+    aligned with one compiled network and stored as CSR rows
+    (indptr, indices, codes). Cards can be added one at a time and are read
+    but never modified.
+
+    Turning it into evidence for a given (SEVERITY_MAPPING, RISK_BOOST) is a
+    single gather, see `encode` and `evidence`.
+    """
+
+    def __init__(self, compiled: CompiledNetwork, cards=(), row_ids=None):
+        self.index = compiled.index
+        self.node_ids = compiled.node_ids
+        self.levels = []
+        self.row_ids = []
+        self._level_code = {}
+        self._indptr, self._indices, self._codes = [0], [], []
+
+        if row_ids is None:
+            row_ids = itertools.count()
+        for row_id, card in zip(row_ids, cards):
+            self.add(card, row_id)
+
+    def add(self, card, row_id=None):
+        """Append one casecard as a new row."""
+        # Later entries win, as with the evidence dict; risks come last
+        row = {}
+        symptoms, risks = parse_casecard(card)
+        for sid, level in symptoms:
+            i = self.index.get(sid)
+            if i is None:
+                continue
+            if level not in self._level_code:
+                self._level_code[level] = len(self.levels)
+                self.levels.append(level)
+            row[i] = self._level_code[level]
+        for rid in risks:
+            i = self.index.get(rid)
+            if i is not None:
+                row[i] = RISK_CODE
+        cols = sorted(row)
+        self._indices.extend(cols)
+        self._codes.extend(row[i] for i in cols)
+        self._indptr.append(len(self._indices))
+        self.row_ids.append(len(self.row_ids) if row_id is None else row_id)
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    @property
+    def indptr(self):
+        return np.array(self._indptr, dtype=np.intp)
+
+    @property
+    def indices(self):
+        return np.array(self._indices, dtype=np.int32)
+
+    @property
+    def codes(self):
+        return np.array(self._codes, dtype=np.int16)
+
+    def encode(self, severity_mapping=None, risk_boost=None):
+        """
+        Apply one parameter setting, giving CSR EncodedEvidence (unset
+        values: see evidence_settings).
+        """
+        severity_mapping, risk_boost = evidence_settings(severity_mapping, risk_boost)
+        values = np.array(
+            [severity_level_value(level, severity_mapping) for level in self.levels] + [risk_boost]
+        )
+        # RISK_CODE (-1) picks the trailing risk_boost
+        return EncodedEvidence(
+            self.row_ids, self.node_ids, self.indptr, self.indices, values[self.codes],
+            meta={"severity_mapping": dict(severity_mapping), "risk_boost": risk_boost},
+        )
+
+    def evidence(self, severity_mapping=None, risk_boost=None):
+        """(rows × nodes) dense evidence matrix for one parameter setting."""
+        return self.encode(severity_mapping, risk_boost).dense()
+
+
+# ------------------------------------------------------------------------
+# ENCODED EVIDENCE (CSR, aligned with a network's node index)
+# ------------------------------------------------------------------------
+def node_digest(node_ids) -> str:
+    """Hash of a network's node order; encoded evidence is only valid for it."""
+    return hashlib.sha256("\n".join(node_ids).encode("utf-8")).hexdigest()
+
+
+class EncodedEvidence:
+    """
+    Evidence of many casecards as a CSR matrix over a network's node index:
+    row r holds the evidence values of row_ids[r], zero elsewhere. Rows
+    become dense evidence vectors with one scatter and go straight into
+    CompiledNetwork.posterior / CounterfactualEngine.scores.
+    """
+
+    def __init__(self, row_ids, node_ids, indptr, indices, data, meta=None):
+        self.row_ids = list(row_ids)
+        self.node_ids = list(node_ids)
+        self.indptr = np.asarray(indptr, dtype=np.intp)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.data = np.asarray(data, dtype=np.float64)
+        self.meta = meta or {}
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    @property
+    def shape(self):
+        return len(self), len(self.node_ids)
+
+    def dense(self, start=0, stop=None) -> np.ndarray:
+        """Dense (rows × nodes) evidence for rows[start:stop]."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        lo, hi = self.indptr[start], self.indptr[stop]
+        x = np.zeros((stop - start, len(self.node_ids)), dtype=np.float64)
+        rows = np.repeat(np.arange(stop - start), np.diff(self.indptr[start:stop + 1]))
+        x[rows, self.indices[lo:hi]] = self.data[lo:hi]
+        return x
+
+    def observed(self, start=0, stop=None) -> np.ndarray:
+        """Dense mask of the nodes each row has evidence for (any value)."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        lo, hi = self.indptr[start], self.indptr[stop]
+        mask = np.zeros((stop - start, len(self.node_ids)), dtype=bool)
+        rows = np.repeat(np.arange(stop - start), np.diff(self.indptr[start:stop + 1]))
+        mask[rows, self.indices[lo:hi]] = True
+        return mask
+
+    def batches(self, batch_size):
+        """Yield (row_ids, dense evidence) blocks of up to batch_size rows."""
+        for start in range(0, len(self), batch_size):
+            yield self.row_ids[start:start + batch_size], self.dense(start, start + batch_size)
+
+    def to_scipy(self):
+        """The same matrix as a scipy.sparse.csr_matrix."""
+        from scipy.sparse import csr_matrix
+        return csr_matrix((self.data, self.indices, self.indptr), shape=self.shape)
+
+    def check(self, compiled: CompiledNetwork):
+        """Raise ValueError if this evidence was encoded for another node order."""
+        if node_digest(compiled.node_ids) != node_digest(self.node_ids):
+            raise ValueError("encoded evidence does not match the network's node index")
+
+    def save(self, path):
+        """Write as .npz (atomically) so it can be reloaded without the casecards."""
+        path = Path(path)
+        tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                row_ids=np.array([str(r) for r in self.row_ids]),
+                node_ids=np.array(self.node_ids),
+                indptr=self.indptr,
+                indices=self.indices,
+                data=self.data,
+                meta=np.array(json.dumps(self.meta, sort_keys=True)),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as f:
+            return cls(
+                f["row_ids"].tolist(), f["node_ids"].tolist(),
+                f["indptr"], f["indices"], f["data"],
+                meta=json.loads(str(f["meta"])),
+            )
+
+
+# ------------------------------------------------------------------------
+# BATCH ENCODER
+# ------------------------------------------------------------------------
+def encode_casecards(compiled: CompiledNetwork, cards, row_ids=None,
+                     severity_mapping=None, risk_boost=None):
+    """
+    Encode a list of casecards for one network in a single pass. Equivalent
+    to stacking compiled.evidence_vector(get_evidence_from_casecard(card))
+    after severity conversion, without touching the cards.
+    """
+    return EvidenceTemplate(compiled, cards, row_ids).encode(severity_mapping, risk_boost)
+
+
+def encode_vignette_file(compiled_networks: dict, vignettes_path, cache_dir=None,
+                         severity_mapping=None, risk_boost=None):
+    """
+    Stream a vignette file and encode its casecards per network:
+    {network_name: EncodedEvidence}, rows in file order. Casecards of
+    networks that are not loaded are skipped with an error.
+
+    With cache_dir, each network's matrix is stored there keyed on the
+    vignette file, the node order, the severity mapping and RISK_BOOST, and
+    later calls load it instead of re-reading the casecards.
+    """
+    severity_mapping, risk_boost = evidence_settings(severity_mapping, risk_boost)
+    paths = {}
+    if cache_dir is not None:
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        source = file_digest(vignettes_path)
+        for name, compiled in compiled_networks.items():
+            key = hashlib.sha256(json.dumps(
+                [source, node_digest(compiled.node_ids), severity_mapping, risk_boost],
+                sort_keys=True,
+            ).encode("utf-8")).hexdigest()
+            paths[name] = cache_dir / f"{EVIDENCE_CACHE_PREFIX}-{name}-{key[:16]}.npz"
+        if paths and all(p.exists() for p in paths.values()):
+            return {name: EncodedEvidence.load(p) for name, p in paths.items()}
+
+    templates = {name: EvidenceTemplate(c) for name, c in compiled_networks.items()}
+    for v_id, vignette in iter_vignettes(vignettes_path):
+        card = vignette.get("card", {})
+        net_name = card.get("network_name")
+        if net_name not in templates:
+            logger.error(f"Missing network '{net_name}' for case {v_id}")
+            continue
+        templates[net_name].add(card, v_id)
+
+    encoded = {
+        name: template.encode(severity_mapping, risk_boost)
+        for name, template in templates.items()
+    }
+    for name, path in paths.items():
+        encoded[name].save(path)
+    return encoded
@@ -1,97 +1,512 @@
-from tqdm import tqdm
+import logging
+from collections.abc import Mapping
+from itertools import islice
+
+import numpy as np
 
 from constants import (
     VIGNETTES_FILE,
     RESULTS_OBS_FILE,
     RESULTS_CF_DISABLEMENT_FILE,
     RESULTS_CF_SUFFICIENCY_FILE,
+    RESULTS_STREAM_FILE,
+    RESULTS_COLUMNAR_FILE,
+    RESULTS_RUN_FILE,
 )
 
 from utils import load_from_json, save_as_json, write_to_pickle
-from preprocessing import preprocess_vignettes, convert_symptom_severity
-from helpers import load_networks, get_symptom_nodes
+from preprocessing import preprocess_vignettes, convert_card_severity, iter_casecards
+from helpers import load_compiled_networks, load_networks
+from compiled import CompiledNetwork, MULTILAYER, ONE_HOP, compile_networks
+from counterfactual import engine_for
+from montecarlo import MonteCarloSettings, sampler_for
+from evidence import EvidenceTemplate
+from columnar import (
+    SCORE_DTYPE,
+    STORE_FULL,
+    STORE_TOP_K,
+    build_columnar,
+    disease_scores,
+    save_columnar,
+)
+from cache import evidence_key, make_result_cache
+from instrumentation import get_timer
+from streaming import (
+    ResultStreamWriter,
+    completed_ids,
+    repair_stream,
+    save_results_from_stream,
+)
 from inference import (
-    expected_disablement,
-    expected_sufficiency,
+    expected_counterfactuals,
     get_evidence_from_casecard,
+    log_scores,
+    monte_carlo_counterfactuals,
     posterior_inference,
 )
 
+DEFAULT_CHUNKSIZE = 8  # vignettes handed to a pool worker per task
+DEFAULT_BATCH_SIZE = 64  # same-network vignettes scored together (1 = one at a time)
+WINDOW_CHUNKS = 4      # tasks in flight per worker when streaming casecards
+
+logger = logging.getLogger(__name__)
+
+
+def compute_disease_posteriors(network, facts, propagation=ONE_HOP):
+    return posterior_inference(network, facts, propagation)
+
+
+def _key_options(top_k, propagation, sampler=None):
+    """Cache-key options; defaults map to None so exact one-hop keys stay unchanged."""
+    return {
+        "top_k": top_k,
+        "propagation": None if propagation == ONE_HOP else propagation,
+        "monte_carlo": sampler.key() if sampler is not None else None,
+    }
+
+
+def _log_stderr(v_id, errors, ess):
+    """Largest Monte Carlo standard error of a case, at INFO level."""
+    worst = max((float(np.max(e, initial=0.0)) for e in errors), default=0.0)
+    logger.info(f"case {v_id}: Monte Carlo max stderr {worst:.4f}, ESS {ess:.1f}")
+
+
+# ------------------------------------------------------------------------
+# PER-NETWORK SETUP (once per network, not per vignette)
+# ------------------------------------------------------------------------
+class NetworkPlan:
+    """Node lists, compiled form and counterfactual engine of one network."""
 
-def compute_disease_posteriors(network, facts):
-    return posterior_inference(network, facts)
+    def __init__(self, compiled: CompiledNetwork):
+        self.compiled = compiled
+        self.engine = engine_for(compiled)
+        # Network order, as get_symptom_nodes and the label filter on the dict
+        self.symptom_nodes = compiled.symptom_ids
+        self.all_diseases = compiled.disease_ids
+        self.disease_pos, self.disease_idx = _positions(compiled, self.all_diseases)
+        _, self.symptom_idx = _positions(compiled, self.symptom_nodes)
 
 
-def run_vignettes_experiment_raw(vignettes_data, network_data, first_n=None):
+def _positions(compiled, node_ids):
+    """(positions in node_ids, network indices) of the IDs the network knows."""
+    pairs = [(k, compiled.index[nid]) for k, nid in enumerate(node_ids) if nid in compiled.index]
+    pos = np.array([k for k, _ in pairs], dtype=np.intp)
+    idx = np.array([i for _, i in pairs], dtype=np.intp)
+    return pos, idx
+
+
+def plan_for(compiled: CompiledNetwork) -> NetworkPlan:
+    """Return the plan attached to a compiled network, building it once."""
+    plan = getattr(compiled, "_plan", None)
+    if plan is None:
+        plan = compiled._plan = NetworkPlan(compiled)
+    return plan
+
+
+def _warn_missing_true_disease(v_id, card, posterior, disablement, sufficiency):
+    true_id = card["diseases"][0]["id"]
+    for method, scores in [
+        ("posterior", posterior),
+        ("disablement", disablement),
+        ("sufficiency", sufficiency),
+    ]:
+        if true_id not in scores:
+            logger.warning(f"case {v_id}: true disease {true_id} missing from {method}")
+
+
+def _copy_scores(result):
     """
-    For all vignettes:
-    - Compute posterior disease scores
-    - Compute counterfactual expected disablement
-    - Compute counterfactual expected sufficiency
+    Fresh score dicts of a (posterior, disablement, sufficiency) result, so
+    that a cached entry and what callers get back never share a dict.
+    """
+    return tuple(dict(scores) for scores in result)
+
+
+def run_single_vignette(v_id, card, network_data, compiled_networks, cache=None, top_k=None,
+                        propagation=ONE_HOP, sampler=None):
+    """
+    Score one casecard against its network.
+    Returns (posterior, disablement, sufficiency), or None if the network is missing.
+    With a ResultCache, cases whose (network, evidence) was already scored
+    skip inference entirely. With `top_k`, counterfactuals are only computed
+    exactly for diseases that can reach the top K. `propagation` selects
+    one-hop or multilayer Noisy-OR (compiled.PROPAGATION_MODES), and a
+    montecarlo.MonteCarloSettings `sampler` estimates the counterfactuals
+    by sampling.
     """
-    if first_n is not None:
-        vignettes_data = dict(list(vignettes_data.items())[:first_n])
+    net_name = card["network_name"]
+    network = network_data.get(net_name)
 
-    # Attach severity_numeric to each symptom
-    vignettes_data = convert_symptom_severity(vignettes_data)
+    if network is None:
+        logger.error(f"Missing network '{net_name}' for case {v_id}")
+        return None
 
-    symptom_nodes = get_symptom_nodes(network_data)
-    all_diseases = [
-        nid for nid, node in network_data.items()
-        if node.get("label") == "Disease"
-    ]
+    timer = get_timer()
+    with timer.network(net_name), timer.stage("vignette"):
+        with timer.stage("setup"):
+            plan = plan_for(compiled_networks[net_name])
 
-    posterior_results = {}
-    disablement_results = {}
-    sufficiency_results = {}
+        with timer.stage("evidence"):
+            facts = get_evidence_from_casecard(card)
 
-    for v_id, vignette in tqdm(vignettes_data.items(), desc="Casecards"):
-        card = vignette["card"]
-        net_name = card["network_name"]
-        network = network_data.get(net_name)
+        key = (
+            evidence_key(net_name, facts, **_key_options(top_k, propagation, sampler))
+            if cache is not None else None
+        )
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            timer.record("cache.hit", 0.0)
+            posterior, disablement, sufficiency = _copy_scores(cached)
+        else:
+            compiled = plan.compiled
+            with timer.stage("posterior"):
+                posterior = compute_disease_posteriors(compiled, facts, propagation)
+            if sampler is not None:
+                disablement, sufficiency, stderr = monte_carlo_counterfactuals(
+                    compiled, facts, plan.all_diseases, plan.symptom_nodes, sampler,
+                    propagation=propagation,
+                )
+                _log_stderr(
+                    v_id,
+                    [list(stderr["disablement"].values()), list(stderr["sufficiency"].values())],
+                    stderr["ess"],
+                )
+            else:
+                disablement, sufficiency = expected_counterfactuals(
+                    compiled, facts, plan.all_diseases, plan.symptom_nodes,
+                    top_k=top_k, propagation=propagation,
+                )
+            if cache is not None:
+                cache.put(key, _copy_scores((posterior, disablement, sufficiency)))
+
+    # Warn if true disease is missing from any metric
+    _warn_missing_true_disease(v_id, card, posterior, disablement, sufficiency)
+
+    return posterior, disablement, sufficiency
+
+
+# ------------------------------------------------------------------------
+# GROUPED SCHEDULER (batches of same-network vignettes)
+# ------------------------------------------------------------------------
+def _score_group(plan: NetworkPlan, items, top_k=None, propagation=ONE_HOP, sampler=None):
+    """
+    Score one batch of (v_id, card) pairs of the same network together.
+    Returns [(posterior, disablement, sufficiency)] in the order of items.
+    """
+    compiled, engine = plan.compiled, plan.engine
+    timer = get_timer()
+    with timer.stage("evidence", items=len(items)):
+        encoded = EvidenceTemplate(compiled, [card for _, card in items]).encode()
+        x = encoded.dense()
+        observed = encoded.observed() if propagation == MULTILAYER or sampler else None
+    with timer.stage("posterior", items=len(items)):
+        if propagation == MULTILAYER:
+            factual = compiled.propagate(x, observed)
+        else:
+            factual = engine.factual(x)
+
+    modes = {
+        mode: np.zeros((len(items), len(plan.all_diseases)), dtype=np.float64)
+        for mode in ("disable", "force")
+    }
+    if sampler is not None:
+        # Both modes share each case's block of samples
+        mc = sampler_for(compiled)
+        for r, (v_id, _) in enumerate(items):
+            est, stderr, ess = mc.estimate(
+                x[r], observed[r], plan.disease_idx, plan.symptom_idx, sampler,
+                propagation=propagation,
+            )
+            for mode, scores in modes.items():
+                scores[r, plan.disease_pos] = est[mode]
+            _log_stderr(v_id, stderr.values(), ess)
+    else:
+        for mode, scores in modes.items():
+            if propagation == MULTILAYER:
+                for r in range(len(items)):
+                    scores[r, plan.disease_pos] = engine.propagated_scores(
+                        x[r], observed[r], plan.disease_idx, plan.symptom_idx, mode,
+                        factual=factual[r],
+                    )
+            elif top_k is None:
+                scores[:, plan.disease_pos] = engine.scores(
+                    x, plan.disease_idx, plan.symptom_idx, mode, factual=factual
+                )
+            else:
+                for r in range(len(items)):
+                    scores[r, plan.disease_pos], _ = engine.pruned_scores(
+                        x[r], plan.disease_idx, plan.symptom_idx, mode, top_k, factual=factual[r]
+                    )
+
+    results = []
+    for r in range(len(items)):
+        disablement = dict(zip(plan.all_diseases, modes["disable"][r].tolist()))
+        sufficiency = dict(zip(plan.all_diseases, modes["force"][r].tolist()))
+        log_scores("Disablement", disablement)
+        log_scores("Sufficiency", sufficiency)
+        results.append((compiled.to_dict(factual[r]), disablement, sufficiency))
+    return results
+
+
+def _iter_grouped(items, network_data, compiled_networks, batch_size=DEFAULT_BATCH_SIZE,
+                  cache=None, top_k=None, propagation=ONE_HOP, sampler=None):
+    """
+    Yield (v_id, result) in input order, scoring vignettes in same-network
+    batches. The input is read a window at a time; inside a window vignettes
+    are grouped by network, each group runs as (batch × nodes) array
+    operations, and results are put back in input order.
+    """
+    items = iter(items)
+    window = batch_size * max(1, len(network_data))
+    timer = get_timer()
+    while True:
+        chunk = list(islice(items, window))
+        if not chunk:
+            break
+
+        results = [None] * len(chunk)
+        groups, keys = {}, {}
+        for k, (v_id, card) in enumerate(chunk):
+            net_name = card["network_name"]
+            if net_name not in network_data:
+                logger.error(f"Missing network '{net_name}' for case {v_id}")
+                continue
+            if cache is not None:
+                key = evidence_key(
+                    net_name, get_evidence_from_casecard(card),
+                    **_key_options(top_k, propagation, sampler),
+                )
+                cached = cache.get(key)
+                if cached is not None:
+                    with timer.network(net_name):
+                        timer.record("cache.hit", 0.0)
+                    results[k] = _copy_scores(cached)
+                    continue
+                keys[k] = key
+            groups.setdefault(net_name, []).append(k)
+
+        for net_name, members in groups.items():
+            with timer.network(net_name):
+                with timer.stage("setup"):
+                    plan = plan_for(compiled_networks[net_name])
+                for start in range(0, len(members), batch_size):
+                    batch = members[start:start + batch_size]
+                    with timer.stage("batch", items=len(batch)):
+                        scored = _score_group(
+                            plan, [chunk[k] for k in batch],
+                            top_k=top_k, propagation=propagation, sampler=sampler,
+                        )
+                    for k, result in zip(batch, scored):
+                        results[k] = result
+                        if k in keys:
+                            cache.put(keys[k], _copy_scores(result))
+
+        for (v_id, card), result in zip(chunk, results):
+            if result is not None:
+                _warn_missing_true_disease(v_id, card, *result)
+            yield v_id, result
+
+
+# ------------------------------------------------------------------------
+# PROCESS POOL WORKERS
+# ------------------------------------------------------------------------
+_worker_networks = None
+_worker_compiled = None
+_worker_cache = None
+_worker_top_k = None
+_worker_propagation = ONE_HOP
+_worker_sampler = None
 
-        if network is None:
-            print(f"[ERROR] Missing network '{net_name}' for case {v_id}")
-            continue
 
-        symptom_nodes = get_symptom_nodes(network)
-        all_diseases = [nid for nid, node in network.items() if node.get("label") == "Disease"]
+def _init_worker(datapath, network_data=None, cache=None, top_k=None, propagation=ONE_HOP,
+                 sampler=None):
+    """
+    Pool initializer: load the networks once per worker (memory-mapped from
+    the network cache when only the datapath is given).
+    """
+    global _worker_networks, _worker_compiled, _worker_cache, _worker_top_k, _worker_propagation
+    global _worker_sampler
+    if network_data is None:
+        network_data = load_compiled_networks(datapath)
+    _worker_networks = network_data
+    _worker_compiled = compile_networks(network_data)
+    _worker_cache = cache
+    _worker_top_k = top_k
+    _worker_propagation = propagation
+    _worker_sampler = sampler
 
-        facts = get_evidence_from_casecard(card)
 
-        posterior = compute_disease_posteriors(network, facts)
-        disablement = expected_disablement(
-            network, facts, all_diseases, symptom_nodes
+def _run_vignette_in_worker(item):
+    v_id, card = item
+    result = run_single_vignette(
+        v_id, card, _worker_networks, _worker_compiled,
+        cache=_worker_cache, top_k=_worker_top_k, propagation=_worker_propagation,
+        sampler=_worker_sampler,
+    )
+    # Hand this vignette's stage timings back to the parent process
+    return v_id, result, get_timer().snapshot(reset=True)
+
+
+def _iter_parallel(items, network_data, workers, chunksize, datapath, cache=None,
+                   top_k=None, propagation=ONE_HOP, sampler=None):
+    """
+    Yield (v_id, result) from a process pool, in input order. `items` is
+    consumed a window at a time, so a lazy casecard stream is never fully
+    materialized.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    items = iter(items)
+    window = workers * chunksize * WINDOW_CHUNKS
+    # Workers load the networks themselves when a datapath is known,
+    # otherwise the dict is shipped once per worker through the initializer
+    # (each gets its own in-memory cache; the disk layer is shared)
+    if datapath is not None:
+        initargs = (datapath, None, cache, top_k, propagation, sampler)
+    else:
+        initargs = (None, network_data, cache, top_k, propagation, sampler)
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=initargs
+    ) as pool:
+        # Executor.map keeps input order, so merging stays deterministic
+        timer = get_timer()
+        while True:
+            batch = list(islice(items, window))
+            if not batch:
+                break
+            for v_id, result, timings in pool.map(
+                _run_vignette_in_worker, batch, chunksize=chunksize
+            ):
+                timer.merge(timings)
+                yield v_id, result
+
+
+def iter_vignettes_experiment(vignettes_data, network_data, first_n=None,
+                              workers=1, chunksize=DEFAULT_CHUNKSIZE, datapath=None,
+                              cache=None, skip_ids=None, top_k=None,
+                              batch_size=DEFAULT_BATCH_SIZE, propagation=ONE_HOP,
+                              sampler=None, diseases_only=False):
+    """
+    Generator form of run_vignettes_experiment_raw: yields
+    (v_id, posterior, disablement, sufficiency) per vignette, in input order,
+    as soon as each one is scored. IDs in `skip_ids` are not run.
+
+    `vignettes_data` is either a vignettes dict or a lazy iterable of
+    (v_id, card) pairs such as preprocessing.iter_casecards; only the first
+    `first_n` entries are read. In-process runs group vignettes by network
+    and score up to `batch_size` of them together; batch_size=1 scores one
+    vignette at a time. With `diseases_only`, posteriors are cut down to
+    the Disease nodes before they are yielded.
+    """
+    if workers and workers > 1 and chunksize < 1:
+        raise ValueError("chunksize must be at least 1 with workers > 1")
+    total = None
+    if isinstance(vignettes_data, Mapping):
+        if first_n is not None:
+            total = min(first_n, len(vignettes_data))
+        else:
+            total = len(vignettes_data)
+        # Attach severity_numeric to a copy of each card as the cards are
+        # reached; the caller's vignettes are not modified
+        vignettes_data = (
+            (v_id, convert_card_severity(vignette["card"], copy=True))
+            for v_id, vignette in vignettes_data.items()
         )
-        sufficiency = expected_sufficiency(
-            network, facts, all_diseases, symptom_nodes
+    elif first_n is not None:
+        total = first_n
+
+    items = islice(vignettes_data, first_n)
+    if skip_ids:
+        items = ((v_id, card) for v_id, card in items if v_id not in skip_ids)
+        total = None
+
+    if workers and workers > 1:
+        results = _iter_parallel(
+            items, network_data, workers, chunksize, datapath,
+            cache=cache, top_k=top_k, propagation=propagation, sampler=sampler,
+        )
+    elif batch_size and batch_size > 1:
+        results = _iter_grouped(
+            items, network_data, compile_networks(network_data),
+            batch_size=batch_size, cache=cache, top_k=top_k, propagation=propagation,
+            sampler=sampler,
         )
+    else:
+        # Compile each network once into array form for the posterior pass
+        compiled_networks = compile_networks(network_data)
+        results = (
+            (v_id, run_single_vignette(
+                v_id, card, network_data, compiled_networks,
+                cache=cache, top_k=top_k, propagation=propagation, sampler=sampler,
+            ))
+            for v_id, card in items
+        )
+
+    from tqdm import tqdm  # progress bar only; kept off the import path
+
+    for v_id, result in tqdm(results, total=total, desc="Casecards"):
+        if result is None:
+            continue
+        posterior, disablement, sufficiency = result
+        if diseases_only:
+            posterior = disease_scores(posterior, disablement)
+        yield v_id, posterior, disablement, sufficiency
+
+
+def run_vignettes_experiment_raw(vignettes_data, network_data, first_n=None,
+                                 workers=1, chunksize=DEFAULT_CHUNKSIZE, datapath=None,
+                                 cache=None, top_k=None, batch_size=DEFAULT_BATCH_SIZE,
+                                 propagation=ONE_HOP, sampler=None, diseases_only=False):
+    """
+    For all vignettes:
+    - Compute posterior disease scores
+    - Compute counterfactual expected disablement
+    - Compute counterfactual expected sufficiency
+
+    With workers > 1 the vignettes are spread over a process pool; each worker
+    loads the networks once (from `datapath` if given) and results are merged
+    back in input order. An optional ResultCache short-circuits repeated
+    (network, evidence) pairs, `top_k` switches the counterfactuals to
+    top-K pruned scoring, `propagation` picks one-hop or multilayer
+    Noisy-OR and `sampler` switches to Monte Carlo counterfactuals.
+    `diseases_only` keeps only Disease posteriors.
+    """
+    posterior_results = {}
+    disablement_results = {}
+    sufficiency_results = {}
 
+    for v_id, posterior, disablement, sufficiency in iter_vignettes_experiment(
+        vignettes_data, network_data, first_n=first_n, workers=workers,
+        chunksize=chunksize, datapath=datapath, cache=cache, top_k=top_k,
+        batch_size=batch_size, propagation=propagation, sampler=sampler,
+        diseases_only=diseases_only,
+    ):
         posterior_results[v_id] = posterior
         disablement_results[v_id] = disablement
         sufficiency_results[v_id] = sufficiency
 
-        # Warn if true disease is missing from any metric
-        true_id = card["diseases"][0]["id"]
-        for method, scores in [
-            ("posterior", posterior),
-            ("disablement", disablement),
-            ("sufficiency", sufficiency),
-        ]:
-            if true_id not in scores:
-                print(f"[WARN] case {v_id}: true disease {true_id} missing from {method}")
-
     return posterior_results, disablement_results, sufficiency_results
 
 
-def save_results(output_dir, posteriors, disablements, sufficiencies):
+def save_results(output_dir, posteriors, disablements, sufficiencies,
+                 json_export=True, dtype=SCORE_DTYPE):
     """
-    Save result dictionaries to pickle and JSON files.
+    Save result dictionaries to pickle files, the columnar .npz and
+    (optionally) the merged JSON.
     """
     write_to_pickle(posteriors, output_dir / RESULTS_OBS_FILE)
     write_to_pickle(disablements, output_dir / RESULTS_CF_DISABLEMENT_FILE)
     write_to_pickle(sufficiencies, output_dir / RESULTS_CF_SUFFICIENCY_FILE)
 
+    # Columnar form for fast reloading in results.py
+    save_columnar(
+        build_columnar(posteriors, disablements, sufficiencies, dtype=dtype),
+        output_dir / RESULTS_COLUMNAR_FILE,
+    )
+
+    if not json_export:
+        return
+
     # Merge into a single JSON file for inspection
     merged = {
         v_id: {
@@ -123,15 +538,86 @@ def main(data_path, output_path):
     print("> Done.")
 
 
+def _remember_true_diseases(casecards, true_ids, skip_ids=()):
+    """
+    Pass (v_id, card) pairs through, noting each card's true disease ID.
+    Cards in skip_ids are never scored, so nothing is noted for them.
+    """
+    for v_id, card in casecards:
+        if v_id in skip_ids:
+            yield v_id, card
+            continue
+        diseases = card.get("diseases") or [{}]
+        true_ids[v_id] = diseases[0].get("id")
+        yield v_id, card
+
+
 def run_vignettes_experiment(*, args):
     """
     CLI-compatible wrapper used by run.py
     """
-    vignette_data = load_from_json(args.datapath / VIGNETTES_FILE)
-    network_data = load_networks(args.datapath)
+    # Casecards are streamed from disk; --first stops reading after N
+    vignettes_path = args.vignettes or args.datapath / VIGNETTES_FILE
+    casecards = iter_casecards(vignettes_path, first_n=args.first)
+    # Validated and compiled once, then reused from the network cache
+    network_data = load_compiled_networks(args.datapath)
 
-    posteriors, disablements, sufficiencies = run_vignettes_experiment_raw(
-        vignette_data, network_data, first_n=args.first
-    )
+    cache = None
+    if args.cache_size > 0 or args.disk_cache:
+        cache = make_result_cache(
+            args.datapath,
+            maxsize=args.cache_size,
+            results_dir=args.results if args.disk_cache else None,
+        )
 
-    save_results(args.results, posteriors, disablements, sufficiencies)
+    # Stream each vignette's record to disk as soon as it is scored; with
+    # --resume, vignettes already in the stream are skipped
+    stream_path = args.results / RESULTS_STREAM_FILE
+    # Evaluation reads the pruning K back (pruned diseases have no score)
+    run_path = args.results / RESULTS_RUN_FILE
+    run_settings = {"prune_top_k": args.prune_top_k}
+    if args.resume:
+        previous = load_from_json(run_path) if run_path.exists() else {"prune_top_k": None}
+        if previous != run_settings:
+            raise SystemExit(
+                f"--resume needs the same --prune-top-k as the stream "
+                f"({previous['prune_top_k']}, not {args.prune_top_k})"
+            )
+        repair_stream(stream_path)
+        done = completed_ids(stream_path)
+        print(f"> Resuming: {len(done)} vignettes already in {stream_path}")
+    else:
+        done = set()
+        stream_path.unlink(missing_ok=True)
+    save_as_json(run_settings, run_path)
+
+    sampler = None
+    if args.mc_samples is not None:
+        sampler = MonteCarloSettings(
+            args.mc_samples, seed=args.mc_seed, conditioning=args.mc_conditioning
+        )
+
+    # --store top_k ranks the true disease as each record is written; the
+    # IDs are noted as cards are read and dropped once written
+    true_ids = {}
+    if args.store == STORE_TOP_K:
+        casecards = _remember_true_diseases(casecards, true_ids, skip_ids=done)
+
+    timer = get_timer()
+    with ResultStreamWriter(stream_path, store=args.store, top_k=args.store_top_k) as writer:
+        for record in iter_vignettes_experiment(
+            casecards, network_data,
+            workers=args.workers, chunksize=args.chunksize, datapath=args.datapath,
+            cache=cache, skip_ids=done, top_k=args.prune_top_k,
+            batch_size=args.batch_size, propagation=args.propagation,
+            sampler=sampler, diseases_only=args.store != STORE_FULL,
+        ):
+            with timer.stage("serialize.stream"):
+                writer.write(*record, true_id=true_ids.pop(record[0], None))
+
+    with timer.stage("serialize.final"):
+        save_results_from_stream(
+            stream_path, args.results,
+            json_export=not args.no_json, dtype=np.dtype(args.score_dtype),
+            store=args.store, top_k=args.store_top_k,
+        )
@@ -1,11 +1,10 @@
 import copy
 import numpy as np
-import networkx as nx
 from functools import lru_cache
-from scipy.stats import binomtest
 
 from constants import NETWORKS_FILE
 from utils import load_from_json
+from networks import load_network_cache, validate_networks
 
 # ------------------------------------------------------------------------
 # CONFIG
@@ -18,10 +17,27 @@ THRESH = 0.3  # threshold for deciding symptom “presence” in counterfactuals
 # ------------------------------------------------------------------------
 @lru_cache(maxsize=1)
 def load_networks(datapath, filename=NETWORKS_FILE):
-    """Load and cache the disease network JSON."""
+    """
+    Load and cache the disease network JSON. Raises
+    networks.NetworkValidationError if a network is malformed or cyclic.
+    The dict is shared by every caller: copy it before modifying (threaded
+    code should use context.InferenceContext instead).
+    """
     from pathlib import Path
     datapath = Path(datapath)
-    return load_from_json(datapath / filename)
+    network_data = load_from_json(datapath / filename)
+    validate_networks(network_data)
+    return network_data
+
+
+@lru_cache(maxsize=1)
+def load_compiled_networks(datapath, filename=NETWORKS_FILE):
+    """
+    Validated networks in compiled array form with their counterfactual
+    engines (cached). They come from the on-disk network cache when the
+    file was loaded before, see networks.load_network_cache.
+    """
+    return load_network_cache(datapath, filename)
 
 
 # ------------------------------------------------------------------------
@@ -29,6 +45,8 @@ def load_networks(datapath, filename=NETWORKS_FILE):
 # ------------------------------------------------------------------------
 def build_disease_graph(network: dict):
     """Create a directed graph (DAG) from the network dict."""
+    import networkx as nx  # only the graph utilities need it
+
     G = nx.DiGraph()
     for node_id, node in network.items():
         G.add_node(node_id, **node)
@@ -73,6 +91,30 @@ def noisy_or(parents, network, input_values, epsilon=1e-9):
     return 1.0 - np.prod([1.0 - p + epsilon for p in probs])
 
 
+def propagate_noisy_or(network: dict, evidence: dict, epsilon=1e-9):
+    """
+    Multi-layer Noisy-OR: visit nodes in topological order of
+    build_disease_graph and compute each Disease/Symptom node once from its
+    parents' already computed values (memoized in `values`). Observed nodes
+    are clamped to their evidence; other nodes without a Noisy-OR are 0.
+    Returns {node_id: value} for every node in the network.
+    """
+    import networkx as nx  # only the graph utilities need it
+
+    values = {}
+    for nid in nx.topological_sort(build_disease_graph(network)):
+        node = network.get(nid)
+        if node is None:
+            continue
+        if nid in evidence:
+            values[nid] = evidence[nid]
+        elif node.get("label") in ("Disease", "Symptom"):
+            values[nid] = noisy_or(node.get("parents", []), network, values, epsilon)
+        else:
+            values[nid] = 0.0
+    return values
+
+
 # ------------------------------------------------------------------------
 # COUNTERFACTUAL INFERENCE UTILITIES
 # ------------------------------------------------------------------------
@@ -150,5 +192,7 @@ def mean_list(li):
 def bintest(x, y, conf_thresh):
     if conf_thresh == 0:
         return sum(x) >= sum(y)
+    from scipy.stats import binomtest  # slow to import; only needed here
+
     p_val = binomtest(sum(x), n=len(x), p=(sum(y) / len(y)), alternative="greater").pvalue
     return p_val < conf_thresh
@@ -0,0 +1,82 @@
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+# ------------------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------------------
+# Wall-clock import budget (seconds) per entry module, measured in a fresh
+# interpreter. NumPy alone takes most of the inference budget.
+IMPORT_BUDGETS = {
+    "inference": 0.25,
+    "service": 0.3,
+    "score": 0.3,
+    "experiments": 0.3,
+    "run": 0.3,
+    "results": 0.3,
+}
+
+# Modules that must stay off the inference path (loaded only when a plot,
+# statistics test or graph utility is actually used)
+HEAVY_MODULES = ("scipy", "networkx", "pandas", "matplotlib", "seaborn", "tqdm")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure_import(module, repeat=3):
+    """
+    Import `module` in fresh interpreters and return
+    (best wall-clock seconds, heavy modules it pulled in).
+    """
+    best, heavy = float("inf"), []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module)],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent,
+        )
+        report = json.loads(out.stdout.strip().splitlines()[-1])
+        best = min(best, report["seconds"])
+        heavy = sorted(
+            name for name in report["modules"] if name.split(".")[0] in HEAVY_MODULES
+        )
+    return best, sorted({name.split(".")[0] for name in heavy})
+
+
+def check_import_budget(budgets=IMPORT_BUDGETS, repeat=3):
+    """
+    Measure every entry module against its budget.
+    Returns a list of failure messages (empty when all are within budget).
+    """
+    failures = []
+    for module, budget in budgets.items():
+        seconds, heavy = measure_import(module, repeat)
+        status = "ok" if seconds <= budget and not heavy else "FAIL"
+        print(f"{module:12} {seconds * 1000:8.1f} ms  (budget {budget * 1000:.0f} ms)  {status}")
+        if seconds > budget:
+            failures.append(f"{module}: import took {seconds:.3f}s > {budget:.3f}s")
+        if heavy:
+            failures.append(f"{module}: imports {', '.join(heavy)} at load time")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import time of the entry points")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per module (best is kept)")
+    args = parser.parse_args()
+
+    failures = check_import_budget(repeat=args.repeat)
+    for failure in failures:
+        print(f"!! {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,28 @@
-from helpers import make_twin_network, count_disabled_symptoms, get_symptom_nodes, noisy_or
+import logging
+
+from helpers import (
+    make_twin_network, count_disabled_symptoms, get_symptom_nodes, noisy_or, propagate_noisy_or
+)
+from compiled import CompiledNetwork, MULTILAYER, ONE_HOP, SCORED_LABELS
+from counterfactual import counterfactual_scores, engine_for
+from montecarlo import monte_carlo_scores
 from preprocessing import SEVERITY_MAPPING  # ✅ Use centralized mapping
 #from utils import load_from_json  # ✅ only if used during testing
 
 RISK_BOOST = 5.0  # ✅ Tunable — can adjust to control impact of risk factors
 
+logger = logging.getLogger(__name__)
+
+
+def log_scores(tag, results):
+    """
+    Per-disease scores at DEBUG level (formatted only when enabled). Also
+    used by the batched paths in experiments.py.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        for disease_id, count in results.items():
+            logger.debug(f"[{tag}] {disease_id} → score: {count:.3f}")
+
 
 def get_evidence_from_casecard(card):
     """
@@ -39,8 +58,35 @@ def get_evidence_from_casecard(card):
     return evidence
 
 
-def posterior_inference(network, evidence):
-    """Compute P(node=1 | evidence) for Disease, Symptom, and Risk"""
+def posterior_inference(network, evidence, propagation=ONE_HOP):
+    """
+    Compute P(node=1 | evidence) for Disease, Symptom, and Risk.
+    propagation="multilayer" evaluates the network in topological order
+    from computed parent values (observed nodes clamped) instead of the
+    one-hop pass over parent evidence.
+    """
+    if isinstance(network, CompiledNetwork):
+        # ✅ Vectorized pass over the CSR parent arrays
+        x = network.evidence_vector(evidence)
+        if propagation == MULTILAYER:
+            values = network.propagate(x, network.observed_mask(evidence))
+        else:
+            values = network.posterior(x)
+        results = network.to_dict(values)
+        if not results:
+            logger.error("posterior_inference: no scores computed!")
+        return results
+
+    if propagation == MULTILAYER:
+        values = propagate_noisy_or(network, evidence)
+        results = {
+            nid: values[nid] for nid, node in network.items()
+            if node.get("label") in SCORED_LABELS
+        }
+        if not results:
+            logger.error("posterior_inference: no scores computed!")
+        return results
+
     results = {}
     for node_id, node in network.items():
         if node.get("label") in ("Disease", "Symptom"):
@@ -49,44 +95,106 @@ def posterior_inference(network, evidence):
         elif node.get("label") == "Risk":
             results[node_id] = evidence.get(node_id, 0.0)
     if not results:
-        print("[ERROR] posterior_inference: no scores computed!")
+        logger.error("posterior_inference: no scores computed!")
     return results  # ✅ no normalization
 
 
 
-def expected_disablement(network, evidence, disease_ids, symptom_nodes):
+def expected_disablement(network, evidence, disease_ids, symptom_nodes, propagation=ONE_HOP):
     """
     For each disease: disable it, count how many symptoms disappear
     Returns: {disease_id: score}
     """
+    if isinstance(network, CompiledNetwork):
+        # ✅ One factual pass + batched twin networks, no deepcopies
+        results = counterfactual_scores(
+            engine_for(network), evidence, disease_ids, symptom_nodes, modes=("disable",),
+            propagation=propagation,
+        )["disable"]
+        log_scores("Disablement", results)
+        if not results:
+            logger.error("expected_disablement: no scores computed!")
+        return results
+
     results = {}
     for disease_id in disease_ids:
         twin_net = make_twin_network(network, disable=disease_id)
-        cf_values = posterior_inference(twin_net, evidence)
-        original_values = posterior_inference(network, evidence)
+        cf_values = posterior_inference(twin_net, evidence, propagation)
+        original_values = posterior_inference(network, evidence, propagation)
         count = count_disabled_symptoms(network, symptom_nodes, original_values, cf_values, recovery=False)
-        print(f"[Disablement] {disease_id} → score: {count:.3f}")
         results[disease_id] = count
+    log_scores("Disablement", results)
     if not results:
-        print("[ERROR] expected_disablement: no scores computed!")
+        logger.error("expected_disablement: no scores computed!")
     return results 
 
 
-def expected_sufficiency(network, evidence, disease_ids, symptom_nodes):
+def expected_sufficiency(network, evidence, disease_ids, symptom_nodes, propagation=ONE_HOP):
     """
     For each disease: force it on, count how many symptoms reappear (weighted by severity)
     Returns: {disease_id: score}
     """
+    if isinstance(network, CompiledNetwork):
+        # ✅ One factual pass + batched twin networks, no deepcopies
+        results = counterfactual_scores(
+            engine_for(network), evidence, disease_ids, symptom_nodes, modes=("force",),
+            propagation=propagation,
+        )["force"]
+        log_scores("Sufficiency", results)
+        if not results:
+            logger.error("expected_sufficiency: no scores computed!")
+        return results
+
     results = {}
     for disease_id in disease_ids:
         twin_net = make_twin_network(network, force=disease_id)
-        cf_values = posterior_inference(twin_net, evidence)
-        original_values = posterior_inference(network, evidence)
+        cf_values = posterior_inference(twin_net, evidence, propagation)
+        original_values = posterior_inference(network, evidence, propagation)
         count = count_disabled_symptoms(network, symptom_nodes, original_values, cf_values, recovery=True)
-        print(f"[Sufficiency] {disease_id} → score: {count:.3f}")
         results[disease_id] = count
+    log_scores("Sufficiency", results)
     if not results:
-        print("[ERROR] expected_sufficiency: no scores computed!")
-    return results 
+        logger.error("expected_sufficiency: no scores computed!")
+    return results
 
 
+def expected_counterfactuals(network, evidence, disease_ids, symptom_nodes, top_k=None,
+                             propagation=ONE_HOP, sampler=None):
+    """
+    Disablement and sufficiency together on a compiled network, sharing a
+    single factual posterior pass. With `top_k`, diseases that cannot reach
+    the top K are pruned (exact top K, NaN below it). With a
+    montecarlo.MonteCarloSettings `sampler`, both are estimated by sampling
+    instead (see monte_carlo_counterfactuals for the standard errors).
+    Returns: ({disease_id: disablement}, {disease_id: sufficiency})
+    """
+    if sampler is not None:
+        disablement, sufficiency, _ = monte_carlo_counterfactuals(
+            network, evidence, disease_ids, symptom_nodes, sampler, propagation
+        )
+        return disablement, sufficiency
+
+    scores = counterfactual_scores(
+        engine_for(network), evidence, disease_ids, symptom_nodes,
+        top_k=top_k, propagation=propagation,
+    )
+    log_scores("Disablement", scores["disable"])
+    log_scores("Sufficiency", scores["force"])
+    return scores["disable"], scores["force"]
+
+
+def monte_carlo_counterfactuals(network, evidence, disease_ids, symptom_nodes, sampler,
+                                propagation=ONE_HOP):
+    """
+    Sampled disablement and sufficiency on a compiled network, with shared
+    exogenous noise for the factual and twin worlds (montecarlo.py).
+    Returns: ({disease_id: disablement}, {disease_id: sufficiency},
+              {"disablement": {disease_id: stderr}, "sufficiency": {...}, "ess": float})
+    """
+    scores, stderr, ess = monte_carlo_scores(
+        network, evidence, disease_ids, symptom_nodes, sampler, propagation=propagation,
+    )
+    log_scores("Disablement (MC)", scores["disable"])
+    log_scores("Sufficiency (MC)", scores["force"])
+    errors = {"disablement": stderr["disable"], "sufficiency": stderr["force"], "ess": ess}
+    return scores["disable"], scores["force"], errors
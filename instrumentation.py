@@ -0,0 +1,164 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+LOG_FORMAT = "[%(levelname)s] %(name)s: %(message)s"
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+
+def configure_logging(level="WARNING"):
+    """Set up levelled console logging for the CLI entry points."""
+    name = str(level).upper()
+    if name not in LOG_LEVELS:
+        raise ValueError(f"unknown log level {level!r}; expected one of {', '.join(LOG_LEVELS)}")
+    logging.basicConfig(level=getattr(logging, name), format=LOG_FORMAT)
+
+
+# ------------------------------------------------------------------------
+# STAGE TIMINGS
+# ------------------------------------------------------------------------
+class StageTimer:
+    """
+    Aggregates wall-clock time per (network, stage):
+      calls, items (e.g. interventions in a batch), total seconds, max seconds.
+
+    The network is taken from `with timer.network(name)` on the current
+    thread, so inner code (e.g. counterfactual batches) does not need to
+    know which network it runs on.
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def network(self, name):
+        previous = getattr(self._local, "network", None)
+        self._local.network = name
+        try:
+            yield
+        finally:
+            self._local.network = previous
+
+    @contextmanager
+    def stage(self, name, items=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, items)
+
+    def record(self, name, seconds, items=1, network=None):
+        if network is None:
+            network = getattr(self._local, "network", None) or "-"
+        key = (network, name)
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                self._stats[key] = [1, items, seconds, seconds]
+            else:
+                stat[0] += 1
+                stat[1] += items
+                stat[2] += seconds
+                stat[3] = max(stat[3], seconds)
+
+    def snapshot(self, reset=False) -> dict:
+        """{(network, stage): [calls, items, total_s, max_s]}, optionally clearing."""
+        with self._lock:
+            stats = {key: list(stat) for key, stat in self._stats.items()}
+            if reset:
+                self._stats.clear()
+        return stats
+
+    def merge(self, stats: dict):
+        """Fold in a snapshot taken elsewhere (e.g. in a pool worker)."""
+        with self._lock:
+            for key, (calls, items, total, worst) in stats.items():
+                stat = self._stats.get(key)
+                if stat is None:
+                    self._stats[key] = [calls, items, total, worst]
+                else:
+                    stat[0] += calls
+                    stat[1] += items
+                    stat[2] += total
+                    stat[3] = max(stat[3], worst)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def rows(self):
+        """Summary rows sorted by network, then by total time (descending)."""
+        rows = [
+            {
+                "network": network,
+                "stage": stage,
+                "calls": calls,
+                "items": items,
+                "total_s": total,
+                "mean_ms": 1000.0 * total / calls if calls else 0.0,
+                "max_ms": 1000.0 * worst,
+            }
+            for (network, stage), (calls, items, total, worst) in self.snapshot().items()
+        ]
+        return sorted(rows, key=lambda r: (r["network"], -r["total_s"]))
+
+    def format_table(self):
+        lines = [
+            f"{'network':8} {'stage':30} {'calls':>8} {'items':>9} "
+            f"{'total_s':>9} {'mean_ms':>9} {'max_ms':>9}"
+        ]
+        for r in self.rows():
+            lines.append(
+                f"{r['network']:8} {r['stage']:30} {r['calls']:8d} {r['items']:9d} "
+                f"{r['total_s']:9.3f} {r['mean_ms']:9.3f} {r['max_ms']:9.3f}"
+            )
+        return "\n".join(lines)
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.rows(), f, indent=2)
+
+
+_timer = StageTimer()
+
+
+def get_timer() -> StageTimer:
+    """The process-wide timer used by the inference pipeline."""
+    return _timer
+
+
+def stage(name, items=1):
+    """Shorthand for get_timer().stage(...)."""
+    return _timer.stage(name, items)
+
+
+# ------------------------------------------------------------------------
+# cProfile
+# ------------------------------------------------------------------------
+@contextmanager
+def profiled(path=None, top=25):
+    """
+    Run the body under cProfile. When path is given, the raw stats are
+    dumped there (readable with pstats / snakeviz) and the top entries by
+    cumulative time are printed.
+    """
+    if path is None:
+        yield
+        return
+
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(top)
+        print(f">> cProfile stats written to {path}")
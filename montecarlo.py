@@ -0,0 +1,314 @@
+import logging
+
+import numpy as np
+
+from compiled import CompiledNetwork, EPSILON, MULTILAYER, ONE_HOP
+from counterfactual import INTERVENTION_LINK, CounterfactualEngine, _ranges, _resolve, engine_for
+from instrumentation import stage
+
+# ------------------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------------------
+DEFAULT_SAMPLES = 1000
+DEFAULT_SEED = 0
+SAMPLE_BLOCK = 256  # samples drawn (and kept as one noise matrix) at a time
+
+# Conditioning on the observed nodes' factual states:
+#   none   → no conditioning; estimates the same scores as the exact engine
+#   weight → likelihood weighting, P(state | evidence clipped to [0, 1])
+#   reject → keep samples whose states match the evidence thresholded at 0.5
+NO_CONDITIONING = "none"
+CONDITIONING_MODES = (NO_CONDITIONING, "weight", "reject")
+
+logger = logging.getLogger(__name__)
+
+
+class MonteCarloSettings:
+    """Sample count, seed and conditioning of a Monte Carlo counterfactual run."""
+
+    def __init__(self, n_samples=DEFAULT_SAMPLES, seed=DEFAULT_SEED,
+                 conditioning=NO_CONDITIONING, block=SAMPLE_BLOCK):
+        if n_samples < 1:
+            raise ValueError("n_samples must be at least 1")
+        if conditioning not in CONDITIONING_MODES:
+            raise ValueError(f"unknown conditioning '{conditioning}'")
+        self.n_samples = int(n_samples)
+        self.seed = int(seed)
+        self.conditioning = conditioning
+        self.block = int(block)
+
+    def key(self) -> dict:
+        """Options that change the estimates (for cache keys)."""
+        return {"samples": self.n_samples, "seed": self.seed, "conditioning": self.conditioning}
+
+    def __repr__(self):
+        return (f"MonteCarloSettings(n_samples={self.n_samples}, seed={self.seed}, "
+                f"conditioning={self.conditioning!r})")
+
+
+# ------------------------------------------------------------------------
+# SAMPLED TWIN NETWORKS
+# ------------------------------------------------------------------------
+class MonteCarloEngine:
+    """
+    Estimates disablement and sufficiency by sampling the Noisy-OR as a
+    structural model instead of evaluating it in closed form.
+
+    Every edge gets an exogenous uniform u; it fires when
+    u < min(link · input, 1) + EPSILON, and a node with parents is "on"
+    unless all its edges fire (the sampled form of 1 − Π terms, so its mean
+    is the posterior value). The factual world and the twin world of every
+    intervention reuse the same u, so their per-sample differences are
+    counterfactual rather than two independent draws, and all interventions
+    are scored on one shared block of samples.
+
+    The score of a node is Σ_symptoms max(E[Δ], 0) with Δ the factual minus
+    twin state (disable) or twin minus factual (force), as in
+    CounterfactualEngine.scores; with conditioning "none" it converges to the
+    exact scores on one-hop and two-level networks. Deeper networks differ
+    from the exact multilayer pass where nodes share ancestors, since
+    sampled parent states are correlated there.
+    """
+
+    def __init__(self, engine: CounterfactualEngine):
+        self.engine = engine
+        self.compiled = engine.compiled
+        self.seg_of_node = np.full(len(self.compiled), -1, dtype=np.intp)
+        self.seg_of_node[engine.seg_node] = np.arange(len(engine.seg_node))
+
+    def estimate(self, x: np.ndarray, observed: np.ndarray, node_idx, symptom_idx,
+                 settings: MonteCarloSettings, modes=("disable", "force"),
+                 propagation=ONE_HOP):
+        """
+        Scores and standard errors for one evidence vector:
+        ({mode: scores}, {mode: stderr}, effective sample size).
+        `observed` marks the nodes that carry evidence.
+        """
+        node_idx = np.asarray(node_idx, dtype=np.intp)
+        is_symptom = self.engine._symptom_mask(symptom_idx)
+        layouts = {mode: self._layout(node_idx, propagation, is_symptom) for mode in modes}
+        deltas = {
+            mode: np.zeros((len(layouts[mode][4]), settings.n_samples), dtype=np.int8)
+            for mode in modes
+        }
+        log_w = np.zeros(settings.n_samples, dtype=np.float64)
+
+        rng = np.random.default_rng(settings.seed)
+        n_edges = len(self.compiled.edge_parents)
+        for lo in range(0, settings.n_samples, settings.block):
+            hi = min(lo + settings.block, settings.n_samples)
+            u = rng.random((n_edges, hi - lo))  # samples last: reductions run over edges
+            with stage("counterfactual.mc.factual", items=hi - lo):
+                factual = self._factual(x, observed, u, propagation)
+                log_w[lo:hi] = self._log_weights(x, observed, factual[2] > 0, settings.conditioning)
+            for mode in modes:
+                with stage(f"counterfactual.mc.{mode}", items=len(node_idx)):
+                    deltas[mode][:, lo:hi] = self._twin_deltas(
+                        x, observed, u, factual, node_idx, layouts[mode], mode, propagation,
+                    )
+
+        if not np.isfinite(log_w).any():
+            logger.warning("Monte Carlo: no sample is consistent with the evidence")
+            zeros = np.zeros(len(node_idx), dtype=np.float64)
+            nans = np.full(len(node_idx), np.nan)
+            return {m: zeros for m in modes}, {m: nans for m in modes}, 0.0
+        w = np.exp(log_w - log_w.max())
+        total = w.sum()
+        ess = float(total ** 2 / np.dot(w, w))
+
+        scores, stderr = {}, {}
+        for mode in modes:
+            scores[mode], stderr[mode] = _summarize(w, total, deltas[mode], layouts[mode][3])
+        return scores, stderr, ess
+
+    def _layout(self, node_idx, propagation, is_symptom):
+        """
+        Segments to re-sample per intervention (CSR ptr, segs), their
+        counts, per-intervention counts of symptom segments and the pair
+        columns that are symptoms. One-hop pairs are the children,
+        multilayer pairs all descendants.
+        """
+        engine = self.engine
+        if propagation == MULTILAYER:
+            ptr, segs, _ = engine.descendants()
+        else:
+            ptr, segs = engine.affected_ptr, engine.affected_segs
+        counts = ptr[node_idx + 1] - ptr[node_idx]
+        owner = np.repeat(np.arange(len(node_idx)), counts)
+        pair_segs = segs[_ranges(ptr[node_idx], counts)]
+        scored = is_symptom[engine.seg_node[pair_segs]]
+        scored_counts = np.bincount(owner[scored], minlength=len(node_idx))
+        return ptr, segs, counts, scored_counts, np.flatnonzero(scored)
+
+    def _factual(self, x, observed, u, propagation):
+        """
+        Factual world of a sample block (arrays are rows × samples): parent
+        inputs per node (None for one-hop, where they are the evidence),
+        which edges fire and, per segment, how many edges do not fire.
+        A node is on when that count is positive.
+        """
+        compiled = self.compiled
+        if propagation != MULTILAYER:
+            p = np.minimum(compiled.edge_link * x[compiled.edge_parents], 1.0) + EPSILON
+            fire = u < p[:, None]
+            misses = np.add.reduceat(~fire, compiled.segment_starts, axis=0, dtype=np.int32)
+            return None, fire, misses
+
+        inputs = np.repeat(np.where(observed, x, 0.0)[:, None], u.shape[1], axis=1)
+        fire = np.zeros(u.shape, dtype=bool)
+        misses = np.zeros((len(self.engine.seg_node), u.shape[1]), dtype=np.int32)
+        for nodes, edges, starts, parents, link in compiled.schedule():
+            p = np.minimum(link[:, None] * inputs[parents], 1.0) + EPSILON
+            fire[edges] = level_fire = u[edges] < p
+            segs = self.seg_of_node[nodes]
+            misses[segs] = np.add.reduceat(~level_fire, starts, axis=0, dtype=np.int32)
+            inputs[nodes] = np.where(observed[nodes, None], x[nodes, None], misses[segs] > 0)
+        return inputs, fire, misses
+
+    def _log_weights(self, x, observed, states, conditioning):
+        """Log importance weight of each sample given the observed states."""
+        n_samples = states.shape[1]
+        if conditioning == NO_CONDITIONING:
+            return np.zeros(n_samples)
+        nodes = np.flatnonzero(observed & self.compiled.has_parents)
+        if not len(nodes):
+            return np.zeros(n_samples)
+        on = states[self.seg_of_node[nodes]]
+        e = np.clip(x[nodes], 0.0, 1.0)[:, None]
+        if conditioning == "reject":
+            keep = (on == (e >= 0.5)).all(axis=0)
+            return np.where(keep, 0.0, -np.inf)
+        with np.errstate(divide="ignore"):
+            return np.log(np.where(on, e, 1.0 - e)).sum(axis=0)
+
+    def _twin_deltas(self, x, observed, u, factual, node_idx, layout, mode, propagation):
+        """
+        Per-sample symptom deltas (scored pairs × samples) for every
+        intervention. Only edges whose firing can change are re-drawn: the
+        intervened node's own edges and, for multilayer, the edges out of
+        its descendants. Each twin node's miss count is the factual count
+        corrected for those edges.
+        """
+        engine, compiled = self.engine, self.compiled
+        inputs, fire, misses = factual
+        ptr, all_segs, counts, _, scored = layout
+        link_value = INTERVENTION_LINK[mode]
+        level = compiled.topological_levels()
+        n = len(compiled)
+        out = []
+        for start in range(0, len(node_idx), engine.batch_size):
+            batch = node_idx[start:start + engine.batch_size]
+            batch_counts = counts[start:start + len(batch)]
+            owner = np.repeat(np.arange(len(batch)), batch_counts)
+            segs = all_segs[_ranges(ptr[batch], batch_counts)]
+            if not len(segs):
+                continue
+            nodes = engine.seg_node[segs]
+            keys = owner * n + nodes  # sorted: owner-major, segments ascending
+
+            # Changed edges, grouped by the (intervention, child) pair they feed
+            src_owner, src = np.arange(len(batch)), batch
+            if propagation == MULTILAYER:
+                src_owner, src = np.concatenate((src_owner, owner)), np.concatenate((src, nodes))
+            edge_counts = engine.child_ptr[src + 1] - engine.child_ptr[src]
+            edge_owner = np.repeat(src_owner, edge_counts)
+            edges = engine.child_edges[_ranges(engine.child_ptr[src], edge_counts)]
+            col = np.searchsorted(keys, edge_owner * n + engine.edge_child[edges])
+            order = np.argsort(col, kind="stable")
+            edge_owner, edges, col = edge_owner[order], edges[order], col[order]
+            parents = compiled.edge_parents[edges]
+            is_target = parents == batch[edge_owner]
+            link = np.where(is_target, link_value, compiled.edge_link[edges])
+
+            twin_misses = misses[segs]
+            if propagation != MULTILAYER:
+                groups = [np.arange(len(edges))]
+            else:
+                edge_level = level[engine.edge_child[edges]]
+                groups = [np.flatnonzero(edge_level == lv) for lv in np.unique(edge_level)]
+                # Descendant parents read their twin input
+                at = np.minimum(np.searchsorted(keys, edge_owner * n + parents), len(keys) - 1)
+                twin_in = inputs[nodes]
+
+            for sel in groups:
+                if propagation != MULTILAYER:
+                    inp = x[parents[sel], None]
+                else:
+                    inp = np.where(is_target[sel, None], inputs[parents[sel]], twin_in[at[sel]])
+                p = np.minimum(link[sel, None] * inp, 1.0) + EPSILON
+                # misses gained = old fire − new fire, summed per pair
+                gained = fire[edges[sel]].astype(np.int32) - (u[edges[sel]] < p)
+                starts = np.flatnonzero(np.r_[True, col[sel][1:] != col[sel][:-1]])
+                cols = col[sel][starts]
+                twin_misses[cols] += np.add.reduceat(gained, starts, axis=0)
+                if propagation == MULTILAYER:
+                    twin_in[cols] = np.where(
+                        observed[nodes[cols], None], x[nodes[cols], None], twin_misses[cols] > 0
+                    )
+
+            orig = (misses[segs] > 0).view(np.int8)
+            twin = (twin_misses > 0).view(np.int8)
+            delta = orig - twin if mode == "disable" else twin - orig
+            if propagation == MULTILAYER:
+                # Observed nodes are clamped to their evidence in both worlds
+                delta[observed[nodes]] = 0
+            out.append(delta)
+        if not out:
+            return np.zeros((0, u.shape[1]), dtype=np.int8)
+        return np.concatenate(out)[scored]
+
+
+def _summarize(w, total, delta, scored_counts):
+    """Weighted scores and standard errors from per-sample symptom deltas (pairs × samples)."""
+    scores = np.zeros(len(scored_counts), dtype=np.float64)
+    stderr = np.zeros(len(scored_counts), dtype=np.float64)
+    has = np.flatnonzero(scored_counts)
+    if not len(has):
+        return scores, stderr
+    # A symptom counts when its expected delta is positive, as in the exact
+    # engine; the per-sample score sums the deltas of those symptoms
+    mean = (delta @ w) / total
+    counted = np.where(mean[:, None] > 0, delta, 0).astype(np.float64)
+    starts = (np.cumsum(scored_counts) - scored_counts)[has]
+    per_sample = np.add.reduceat(counted, starts, axis=0)
+    est = (per_sample @ w) / total
+    scores[has] = est
+    stderr[has] = np.sqrt(((per_sample - est[:, None]) ** 2) @ (w ** 2)) / total
+    return scores, stderr
+
+
+# ------------------------------------------------------------------------
+# DICT-LEVEL WRAPPERS
+# ------------------------------------------------------------------------
+def sampler_for(compiled: CompiledNetwork) -> MonteCarloEngine:
+    """Return the Monte Carlo engine attached to a compiled network, building it once."""
+    sampler = getattr(compiled, "_mc_engine", None)
+    if sampler is None:
+        sampler = compiled._mc_engine = MonteCarloEngine(engine_for(compiled))
+    return sampler
+
+
+def monte_carlo_scores(compiled: CompiledNetwork, evidence: dict, disease_ids, symptom_nodes,
+                       settings: MonteCarloSettings, modes=("disable", "force"),
+                       propagation=ONE_HOP):
+    """
+    Monte Carlo form of counterfactual.counterfactual_scores. Returns
+    ({mode: {disease_id: score}}, {mode: {disease_id: stderr}}, ess);
+    diseases that are not in the network score 0.0 with error 0.0.
+    """
+    x = compiled.evidence_vector(evidence)
+    observed = compiled.observed_mask(evidence)
+    _, symptom_idx = _resolve(compiled, symptom_nodes)
+    pos, disease_idx = _resolve(compiled, disease_ids)
+    est, err, ess = sampler_for(compiled).estimate(
+        x, observed, disease_idx, symptom_idx, settings, modes, propagation
+    )
+
+    scores, stderr = {}, {}
+    for mode in modes:
+        s = np.zeros(len(disease_ids), dtype=np.float64)
+        e = np.zeros(len(disease_ids), dtype=np.float64)
+        s[pos], e[pos] = est[mode], err[mode]
+        scores[mode] = {did: float(v) for did, v in zip(disease_ids, s)}
+        stderr[mode] = {did: float(v) for did, v in zip(disease_ids, e)}
+    return scores, stderr, ess
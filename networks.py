@@ -0,0 +1,241 @@
+import hashlib
+import json
+import logging
+import math
+import numbers
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from cache import file_digest
+from compiled import ARRAY_FIELDS, CompiledNetwork, compile_network
+from constants import NETWORKS_FILE
+from counterfactual import ENGINE_ARRAY_FIELDS, CounterfactualEngine, engine_for
+from utils import load_from_json
+
+# ------------------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------------------
+NETWORK_CACHE_DIRNAME = "cache"    # under the data folder by default
+NETWORK_CACHE_PREFIX = "networks"
+NETWORK_CACHE_META = "meta.json"
+NETWORK_CACHE_VERSION = 1          # bump when the stored arrays change
+MAX_REPORTED_PROBLEMS = 20
+
+NOISY_OR_LABELS = ("Disease", "Symptom")
+
+logger = logging.getLogger(__name__)
+
+
+class NetworkValidationError(ValueError):
+    """A networks file that does not match the schema inference relies on."""
+
+
+# ------------------------------------------------------------------------
+# VALIDATION (once per networks file)
+# ------------------------------------------------------------------------
+def network_problems(name, network) -> list:
+    """
+    Schema problems of one network dict, as readable messages: nodes that
+    are not objects, missing labels, malformed parent lists, parents that
+    are not in the network, self-loops, malformed CPTs, and parents of
+    Disease/Symptom nodes whose CPT[0] is not a finite number
+    (helpers.noisy_or reads it as 1 − link strength; values outside [0, 1]
+    occur in the shipped networks and are clamped by the Noisy-OR).
+    """
+    if not isinstance(network, dict):
+        return [f"network '{name}': expected an object of nodes, got {type(network).__name__}"]
+
+    problems = []
+    noisy_or_parents = set()
+    for nid, node in network.items():
+        where = f"network '{name}', node '{nid}'"
+        if not isinstance(node, dict):
+            problems.append(f"{where}: expected an object, got {type(node).__name__}")
+            continue
+        label = node.get("label")
+        if not isinstance(label, str):
+            problems.append(f"{where}: missing or non-string 'label'")
+        parents = node.get("parents", [])
+        if not isinstance(parents, list):
+            problems.append(f"{where}: 'parents' must be a list")
+            parents = []
+        for pid in parents:
+            if not isinstance(pid, str) or pid not in network:
+                problems.append(f"{where}: parent {pid!r} is not in the network")
+            elif pid == nid:
+                problems.append(f"{where}: node is its own parent")
+            elif label in NOISY_OR_LABELS:
+                noisy_or_parents.add(pid)
+        cpt = node.get("cpt", [1.0, 0.0])
+        if not isinstance(cpt, list) or not cpt:
+            problems.append(f"{where}: 'cpt' must be a non-empty list")
+
+    for pid in network:
+        if pid not in noisy_or_parents or not isinstance(network[pid], dict):
+            continue
+        cpt = network[pid].get("cpt", [1.0, 0.0])
+        if not isinstance(cpt, list) or not cpt:
+            continue  # reported above
+        leak = cpt[0]
+        if isinstance(leak, bool) or not isinstance(leak, numbers.Real) or not math.isfinite(leak):
+            problems.append(
+                f"network '{name}', node '{pid}': parent of a Disease/Symptom node needs "
+                f"a finite number as cpt[0], got {leak!r}"
+            )
+    return problems
+
+
+def validate_network(name, network) -> CompiledNetwork:
+    """
+    Check one network dict (schema, then acyclicity via
+    CompiledNetwork.topological_levels) and return its compiled form.
+    Raises NetworkValidationError listing the problems.
+    """
+    problems = network_problems(name, network)
+    compiled = None
+    if not problems:
+        compiled = compile_network(network)
+        try:
+            compiled.topological_levels()
+        except ValueError:
+            problems.append(f"network '{name}': parent links form a cycle")
+    if problems:
+        shown = problems[:MAX_REPORTED_PROBLEMS]
+        more = len(problems) - len(shown)
+        raise NetworkValidationError(
+            "invalid network file:\n  " + "\n  ".join(shown)
+            + (f"\n  ... and {more} more" if more else "")
+        )
+    return compiled
+
+
+def validate_networks(network_data) -> dict:
+    """validate_network for every network: {name: CompiledNetwork}."""
+    if not isinstance(network_data, dict):
+        raise NetworkValidationError("invalid network file: expected an object of networks")
+    return {name: validate_network(name, network) for name, network in network_data.items()}
+
+
+# ------------------------------------------------------------------------
+# PRECOMPUTE CACHE (one .npy file per array, memory-mapped on load)
+# ------------------------------------------------------------------------
+def write_network_cache(compiled_networks: dict, path):
+    """
+    Store node IDs, labels, the compiled arrays, topological levels and the
+    counterfactual engine's arrays of every network under directory `path`.
+    The directory is written under a temporary name and renamed into place,
+    so readers never see a partial cache.
+    """
+    path = Path(path)
+    tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    meta = {"version": NETWORK_CACHE_VERSION, "networks": []}
+    for k, (name, compiled) in enumerate(compiled_networks.items()):
+        table = sorted(set(compiled.labels))
+        code = {label: c for c, label in enumerate(table)}
+        arrays = {
+            "node_ids": np.array(compiled.node_ids, dtype=str),
+            "labels": np.array([code[label] for label in compiled.labels], dtype=np.int16),
+            "levels": compiled.topological_levels(),
+            **compiled.to_arrays(),
+            **{f"engine.{f}": a for f, a in engine_for(compiled).to_arrays().items()},
+        }
+        for field, array in arrays.items():
+            np.save(tmp / f"{k}.{field}.npy", np.asarray(array), allow_pickle=False)
+        meta["networks"].append({"name": name, "labels": table})
+    with open(tmp / NETWORK_CACHE_META, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        # Either another process stored the same cache first, or `path`
+        # holds a stale / partial cache that would never be replaced
+        try:
+            read_network_cache(path)
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(path, ignore_errors=True)
+            try:
+                os.replace(tmp, path)
+                return
+            except OSError:
+                pass
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _load_array(path, mmap):
+    try:
+        array = np.load(path, mmap_mode="r" if mmap else None, allow_pickle=False)
+    except ValueError:  # zero-length arrays cannot be mapped
+        array = np.load(path, allow_pickle=False)
+    return np.asarray(array)
+
+
+def read_network_cache(path, mmap=True) -> dict:
+    """
+    {name: CompiledNetwork} from a write_network_cache directory, with the
+    counterfactual engines attached. With mmap (default) the arrays are
+    read-only memory maps, so processes share one copy in the page cache.
+    """
+    path = Path(path)
+    with open(path / NETWORK_CACHE_META, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != NETWORK_CACHE_VERSION:
+        raise ValueError(f"network cache version {meta.get('version')} != {NETWORK_CACHE_VERSION}")
+
+    compiled_networks = {}
+    for k, entry in enumerate(meta["networks"]):
+        def load(field):
+            return _load_array(path / f"{k}.{field}.npy", mmap)
+
+        table = entry["labels"]
+        compiled = CompiledNetwork.from_arrays(
+            load("node_ids").tolist(),
+            [table[c] for c in load("labels").tolist()],
+            {field: load(field) for field in ARRAY_FIELDS},
+            levels=load("levels"),
+        )
+        compiled._cf_engine = CounterfactualEngine.from_arrays(
+            compiled, {field: load(f"engine.{field}") for field in ENGINE_ARRAY_FIELDS}
+        )
+        compiled_networks[entry["name"]] = compiled
+    return compiled_networks
+
+
+def network_cache_path(datapath, filename=NETWORKS_FILE, cache_dir=None) -> Path:
+    """Cache directory of a networks file, keyed on its contents."""
+    if cache_dir is None:
+        cache_dir = Path(datapath) / NETWORK_CACHE_DIRNAME
+    key = hashlib.sha256(json.dumps(
+        [NETWORK_CACHE_VERSION, file_digest(Path(datapath) / filename)]
+    ).encode("utf-8")).hexdigest()
+    return Path(cache_dir) / f"{NETWORK_CACHE_PREFIX}-{key[:16]}"
+
+
+def load_network_cache(datapath, filename=NETWORKS_FILE, cache_dir=None) -> dict:
+    """
+    Validated, compiled networks with their counterfactual engines. The
+    first load of a networks file parses and validates it, then stores the
+    precomputed arrays under `cache_dir` (default <datapath>/cache), keyed
+    by the file's sha256. Later loads, in any process, memory-map them
+    instead of parsing the JSON again. cache_dir=False skips the cache.
+    """
+    if cache_dir is False:
+        return validate_networks(load_from_json(Path(datapath) / filename))
+
+    path = network_cache_path(datapath, filename, cache_dir)
+    if (path / NETWORK_CACHE_META).exists():
+        try:
+            return read_network_cache(path)
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning(f"Ignoring unreadable network cache {path}: {exc}")
+
+    compiled_networks = validate_networks(load_from_json(Path(datapath) / filename))
+    try:
+        write_network_cache(compiled_networks, path)
+    except OSError as exc:
+        logger.warning(f"Could not write network cache {path}: {exc}")
+    return compiled_networks
@@ -1,4 +1,5 @@
 import json
+from itertools import islice
 from constants import VIGNETTES_FILE, DATA_PATH
 from pathlib import Path
 
@@ -11,19 +12,129 @@ SEVERITY_MAPPING = {
     "SEVERE": 1.2,  # if used
 }
 
+READ_CHUNK = 1 << 20  # characters read per step by the streaming parser
+
 def load_vignettes(path: Path = DATA_PATH / VIGNETTES_FILE):
     """Load raw vignettes from JSON file."""
     path = Path(path)
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+def _iter_json_object(f, chunk_size=READ_CHUNK):
+    """
+    Incrementally parse a top-level JSON object from a text file, yielding
+    (key, value) pairs as soon as each value is complete. Only the current
+    entry plus one read chunk is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf, pos = buf[pos:] + chunk, 0
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    def expect(chars):
+        nonlocal pos
+        skip_ws()
+        if pos >= len(buf) or buf[pos] not in chars:
+            found = buf[pos:pos + 20] if pos < len(buf) else "end of file"
+            raise ValueError(f"expected one of {chars!r} in vignette file, found {found!r}")
+        pos += 1
+        return buf[pos - 1]
+
+    def value():
+        nonlocal pos
+        skip_ws()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # a number could still continue in the next chunk
+            if end == len(buf) and not eof and not isinstance(obj, (dict, list, str)):
+                fill()
+                continue
+            pos = end
+            return obj
+
+    expect("{")
+    skip_ws()
+    if pos < len(buf) and buf[pos] == "}":
+        return
+    while True:
+        key = value()
+        expect(":")
+        yield key, value()
+        if expect(",}") == "}":
+            return
+
+
+def iter_vignettes(path: Path = DATA_PATH / VIGNETTES_FILE, first_n=None):
+    """
+    Lazily yield (vignette_id, vignette) from a vignette file without loading
+    it whole. Accepts the vignettes.json layout ({id: vignette, ...}) or JSON
+    Lines (*.jsonl), where each line is one {id: vignette} entry. With
+    first_n, reading stops after N records.
+    """
+    path = Path(path)
+    with open(path, "r", encoding="utf-8") as f:
+        if path.suffix == ".jsonl":
+            records = (
+                pair
+                for line in f if line.strip()
+                for pair in json.loads(line).items()
+            )
+        else:
+            records = _iter_json_object(f)
+        yield from islice(records, first_n)
+
+
+def iter_casecards(path: Path = DATA_PATH / VIGNETTES_FILE, first_n=None):
+    """Lazily yield (vignette_id, card) with severity_numeric attached on the fly."""
+    for vignette_id, vignette in iter_vignettes(path, first_n):
+        yield vignette_id, convert_card_severity(vignette.get("card", {}))
+
+
+def save_vignettes_jsonl(vignettes, output_path: Path):
+    """Write (vignette_id, vignette) pairs, or a vignettes dict, as JSON Lines."""
+    items = vignettes.items() if isinstance(vignettes, dict) else vignettes
+    with open(output_path, "w", encoding="utf-8") as f:
+        for vignette_id, vignette in items:
+            f.write(json.dumps({vignette_id: vignette}) + "\n")
+
+
+def convert_card_severity(card: dict, copy=False) -> dict:
+    """
+    Convert symbolic severity into numeric for one casecard. With copy, the
+    card is left as it is and a converted copy (new symptom dicts) is returned.
+    """
+    if copy and "symptoms" in card:
+        card = {**card, "symptoms": [dict(symptom) for symptom in card["symptoms"]]}
+    for symptom in card.get("symptoms", []):
+        severity_str = symptom.get("severity", "PRESENT")  # fallback to PRESENT
+        numeric_value = SEVERITY_MAPPING.get(severity_str.strip().upper(), 1.0)
+        symptom["severity_numeric"] = numeric_value  # add new key
+    return card
+
 def convert_symptom_severity(vignettes: dict) -> dict:
     """Convert symbolic severity into numeric for all vignettes."""
     for vignette_id, vignette_data in vignettes.items():
-        for symptom in vignette_data.get("card", {}).get("symptoms", []):
-            severity_str = symptom.get("severity", "PRESENT")  # fallback to PRESENT
-            numeric_value = SEVERITY_MAPPING.get(severity_str.strip().upper(), 1.0)
-            symptom["severity_numeric"] = numeric_value  # add new key
+        convert_card_severity(vignette_data.get("card", {}))
     return vignettes
 
 def extract_risk_factor_ids(vignettes: dict) -> set:
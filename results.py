@@ -1,13 +1,45 @@
+import argparse
+import html
 import json
-import seaborn as sns
-import pandas as pd
 from collections import defaultdict
 import numpy as np
-import matplotlib.pyplot as plt
 from pathlib import Path
 
-from constants import VIGNETTES_FILE, RESULTS_FILE, DATA_PATH
+from constants import (
+    VIGNETTES_FILE, RESULTS_FILE, RESULTS_COLUMNAR_FILE, RESULTS_TOP_K_FILE, RESULTS_STATS_FILE,
+    RESULTS_RUN_FILE, DATA_PATH,
+)
 from utils import load_from_json
+from columnar import ColumnarResults, TopKResults, load_columnar, load_top_k
+from evaluation import COUNTERFACTUAL_METHODS, TOP_N, evaluate
+from stats import DEFAULT_CONFIDENCE, DEFAULT_RESAMPLES, DEFAULT_SEED, statistics_report
+
+METHOD_LABELS = {"posterior": "Posterior", "disablement": "Disablement", "sufficiency": "Sufficiency"}
+HIST_BINS = 30
+FIGURE_FORMATS = ("png", "svg")
+REPORT_INDEX_JSON = "index.json"
+REPORT_INDEX_HTML = "index.html"
+
+
+def load_results(results_folder: Path):
+    """
+    Load experiment results, preferring the columnar .npz (milliseconds to
+    load), then the --store top_k .npz, and falling back to
+    experimental_results.json.
+    """
+    columnar_path = results_folder / RESULTS_COLUMNAR_FILE
+    if columnar_path.exists():
+        return load_columnar(columnar_path)
+    top_k_path = results_folder / RESULTS_TOP_K_FILE
+    if top_k_path.exists():
+        return load_top_k(top_k_path)
+    return load_from_json(results_folder / RESULTS_FILE)
+
+
+def load_run_settings(results_folder: Path):
+    """Options the run recorded next to its results ({} for older runs)."""
+    path = results_folder / RESULTS_RUN_FILE
+    return load_from_json(path) if path.exists() else {}
 
 
 def top_n_accuracy(results_dict, vignettes, method_key, N=20):
@@ -16,7 +48,7 @@ def top_n_accuracy(results_dict, vignettes, method_key, N=20):
     for vid, result in results_dict.items():
         card = vignettes[vid]
         true_disease = card["card"]["diseases"][0]["id"]
-        scores = result.get(method_key, {})
+        scores = {d: s for d, s in result.get(method_key, {}).items() if not np.isnan(s)}
         if true_disease not in scores:
             continue
         sorted_diseases = sorted(scores, key=scores.get, reverse=True)
@@ -27,13 +59,30 @@ def top_n_accuracy(results_dict, vignettes, method_key, N=20):
     return topn_hits / total if total else np.zeros(N)
 
 
-def plot_topn_accuracy(all_results, vignettes):
-    methods = ["posterior", "disablement", "sufficiency"]
-    labels = {"posterior": "Posterior", "disablement": "Disablement", "sufficiency": "Sufficiency"}
+# Plotting libraries are imported inside the plot functions, so loading
+# results and computing metrics does not pay for matplotlib/pandas/seaborn.
+# Each figure has a draw_* function that only takes aggregated data (see
+# figure_data); the plot_* functions draw one figure from the results and
+# show it.
+def plot_topn_accuracy(all_results, vignettes, report=None):
+    import matplotlib.pyplot as plt
 
-    for method in methods:
-        acc = top_n_accuracy(all_results, vignettes, method)
-        plt.plot(range(1, 21), acc, label=labels[method])
+    curves = {}
+    for method in METHOD_LABELS:
+        if report is not None:
+            curves[method] = report[method]["topn"]
+        else:
+            curves[method] = top_n_accuracy(all_results, vignettes, method)
+    draw_topn_accuracy(curves)
+    plt.show()
+
+
+def draw_topn_accuracy(curves):
+    import matplotlib.pyplot as plt
+
+    plt.figure()
+    for method, acc in curves.items():
+        plt.plot(range(1, len(acc) + 1), acc, label=METHOD_LABELS[method])
 
     plt.xlabel("Top-N")
     plt.ylabel("Accuracy")
@@ -41,7 +90,6 @@ def plot_topn_accuracy(all_results, vignettes):
     plt.legend()
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
 
 
 def doctor_score_matrix(vignettes, results_dict):
@@ -74,7 +122,7 @@ def stratify_by_rareness(vignettes, results_dict, key):
         true_id = card["card"]["diseases"][0]["id"]
         rareness = card["card"]["diseases"][0].get("rareness", "unknown")
         score_dict = result[key]
-        if true_id in score_dict:
+        if true_id in score_dict and not np.isnan(score_dict[true_id]):
             rarity_scores[rareness].append(score_dict[true_id])
     return {
         k: {"mean": float(np.mean(v)), "std": float(np.std(v))}
@@ -83,25 +131,103 @@ def stratify_by_rareness(vignettes, results_dict, key):
 
 
 def plot_score_distributions(results_dict):
-    methods = ["posterior", "disablement", "sufficiency"]
+    import matplotlib.pyplot as plt
+
+    draw_score_distributions(figure_data(results_dict, {}, heatmaps=False)["histograms"])
+    plt.show()
+
+
+def draw_score_distributions(histograms):
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(15, 4))
-    for i, method in enumerate(methods):
-        scores = []
-        for v in results_dict.values():
-            scores.extend(list(v.get(method, {}).values()))
+    for i, (method, (counts, edges)) in enumerate(histograms.items()):
         plt.subplot(1, 3, i + 1)
-        plt.hist(scores, bins=30, color="skyblue", edgecolor="black")
+        # pre-binned: the same bars as plt.hist(scores, bins=30)
+        plt.hist(edges[:-1], bins=edges, weights=counts, color="skyblue", edgecolor="black")
         plt.title(f"{method.title()} Score Distribution")
         plt.xlabel("Score")
         plt.ylabel("Frequency")
         plt.grid(True)
     plt.tight_layout()
-    plt.show()
 
 
 def plot_rareness_vs_avg_severity_heatmap(vignettes, results_dict, metric="posterior"):
-    heatmap_data = defaultdict(list)
-    for vid, result in results_dict.items():
+    import matplotlib.pyplot as plt
+
+    draw_severity_heatmap(figure_data(results_dict, vignettes)["heatmaps"][metric], metric)
+    plt.show()
+
+
+def draw_severity_heatmap(table, metric):
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import seaborn as sns
+
+    df = pd.DataFrame(table).T.sort_index()
+    df = df.fillna(0)
+    plt.figure(figsize=(10, 6))
+    sns.heatmap(df, annot=True, cmap="YlGnBu", fmt=".2f")
+    plt.title(f"Avg {metric.title()} Score by Rareness × Avg Severity")
+    plt.xlabel("Avg Symptom Severity")
+    plt.ylabel("Disease Rareness")
+    plt.tight_layout()
+
+
+# ------------------------------------------------------------------------
+# FIGURE DATA (one pass over the results)
+# ------------------------------------------------------------------------
+def _true_score_lookup(results):
+    """f(row, v_id, method, true_id) → score or None, without building row dicts."""
+    if isinstance(results, ColumnarResults):
+        def lookup(row, v_id, method, true_id):
+            c = results.col.get(true_id)
+            value = np.nan if c is None else results.matrix(method)[row, c]
+            return None if np.isnan(value) else float(value)
+    elif isinstance(results, TopKResults):
+        # recorded over all diseases at run time, not just the kept top K
+        def lookup(row, v_id, method, true_id):
+            value = results.true_scores[method][row]
+            return None if np.isnan(value) else float(value)
+    else:
+        def lookup(row, v_id, method, true_id):
+            return results[v_id].get(method, {}).get(true_id)
+    return lookup
+
+
+def _stored_scores(results, method):
+    """Every stored score of one method in a columnar or top-K results set."""
+    if isinstance(results, ColumnarResults):
+        matrix = results.matrix(method)
+        return matrix[~np.isnan(matrix)]
+    return results.top_scores[method][results.top_cols[method] >= 0]
+
+
+def figure_data(results_dict, vignettes, report=None, heatmaps=True, bins=HIST_BINS,
+                pruned_top_k=None):
+    """
+    Everything the figures draw, aggregated in one pass over the results:
+      {"topn": {method: curve},                      (from an evaluate report)
+       "histograms": {method: (counts, edges)},      (np.histogram, as plt.hist bins)
+       "heatmaps": {method: {rareness: {avg_severity: mean true-disease score}}}}
+    The result is small, so figures can be drawn from it in other processes.
+    For a --prune-top-k run (`pruned_top_k`), the counterfactual methods
+    only have scores for their top K, so they get no histogram or heatmap.
+    """
+    columnar = isinstance(results_dict, (ColumnarResults, TopKResults))
+    lookup = _true_score_lookup(results_dict)
+    score_methods = [
+        method for method in METHOD_LABELS
+        if pruned_top_k is None or method not in COUNTERFACTUAL_METHODS
+    ]
+    scores = {method: [] for method in score_methods}
+    cells = {method: defaultdict(list) for method in score_methods}
+    for row, vid in enumerate(results_dict):
+        if not columnar:
+            for method in score_methods:
+                scores[method].extend(results_dict[vid].get(method, {}).values())
+        if not heatmaps:
+            continue
         card = vignettes[vid]["card"]
         rareness = card["diseases"][0].get("rareness", "unknown")
         true_id = card["diseases"][0]["id"]
@@ -111,49 +237,240 @@ def plot_rareness_vs_avg_severity_heatmap(vignettes, results_dict, metric="poste
             if s.get("severity_numeric", 0.0) > 0
         ]
         avg_sev = round(np.mean(severities), 1) if severities else 0.0
-        score = result.get(metric, {}).get(true_id)
-        if score is not None:
-            heatmap_data[(rareness, avg_sev)].append(score)
-    data = defaultdict(dict)
-    for (rareness, avg_sev), scores in heatmap_data.items():
-        data[rareness][avg_sev] = np.mean(scores)
-    df = pd.DataFrame(data).T.sort_index()
-    df = df.fillna(0)
-    plt.figure(figsize=(10, 6))
-    sns.heatmap(df, annot=True, cmap="YlGnBu", fmt=".2f")
-    plt.title(f"Avg {metric.title()} Score by Rareness × Avg Severity")
-    plt.xlabel("Avg Symptom Severity")
-    plt.ylabel("Disease Rareness")
-    plt.tight_layout()
-    plt.show()
+        for method in score_methods:
+            score = lookup(row, vid, method, true_id)
+            if score is not None:
+                cells[method][(rareness, avg_sev)].append(score)
+
+    data = {"histograms": {}, "heatmaps": {}}
+    if report is not None:
+        data["topn"] = {method: report[method]["topn"] for method in METHOD_LABELS}
+    for method in score_methods:
+        values = _stored_scores(results_dict, method) if columnar else scores[method]
+        data["histograms"][method] = np.histogram(np.asarray(values, dtype=np.float64), bins=bins)
+        table = defaultdict(dict)
+        for (rareness, avg_sev), values in cells[method].items():
+            table[rareness][avg_sev] = np.mean(values)
+        data["heatmaps"][method] = dict(table)
+    return data
+
+
+def figure_specs(data):
+    """(name, title, draw function, kwargs) of every figure, in display order."""
+    specs = [
+        ("topn_accuracy", "Top-N Accuracy Comparison", draw_topn_accuracy,
+         {"curves": data["topn"]}),
+        ("score_distributions", "Score Distributions", draw_score_distributions,
+         {"histograms": data["histograms"]}),
+    ]
+    for metric in data["heatmaps"]:
+        specs.append((
+            f"heatmap_{metric}", f"Avg {metric.title()} Score by Rareness × Avg Severity",
+            draw_severity_heatmap, {"table": data["heatmaps"][metric], "metric": metric},
+        ))
+    return specs
+
+
+# ------------------------------------------------------------------------
+# HEADLESS REPORT (figures rendered in parallel with the Agg backend)
+# ------------------------------------------------------------------------
+def _load_plotting():
+    """Select the non-GUI Agg backend and import the plotting modules."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import pandas  # noqa: F401  (heatmaps)
+    import seaborn  # noqa: F401
+    return plt
+
+
+def _render_figure(task):
+    """Draw one figure off-screen and save it once per format; returns the file names."""
+    name, draw, kwargs, out_dir, formats = task
+    plt = _load_plotting()
+    draw(**kwargs)
+    files = []
+    for fmt in formats:
+        plt.savefig(Path(out_dir) / f"{name}.{fmt}", format=fmt)
+        files.append(f"{name}.{fmt}")
+    plt.close("all")
+    return files
+
+
+def render_report(specs, out_dir: Path, formats=FIGURE_FORMATS, workers=1):
+    """
+    Render every figure to `out_dir` without a display (one process per
+    figure with workers > 1) and write index.json and index.html listing
+    them. Returns the index.html path.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tasks = [(name, draw, kwargs, str(out_dir), tuple(formats)) for name, _, draw, kwargs in specs]
+    # Imported once here, so forked workers start with the modules loaded
+    _load_plotting()
+    if workers > 1 and len(tasks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            files = list(pool.map(_render_figure, tasks))
+    else:
+        files = [_render_figure(task) for task in tasks]
+
+    figures = [
+        {"name": name, "title": title, "files": names}
+        for (name, title, _, _), names in zip(specs, files)
+    ]
+    with open(out_dir / REPORT_INDEX_JSON, "w", encoding="utf-8") as f:
+        json.dump({"figures": figures}, f, indent=2)
+
+    lines = ["<!DOCTYPE html>", '<html><head><meta charset="utf-8"><title>Results</title></head><body>']
+    for figure in figures:
+        shown = next((n for n in figure["files"] if n.endswith(".svg")), figure["files"][0])
+        lines.append(f"<h2>{html.escape(figure['title'])}</h2>")
+        lines.append(f'<img src="{html.escape(shown)}" alt="{html.escape(figure["name"])}">')
+    lines.append("</body></html>")
+    index = out_dir / REPORT_INDEX_HTML
+    index.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return index
 
 
-def main(results_folder: Path = Path("my_results")):
+def print_statistics(stats, ks=(1, 5, 10, 20)):
+    """Bootstrap CIs and method-vs-doctor tests from stats.statistics_report."""
+    for method, intervals in stats["intervals"].items():
+        print(f"\n>> {method.title()} Confidence Intervals")
+        for stratum, topn in intervals["topn"].items():
+            doctor = intervals["doctor"][stratum]
+            cells = [
+                f"top{k}={_ci(topn['estimate'][k - 1], topn['low'][k - 1], topn['high'][k - 1])}"
+                for k in ks if k <= len(topn["estimate"])
+            ]
+            cells.append(f"doctor={_ci(doctor['estimate'], doctor['low'], doctor['high'])}")
+            print(f"  {stratum:17} n={topn['n']:<5} " + " ".join(cells))
+
+    for method, strata in stats["tests"].items():
+        print(f"\n>> {method.title()} vs Doctors (one-sided binomial test)")
+        for stratum, test in strata.items():
+            matched = test["matched"]
+            if test["doctor_rate"] is None:
+                continue
+            better = [k for k, sig in enumerate(test["significant"], 1) if sig]
+            print(
+                f"  {stratum:17} doctors={test['doctor_rate']:.3f} "
+                f"matched={matched['method_rate']:.3f} (p={matched['pvalue']:.3g}) "
+                f"better at top-N: {better[0] if better else 'none'}"
+                f"{'+' if better else ''}"
+            )
+
+
+def _ci(estimate, low, high):
+    if estimate is None:
+        return "n/a"
+    return f"{estimate:.3f}[{low:.3f},{high:.3f}]"
+
+
+def main(results_folder: Path = Path("my_results"), n_resamples=DEFAULT_RESAMPLES,
+         confidence=DEFAULT_CONFIDENCE, seed=DEFAULT_SEED, workers=1, report_dir=None,
+         formats=FIGURE_FORMATS):
+    """
+    Print the evaluation and show each figure, or with `report_dir` write
+    the figures there as files instead (no display needed).
+    """
     vignettes = load_from_json(DATA_PATH / VIGNETTES_FILE)
-    results_path = results_folder / RESULTS_FILE
-    results_dict = load_from_json(results_path)
+    results_dict = load_results(results_folder)
+
+    # A --prune-top-k run only ranks each counterfactual's top K exactly
+    pruned_top_k = load_run_settings(results_folder).get("prune_top_k")
+    N = TOP_N if pruned_top_k is None else min(TOP_N, pruned_top_k)
+    if pruned_top_k is not None:
+        print(f"\n>> Counterfactuals were pruned to the top {pruned_top_k}: "
+              f"top-N up to {N}, no counterfactual score statistics")
 
-    print("\n>> Top-N Accuracy Plot")
-    plot_topn_accuracy(results_dict, vignettes)
+    # Top-N curves, doctor agreement and rareness strata in one vectorized pass
+    report = evaluate(results_dict, vignettes, N=N, pruned_top_k=pruned_top_k)
+    # Bootstrap CIs and doctor tests, cached next to the results
+    stats = statistics_report(
+        results_dict, vignettes, N=N, n_resamples=n_resamples, confidence=confidence, seed=seed,
+        workers=workers, cache_path=results_folder / RESULTS_STATS_FILE,
+        pruned_top_k=pruned_top_k,
+    )
+    # Data for every figure, aggregated once
+    specs = figure_specs(figure_data(results_dict, vignettes, report, pruned_top_k=pruned_top_k))
+    interactive = report_dir is None
+
+    if interactive:
+        print("\n>> Top-N Accuracy Plot")
+        _show(specs[0])
 
     print("\n>> Doctor Agreement Score")
-    doctor_scores = doctor_score_matrix(vignettes, results_dict)
-    for k, v in doctor_scores.items():
-        print(f"{k.title()} Score: {v:.4f}")
+    for k in report:
+        print(f"{k.title()} Score: {report[k]['doctor']:.4f}")
 
     for metric in ["posterior", "disablement", "sufficiency"]:
-        strat = stratify_by_rareness(vignettes, results_dict, key=metric)
+        strat = report[metric]["rareness"]
+        if not strat:
+            continue
         print(f"\n>> {metric.title()} Results Stratified by Disease Rareness")
         for r, stat in strat.items():
             print(f"  {r:15}: mean={stat['mean']:.3f} std={stat['std']:.3f}")
 
+    print_statistics(stats)
+
+    if not interactive:
+        index = render_report(specs, report_dir, formats, workers)
+        print(f"\n>> Wrote {len(specs)} figures to {index}")
+        return
+
     print("\n>> Score Distribution Histograms")
-    plot_score_distributions(results_dict)
+    _show(specs[1])
 
-    for metric in ["posterior", "disablement", "sufficiency"]:
-        print(f"\n>> Heatmap: {metric.title()} by Rareness × Avg Severity")
-        plot_rareness_vs_avg_severity_heatmap(vignettes, results_dict, metric=metric)
+    for spec in specs[2:]:
+        print(f"\n>> Heatmap: {spec[3]['metric'].title()} by Rareness × Avg Severity")
+        _show(spec)
+
+
+def _show(spec):
+    import matplotlib.pyplot as plt
+
+    _, _, draw, kwargs = spec
+    draw(**kwargs)
+    plt.show()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluate experiment results")
+    parser.add_argument(
+        "--results", type=Path, default=Path("my_results"),
+        help="Folder holding the experiment results"
+    )
+    parser.add_argument(
+        "--resamples", type=int, default=DEFAULT_RESAMPLES,
+        help="Bootstrap resamples for the confidence intervals"
+    )
+    parser.add_argument(
+        "--confidence", type=float, default=DEFAULT_CONFIDENCE,
+        help="Confidence level of the intervals"
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Bootstrap seed")
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Processes drawing bootstrap resamples and rendering figures (results do not depend on it)"
+    )
+    parser.add_argument(
+        "--report", type=Path, default=None, metavar="DIR",
+        help="Write the figures to DIR (no display needed) instead of showing them"
+    )
+    parser.add_argument(
+        "--formats", nargs="+", choices=FIGURE_FORMATS, default=list(FIGURE_FORMATS),
+        help="Figure file formats written with --report"
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.resamples < 1:
+        raise SystemExit("--resamples must be at least 1")
+    if not 0 < args.confidence < 1:
+        raise SystemExit("--confidence must be between 0 and 1")
+    main(args.results, n_resamples=args.resamples, confidence=args.confidence,
+         seed=args.seed, workers=args.workers, report_dir=args.report, formats=args.formats)
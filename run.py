@@ -1,7 +1,13 @@
 import argparse
 from pathlib import Path
 
-from experiments import run_vignettes_experiment
+from experiments import run_vignettes_experiment, DEFAULT_BATCH_SIZE, DEFAULT_CHUNKSIZE
+from columnar import DEFAULT_STORE_TOP_K, STORE_FULL, STORE_MODES
+from compiled import MULTILAYER, ONE_HOP, PROPAGATION_MODES
+from instrumentation import LOG_LEVELS, configure_logging, get_timer, profiled
+from montecarlo import CONDITIONING_MODES, DEFAULT_SEED, NO_CONDITIONING
+
+TIMINGS_FILE = "timings.json"
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Run Causal Diagnostic Experiments")
@@ -14,18 +20,128 @@ def parse_args():
         "--results", type=Path, default=Path("my_results"),
         help="Output folder for storing results"
     )
+    parser.add_argument(
+        "--vignettes", type=Path, default=None,
+        help="Vignette file to stream (.json or .jsonl; default: <datapath>/vignettes.json)"
+    )
     parser.add_argument(
         "--first", type=int, default=None,
         help="Run only the first N vignettes (for debugging or quick test)"
     )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Number of worker processes for scoring vignettes (1 = run in-process)"
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+        help="Vignettes sent to a worker per task when --workers > 1"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+        help="Same-network vignettes scored together in-process (1 = one vignette at a time)"
+    )
+    parser.add_argument(
+        "--cache-size", type=int, default=0,
+        help="In-memory LRU entries for repeated (network, evidence) cases "
+             "(default 0 = off; e.g. 1024)"
+    )
+    parser.add_argument(
+        "--disk-cache", action="store_true",
+        help="Also persist cached results under <results>/cache for re-runs"
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Continue an interrupted run, skipping vignettes already in the result stream"
+    )
+    parser.add_argument(
+        "--no-json", action="store_true",
+        help="Skip the merged JSON export (the .npz is always written)"
+    )
+    parser.add_argument(
+        "--score-dtype", choices=["float32", "float64"], default="float64",
+        help="Precision of the score matrices in experimental_results.npz (float32 halves "
+             "the file but can tie close posteriors and change ranks)"
+    )
+    parser.add_argument(
+        "--store", choices=STORE_MODES, default=STORE_FULL,
+        help="full: every scored node; diseases: Disease scores only; top_k: the "
+             "--store-top-k best diseases per method plus the true disease's rank and score"
+    )
+    parser.add_argument(
+        "--store-top-k", type=int, default=DEFAULT_STORE_TOP_K, metavar="K",
+        help="Diseases kept per method with --store top_k"
+    )
+    parser.add_argument(
+        "--prune-top-k", type=int, default=None, metavar="K",
+        help="Only score counterfactuals exactly for diseases that can reach the top K "
+             "(pruned diseases score NaN; default: exact)"
+    )
+    parser.add_argument(
+        "--propagation", choices=PROPAGATION_MODES, default=ONE_HOP,
+        help="one_hop: Noisy-OR over parent evidence (original); multilayer: exact "
+             "propagation in topological order with observed nodes clamped"
+    )
+    parser.add_argument(
+        "--mc-samples", type=int, default=None, metavar="N",
+        help="Estimate counterfactuals by Monte Carlo with N shared-noise samples per "
+             "vignette instead of the exact pass (standard errors logged at INFO)"
+    )
+    parser.add_argument(
+        "--mc-seed", type=int, default=DEFAULT_SEED,
+        help="Seed of the Monte Carlo noise (each vignette starts from it)"
+    )
+    parser.add_argument(
+        "--mc-conditioning", choices=CONDITIONING_MODES, default=NO_CONDITIONING,
+        help="none: same estimand as the exact pass; weight / reject: condition the "
+             "sampled factual world on the observed nodes"
+    )
+    parser.add_argument(
+        "--log-level", type=str.upper, choices=LOG_LEVELS, default="WARNING",
+        help="Logging level (DEBUG shows per-disease scores)"
+    )
+    parser.add_argument(
+        "--profile", type=Path, nargs="?", const=Path("profile.pstats"), default=None,
+        help="Run under cProfile and write pstats output (relative paths go under --results)"
+    )
     return parser.parse_args()
 
 def main():
     args = parse_args()
+    if args.workers < 1:
+        raise SystemExit("--workers must be at least 1")
+    if args.chunksize < 1:
+        raise SystemExit("--chunksize must be at least 1")
+    if args.prune_top_k is not None and args.prune_top_k < 1:
+        raise SystemExit("--prune-top-k must be at least 1")
+    if args.prune_top_k is not None and args.propagation == MULTILAYER:
+        raise SystemExit("--prune-top-k is only available with --propagation one_hop")
+    if args.store_top_k < 1:
+        raise SystemExit("--store-top-k must be at least 1")
+    if args.mc_samples is not None and args.mc_samples < 1:
+        raise SystemExit("--mc-samples must be at least 1")
+    if args.mc_samples is not None and args.prune_top_k is not None:
+        raise SystemExit("--prune-top-k cannot be combined with --mc-samples")
     args.results.mkdir(parents=True, exist_ok=True)
+    configure_logging(args.log_level)
+
+    profile_path = args.profile
+    if profile_path is not None and not profile_path.is_absolute():
+        profile_path = args.results / profile_path
 
     # Run the vignette experiments (generates posterior, disablement, sufficiency)
-    run_vignettes_experiment(args=args)
+    with profiled(profile_path):
+        run_vignettes_experiment(args=args)
+
+    timer = get_timer()
+    print("\n>> Stage timings")
+    print(timer.format_table())
+    timer.save(args.results / TIMINGS_FILE)
+
+    if args.prune_top_k is not None:
+        skipped = sum(
+            r["items"] for r in timer.rows() if r["stage"].endswith(".skipped")
+        )
+        print(f"\n>> Top-{args.prune_top_k} pruning skipped {skipped} interventions")
 
     print("\n>> Inference complete. Run `python results.py` to evaluate results.")
 
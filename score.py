@@ -0,0 +1,76 @@
+import argparse
+import json
+import sys
+from itertools import islice
+from pathlib import Path
+
+from preprocessing import iter_vignettes
+from service import DEFAULT_TOP_K, DiagnosisService
+
+BATCH_SIZE = 64  # casecards scored together
+
+
+def iter_cards(path, first_n=None):
+    """
+    (id, card) pairs from a vignettes file ({id: vignette}, or JSON Lines),
+    or from a file holding a single casecard or vignette.
+    """
+    vignettes = iter_vignettes(path, first_n)
+    first = next(vignettes, None)
+    if first is None:
+        return
+    key, value = first
+    if key != "card" and isinstance(value, dict) and "card" in value:
+        yield key, value["card"]
+        for v_id, vignette in vignettes:
+            yield v_id, vignette.get("card", {})
+        return
+
+    # Not a vignettes file: the whole file is one casecard (or vignette)
+    vignettes.close()
+    with open(path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    card = payload.get("card", payload)
+    yield card.get("id"), card
+
+
+def score_file(service, path, top_k=DEFAULT_TOP_K, first_n=None, out=sys.stdout):
+    """Score every casecard in path and write one JSON line per card."""
+    cards = iter_cards(path, first_n)
+    while True:
+        batch = list(islice(cards, BATCH_SIZE))
+        if not batch:
+            break
+        responses = service.score_batch([(card, top_k) for _, card in batch])
+        for (v_id, _), response in zip(batch, responses):
+            out.write(json.dumps({"id": v_id, **response}) + "\n")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Score casecards (posterior, disablement, sufficiency) without the experiment pipeline"
+    )
+    parser.add_argument("cards", type=Path, help="Casecard, vignette, vignettes.json or .jsonl file")
+    parser.add_argument(
+        "--datapath", type=Path, default=Path("data"),
+        help="Path to folder containing the networks file"
+    )
+    parser.add_argument(
+        "--top-k", type=int, default=DEFAULT_TOP_K,
+        help="Ranked diseases written per method"
+    )
+    parser.add_argument(
+        "--first", type=int, default=None,
+        help="Score only the first N casecards of a vignettes file"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    service = DiagnosisService.from_datapath(args.datapath)
+    score_file(service, args.cards, top_k=args.top_k, first_n=args.first)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from instrumentation import LOG_LEVELS, configure_logging
+from service import DEFAULT_TOP_K, DiagnosisService
+
+DEFAULT_MAX_BATCH = 64     # casecards scored together
+DEFAULT_MAX_WAIT_MS = 5.0  # how long the first request in a batch may wait
+DEFAULT_THREADS = 1        # batches scored at the same time
+MAX_BODY_BYTES = 1 << 20
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------------------
+# MICRO-BATCHING
+# ------------------------------------------------------------------------
+class MicroBatcher:
+    """
+    Collects concurrent requests for up to `max_wait` seconds (or until
+    `max_batch` are queued) and scores them in one call off the event loop.
+    Up to `threads` batches are scored at the same time, on a thread pool
+    sharing the service's read-only networks.
+    """
+
+    def __init__(self, service: DiagnosisService, max_batch=DEFAULT_MAX_BATCH,
+                 max_wait=DEFAULT_MAX_WAIT_MS / 1000.0, threads=DEFAULT_THREADS):
+        self.service = service
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.threads = max(1, threads)
+        self.queue = asyncio.Queue()
+
+    async def submit(self, card, top_k=DEFAULT_TOP_K):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((card, top_k, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        free = asyncio.Semaphore(self.threads)
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            while True:
+                await free.acquire()
+                batch = await self._collect()
+                task = asyncio.create_task(self._score(executor, batch, free))
+                running.add(task)
+                task.add_done_callback(running.discard)
+
+    async def _score(self, executor, batch, free):
+        requests = [(card, top_k) for card, top_k, _ in batch]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                executor, self._score_isolated, requests
+            )
+        except Exception as exc:  # keep serving; fail only this batch
+            logger.exception("batch of %d failed", len(batch))
+            results = [exc] * len(batch)
+        finally:
+            free.release()
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _score_isolated(self, requests):
+        """
+        service.score_batch, retried one request at a time when the batch
+        raises, so a card that breaks scoring only fails its own request
+        (its exception is returned in place of the response).
+        """
+        try:
+            return self.service.score_batch(requests)
+        except Exception:
+            logger.exception("batch of %d failed; scoring its requests one by one", len(requests))
+        results = []
+        for request in requests:
+            try:
+                results.extend(self.service.score_batch([request]))
+            except Exception as exc:
+                logger.exception("request failed")
+                results.append(exc)
+        return results
+
+
+# ------------------------------------------------------------------------
+# MINIMAL HTTP/1.1 (keep-alive, JSON in / JSON out)
+# ------------------------------------------------------------------------
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+def _response(status, payload, keep_alive=True):
+    body = json.dumps(payload).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("ascii") + body
+
+
+async def _read_request(reader):
+    """Return (method, path, headers, body) or None when the client closed."""
+    line = await reader.readline()
+    if not line:
+        return None
+    method, path, _ = line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+async def _diagnose(batcher: MicroBatcher, card, top_k):
+    """(status, payload) of one /diagnose request."""
+    if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1:
+        return 400, {"error": "top_k must be a positive integer"}
+    start = time.perf_counter()
+    try:
+        response = await batcher.submit(card, top_k)
+    except Exception as exc:
+        return 500, {"error": f"internal error: {exc}"}
+    # a fresh dict per request; the batch's responses are never shared
+    payload = dict(response, latency_ms=1000.0 * (time.perf_counter() - start))
+    return (400 if "error" in payload else 200), payload
+
+
+def make_handler(batcher: MicroBatcher, top_k_default=DEFAULT_TOP_K):
+    async def handle(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    writer.write(_response(400, {"error": "malformed request"}, keep_alive=False))
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                if method == "GET" and path == "/health":
+                    status, payload = 200, {
+                        "status": "ok", "networks": sorted(batcher.service.compiled)
+                    }
+                elif method == "POST" and path == "/diagnose":
+                    try:
+                        payload = json.loads(body or b"{}")
+                        # accept either a bare card or a vignette {"card": ...}
+                        card = payload.get("card", payload)
+                        top_k = payload.get("top_k", top_k_default)
+                    except (ValueError, AttributeError):
+                        status, payload = 400, {"error": "body must be a JSON casecard"}
+                    else:
+                        status, payload = await _diagnose(batcher, card, top_k)
+                else:
+                    status, payload = 404, {"error": f"no route {method} {path}"}
+
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def serve(service, host="127.0.0.1", port=8080, unix_path=None,
+                max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                top_k=DEFAULT_TOP_K, threads=DEFAULT_THREADS):
+    batcher = MicroBatcher(
+        service, max_batch=max_batch, max_wait=max_wait_ms / 1000.0, threads=threads
+    )
+    handler = make_handler(batcher, top_k)
+    if unix_path is not None:
+        server = await asyncio.start_unix_server(handler, path=str(unix_path))
+        where = f"unix:{unix_path}"
+    else:
+        server = await asyncio.start_server(handler, host, port)
+        where = f"http://{host}:{port}"
+    batch_task = asyncio.create_task(batcher.run())
+    print(f">> Serving {sorted(service.compiled)} on {where}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
+
+
+# ------------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------------
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve diagnosis scores over HTTP")
+    parser.add_argument(
+        "--datapath", type=Path, default=Path("data"),
+        help="Path to folder containing the networks file"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--unix", type=Path, default=None,
+        help="Listen on this Unix socket instead of TCP"
+    )
+    parser.add_argument(
+        "--max-batch", type=int, default=DEFAULT_MAX_BATCH,
+        help="Maximum casecards scored in one batch"
+    )
+    parser.add_argument(
+        "--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+        help="Maximum time a request waits for others to join its batch"
+    )
+    parser.add_argument(
+        "--threads", type=int, default=DEFAULT_THREADS,
+        help="Batches scored concurrently on threads sharing one copy of the networks"
+    )
+    parser.add_argument(
+        "--top-k", type=int, default=DEFAULT_TOP_K,
+        help="Ranked diseases returned per method (overridable per request)"
+    )
+    parser.add_argument(
+        "--log-level", type=str.upper, choices=LOG_LEVELS, default="WARNING",
+        help="Logging level"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_logging(args.log_level)
+    start = time.perf_counter()
+    service = DiagnosisService.from_datapath(args.datapath)
+    print(f">> Loaded and compiled networks in {time.perf_counter() - start:.2f}s")
+    try:
+        asyncio.run(serve(
+            service, host=args.host, port=args.port, unix_path=args.unix,
+            max_batch=args.max_batch, max_wait_ms=args.max_wait_ms, top_k=args.top_k,
+            threads=args.threads,
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
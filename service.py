@@ -0,0 +1,50 @@
+from compiled import compile_networks
+from context import InferenceContext
+from helpers import load_compiled_networks
+from session import DEFAULT_TOP_K, DiagnosisSession
+
+
+# ------------------------------------------------------------------------
+# PRELOADED SCORING SERVICE
+# ------------------------------------------------------------------------
+class DiagnosisService:
+    """
+    Networks loaded, compiled and given counterfactual engines once at
+    startup, scored through one immutable context.InferenceContext, so
+    score_batch can run on several threads at once. `settings` are
+    InferenceContext options (severity_mapping, risk_boost, ...).
+    """
+
+    def __init__(self, network_data: dict, **settings):
+        self.context = InferenceContext(compile_networks(network_data), **settings)
+        self.compiled = self.context.networks
+        self.engines = self.context.engines
+
+    @classmethod
+    def from_datapath(cls, datapath, **settings):
+        return cls(load_compiled_networks(datapath), **settings)
+
+    def session(self, net_name, **kwargs) -> DiagnosisSession:
+        """
+        A new incremental session on one loaded network (see session.py),
+        with the service's settings unless overridden. A session holds its
+        own evidence; use one per patient and thread.
+        """
+        if net_name not in self.compiled:
+            raise KeyError(f"unknown network '{net_name}'")
+        context = self.context
+        options = {
+            "propagation": context.propagation,
+            "severity_mapping": context.severity_mapping,
+            "risk_boost": context.risk_boost,
+        }
+        return DiagnosisSession(self.compiled[net_name], **{**options, **kwargs})
+
+    def score_batch(self, requests):
+        """
+        Score a list of (card, top_k) together. Cards are grouped by network
+        and each group goes through the posterior and both counterfactual
+        passes as one (cards × nodes) array operation. Returns one response
+        dict per request, in order.
+        """
+        return self.context.score_batch(requests)
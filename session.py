@@ -0,0 +1,219 @@
+import numpy as np
+
+from compiled import CompiledNetwork, EPSILON, MULTILAYER, ONE_HOP
+from counterfactual import INTERVENTION_LINK, _ranges, engine_for
+from evidence import evidence_settings, parse_casecard, severity_level_value
+
+DEFAULT_TOP_K = 20
+
+# Ranked methods and the intervention each one scores (None: the posterior)
+METHODS = {"posterior": None, "disablement": "disable", "sufficiency": "force"}
+
+
+def rank_diseases(scores: np.ndarray, disease_ids, top_k=DEFAULT_TOP_K):
+    """[[disease_id, score], ...] for the top_k scores, best first."""
+    # stable sort keeps network order among ties, like sorted()
+    order = np.argsort(-scores, kind="stable")[:top_k]
+    return [[disease_ids[j], float(scores[j])] for j in order]
+
+
+# ------------------------------------------------------------------------
+# INCREMENTAL DIFFERENTIAL-DIAGNOSIS SESSION
+# ------------------------------------------------------------------------
+class DiagnosisSession:
+    """
+    Evidence about one patient on one compiled network, updated one answer
+    at a time, with the posterior, disablement and sufficiency of every
+    disease kept current.
+
+    With one-hop propagation a node's Noisy-OR reads its parents' evidence,
+    so an update to node i only changes the terms on i's outgoing edges and
+    the products of i's children. Those children are re-evaluated, and only
+    the diseases that share a symptom child with them are re-scored; every
+    other value is reused. The results equal a fresh
+    posterior_inference / expected_disablement / expected_sufficiency on
+    the same evidence.
+
+    With multilayer propagation an update can reach every descendant, so
+    each update re-runs the full propagated pass.
+
+    Unset severity_mapping / risk_boost are read from
+    preprocessing.SEVERITY_MAPPING and inference.RISK_BOOST when the
+    session is created.
+    """
+
+    def __init__(self, compiled: CompiledNetwork, propagation=ONE_HOP,
+                 severity_mapping=None, risk_boost=None):
+        severity_mapping, risk_boost = evidence_settings(severity_mapping, risk_boost)
+        self.compiled = compiled
+        self.engine = engine_for(compiled)
+        self.propagation = propagation
+        self.severity_mapping = dict(severity_mapping)
+        self.risk_boost = risk_boost
+        self.disease_ids = compiled.disease_ids
+
+        n = len(compiled)
+        self._is_symptom = self.engine._symptom_mask(compiled.symptom_idx)
+        self._is_risk = np.zeros(n, dtype=bool)
+        self._is_risk[compiled.risk_idx] = True
+        self._disease_pos = np.full(n, -1, dtype=np.intp)
+        self._disease_pos[compiled.disease_idx] = np.arange(len(compiled.disease_idx))
+        self.reset()
+
+    @classmethod
+    def from_casecard(cls, compiled: CompiledNetwork, card, **kwargs):
+        session = cls(compiled, **kwargs)
+        session.add_casecard(card)
+        return session
+
+    # --------------------------------------------------------------------
+    # EVIDENCE UPDATES
+    # --------------------------------------------------------------------
+    @property
+    def evidence(self) -> dict:
+        """Current evidence as {node_id: value}, as get_evidence_from_casecard returns."""
+        return dict(self._evidence)
+
+    def reset(self):
+        """Drop all evidence."""
+        self._evidence = {}
+        self.x = np.zeros(len(self.compiled), dtype=np.float64)
+        self.observed = np.zeros(len(self.compiled), dtype=bool)
+        self._recompute()
+
+    def severity_value(self, severity) -> float:
+        return self.severity_mapping.get(str(severity).strip().upper(), 1.0)
+
+    def add_symptom(self, symptom_id, severity="PRESENT"):
+        self.update({symptom_id: self.severity_value(severity)})
+
+    def change_severity(self, symptom_id, severity):
+        if symptom_id not in self._evidence:
+            raise KeyError(f"no evidence for '{symptom_id}'")
+        self.update({symptom_id: self.severity_value(severity)})
+
+    def add_risk(self, risk_id):
+        self.update({risk_id: self.risk_boost})
+
+    def remove(self, node_id):
+        if node_id not in self._evidence:
+            raise KeyError(f"no evidence for '{node_id}'")
+        self.update({node_id: None})
+
+    def add_casecard(self, card):
+        """Add a casecard's symptoms and present risks; IDs outside the network are skipped."""
+        symptoms, risks = parse_casecard(card)
+        changes = {
+            sid: severity_level_value(level, self.severity_mapping) for sid, level in symptoms
+        }
+        changes.update((rid, self.risk_boost) for rid in risks)
+        index = self.compiled.index
+        self.update({nid: v for nid, v in changes.items() if nid in index})
+
+    def update(self, changes: dict):
+        """
+        Apply several evidence changes at once, {node_id: value}, where a
+        value of None removes the node's evidence. Raises KeyError for IDs
+        that are not in the network (nothing is applied).
+        """
+        index = self.compiled.index
+        unknown = [nid for nid in changes if nid not in index]
+        if unknown:
+            raise KeyError(f"not in network: {unknown}")
+
+        changed = []
+        for nid, value in changes.items():
+            i = index[nid]
+            if value is None:
+                self._evidence.pop(nid, None)
+                value, observed = 0.0, False
+            else:
+                self._evidence[nid] = value
+                observed = True
+            if self.x[i] != value or self.observed[i] != observed:
+                self.x[i] = value
+                self.observed[i] = observed
+                changed.append(i)
+        if not changed:
+            return
+        if self.propagation == MULTILAYER:
+            self._recompute()
+        else:
+            self._refresh(np.unique(np.array(changed, dtype=np.intp)))
+
+    # --------------------------------------------------------------------
+    # SCORES
+    # --------------------------------------------------------------------
+    def scores(self, method="posterior") -> np.ndarray:
+        """Current scores of every disease (in compiled.disease_idx order)."""
+        if METHODS[method] is None:
+            return self.values[self.compiled.disease_idx]
+        return self._scores[METHODS[method]].copy()
+
+    def ranked(self, method="posterior", top_k=DEFAULT_TOP_K):
+        return rank_diseases(self.scores(method), self.disease_ids, top_k)
+
+    def differential(self, top_k=DEFAULT_TOP_K) -> dict:
+        """The current ranked differential, {method: [[disease_id, score], ...]}."""
+        return {method: self.ranked(method, top_k) for method in METHODS}
+
+    # --------------------------------------------------------------------
+    # INTERNALS
+    # --------------------------------------------------------------------
+    def _recompute(self):
+        """Full pass over the current evidence."""
+        compiled, engine = self.compiled, self.engine
+        disease_idx, symptom_idx = compiled.disease_idx, compiled.symptom_idx
+        self._scores = {}
+        if self.propagation == MULTILAYER:
+            self.values = compiled.propagate(self.x, self.observed)
+            for mode in INTERVENTION_LINK:
+                self._scores[mode] = engine.propagated_scores(
+                    self.x, self.observed, disease_idx, symptom_idx, mode, factual=self.values
+                )
+            return
+        self.terms = engine._terms(self.x)
+        self.values = engine.factual(self.x)
+        for mode in INTERVENTION_LINK:
+            self._scores[mode] = engine.scores(
+                self.x, disease_idx, symptom_idx, mode, factual=self.values
+            )
+
+    def _refresh(self, changed: np.ndarray):
+        """One-hop update after the evidence of `changed` nodes moved."""
+        compiled, engine = self.compiled, self.engine
+
+        # Terms on the changed nodes' outgoing edges
+        counts = engine.child_ptr[changed + 1] - engine.child_ptr[changed]
+        edges = engine.child_edges[_ranges(engine.child_ptr[changed], counts)]
+        adjusted = np.minimum(compiled.edge_link[edges] * self.x[compiled.edge_parents[edges]], 1.0)
+        self.terms[edges] = 1.0 - (1.0 - adjusted) + EPSILON
+
+        # Products of their children; Risk nodes echo their evidence
+        seg_counts = engine.affected_ptr[changed + 1] - engine.affected_ptr[changed]
+        segs = np.unique(engine.affected_segs[_ranges(engine.affected_ptr[changed], seg_counts)])
+        if len(segs):
+            lengths = engine.seg_len[segs]
+            seg_edges = _ranges(compiled.segment_starts[segs], lengths)
+            starts = np.zeros(len(segs), dtype=np.intp)
+            np.cumsum(lengths[:-1], out=starts[1:])
+            self.values[engine.seg_node[segs]] = (
+                1.0 - np.multiply.reduceat(self.terms[seg_edges], starts)
+            )
+        risks = changed[self._is_risk[changed]]
+        self.values[risks] = self.x[risks]
+
+        # Diseases that are a parent of a changed symptom product
+        segs = segs[self._is_symptom[engine.seg_node[segs]]]
+        parents = compiled.edge_parents[
+            _ranges(compiled.segment_starts[segs], engine.seg_len[segs])
+        ]
+        parents = np.unique(parents)
+        diseases = parents[self._disease_pos[parents] >= 0]
+        pos = self._disease_pos[diseases]
+        for mode, link in INTERVENTION_LINK.items():
+            for start in range(0, len(diseases), engine.batch_size):
+                batch = diseases[start:start + engine.batch_size]
+                self._scores[mode][pos[start:start + len(batch)]] = engine._batch_scores(
+                    self.x, self.values, self.terms, batch, link, mode, self._is_symptom
+                )
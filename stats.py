@@ -0,0 +1,340 @@
+import hashlib
+import json
+import os
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+from columnar import METHODS, TopKResults
+from evaluation import TOP_N, EvaluationData, as_columnar, check_pruned_top_n, row_outcomes
+from helpers import doctor_top_ns
+
+# ------------------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------------------
+DEFAULT_RESAMPLES = 2000
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_SEED = 0
+DEFAULT_CONF_THRESH = 0.05  # significance level of the method-vs-doctor tests
+RESAMPLE_BLOCK = 250        # resamples drawn together (one parallel task each)
+ALL_STRATA = "all"          # stratum holding every vignette
+STATS_VERSION = 1           # bump when the report layout changes
+
+
+# ------------------------------------------------------------------------
+# PER-ROW OUTCOMES (hits per method, rank and stratum)
+# ------------------------------------------------------------------------
+class Outcomes:
+    """
+    Everything the statistics read, per vignette row: the true disease's
+    rank and whether its top-scored disease is in a doctor's differential
+    (per method), a rareness mask per stratum, and every doctor answer as
+    (row, differential length, hit) from helpers.doctor_top_ns.
+    `pruned_top_k` is the K of a --prune-top-k run (see row_outcomes).
+    """
+
+    def __init__(self, results, vignettes, methods=METHODS, pruned_top_k=None):
+        if not isinstance(results, TopKResults):
+            results = as_columnar(results)
+        data = EvaluationData(results, vignettes)
+        self.methods = list(methods)
+        self.ranks, self.valid, self.doctor_hits = {}, {}, {}
+        for method in self.methods:
+            self.ranks[method], self.valid[method], self.doctor_hits[method] = row_outcomes(
+                results, data, method, pruned_top_k
+            )
+
+        labels = np.array(data.rareness, dtype=object).astype(str)
+        names, first = np.unique(labels, return_index=True)
+        self.strata = {ALL_STRATA: np.ones(len(labels), dtype=bool)}
+        for name in names[np.argsort(first)]:
+            self.strata[str(name)] = labels == name
+
+        rows, lengths, hits = [], [], []
+        for r, v_id in enumerate(results.vignette_ids):
+            vignette = vignettes[v_id]
+            true_id = vignette["card"]["diseases"][0]["id"]
+            for _, length, hit in doctor_top_ns(vignette, true_id):
+                rows.append(r)
+                lengths.append(length)
+                hits.append(hit)
+        self.answer_row = np.array(rows, dtype=np.intp)
+        self.answer_len = np.array(lengths, dtype=np.intp)
+        self.answer_hit = np.array(hits, dtype=bool)
+
+    def __len__(self):
+        return len(next(iter(self.strata.values())))
+
+    def digest(self) -> str:
+        """Hash of all outcomes, used as the statistics cache key."""
+        h = hashlib.sha256()
+        for method in self.methods:
+            h.update(method.encode("utf-8"))
+            for a in (self.ranks[method], self.valid[method], self.doctor_hits[method]):
+                h.update(np.ascontiguousarray(a).tobytes())
+        for name, mask in self.strata.items():
+            h.update(name.encode("utf-8"))
+            h.update(mask.tobytes())
+        for a in (self.answer_row, self.answer_len, self.answer_hit):
+            h.update(a.tobytes())
+        return h.hexdigest()
+
+
+# ------------------------------------------------------------------------
+# VECTORIZED BOOTSTRAP
+# ------------------------------------------------------------------------
+def resample_counts(n_rows, n_resamples, rng) -> np.ndarray:
+    """
+    Draw all resamples as one (n_resamples × n_rows) index matrix and return
+    how often each row was drawn in each resample, as floats. A resampled
+    ratio statistic is then one matrix product with the per-row values.
+    """
+    idx = rng.integers(0, n_rows, size=(n_resamples, n_rows))
+    idx += np.arange(n_resamples)[:, None] * n_rows
+    counts = np.bincount(idx.ravel(), minlength=n_resamples * n_rows)
+    return counts.reshape(n_resamples, n_rows).astype(np.float64)
+
+
+_worker_columns = None
+
+
+def _init_worker(numer, denom):
+    """Pool initializer: ship the per-row columns once per worker."""
+    global _worker_columns
+    _worker_columns = (numer, denom)
+
+
+def _resample_block(task):
+    seed, block, size = task
+    numer, denom = _worker_columns
+    counts = resample_counts(numer.shape[0], size, np.random.default_rng([seed, block]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (counts @ numer) / (counts @ denom)
+
+
+def bootstrap_ratios(numer, denom, n_resamples=DEFAULT_RESAMPLES, seed=DEFAULT_SEED,
+                     workers=1):
+    """
+    Bootstrap distribution of every ratio statistic sum(numer[:, c]) /
+    sum(denom[:, c]) over resampled rows: an (n_resamples × columns) array,
+    NaN where a resample has no denominator. Resamples are drawn in fixed
+    blocks with their own seeds, so the result does not depend on `workers`.
+    """
+    numer = np.asarray(numer, dtype=np.float64)
+    denom = np.asarray(denom, dtype=np.float64)
+    tasks = [
+        (seed, b, min(RESAMPLE_BLOCK, n_resamples - start))
+        for b, start in enumerate(range(0, n_resamples, RESAMPLE_BLOCK))
+    ]
+    if workers > 1 and len(tasks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(numer, denom)
+        ) as pool:
+            blocks = list(pool.map(_resample_block, tasks))
+    else:
+        _init_worker(numer, denom)
+        blocks = [_resample_block(task) for task in tasks]
+    if not blocks:
+        return np.zeros((0, numer.shape[1]))
+    return np.concatenate(blocks)
+
+
+def percentile_intervals(samples, confidence=DEFAULT_CONFIDENCE):
+    """(low, high) percentile bounds per column, ignoring NaN resamples."""
+    tail = 100.0 * (1.0 - confidence) / 2.0
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN (empty) strata
+        low, high = np.nanpercentile(samples, [tail, 100.0 - tail], axis=0)
+    return low, high
+
+
+def bootstrap_intervals(outcomes: Outcomes, N=TOP_N, n_resamples=DEFAULT_RESAMPLES,
+                        confidence=DEFAULT_CONFIDENCE, seed=DEFAULT_SEED, workers=1):
+    """
+    Bootstrap confidence intervals for the top-N curve and the doctor
+    agreement of every method, overall and per rareness stratum:
+      {method: {"topn":   {stratum: {"estimate": [N], "low": [N], "high": [N], "n": int}},
+                "doctor": {stratum: {"estimate", "low", "high", "n"}}}}
+    The estimates equal evaluation.evaluate. All statistics share the same
+    resamples and are computed together from one matrix product per block.
+    """
+    ks = np.arange(1, N + 1)
+    numer, denom, slots = [], [], []
+    for method in outcomes.methods:
+        ranks, valid = outcomes.ranks[method], outcomes.valid[method]
+        top_hit = (ranks[:, None] < ks) & valid[:, None]
+        for name, mask in outcomes.strata.items():
+            numer.append(top_hit & mask[:, None])
+            denom.append(np.repeat((valid & mask)[:, None], N, axis=1))
+            slots.append((method, "topn", name, N))
+            numer.append((outcomes.doctor_hits[method] & mask)[:, None])
+            denom.append(mask[:, None])
+            slots.append((method, "doctor", name, 1))
+    numer = np.concatenate(numer, axis=1) if numer else np.zeros((len(outcomes), 0))
+    denom = np.concatenate(denom, axis=1) if denom else np.zeros((len(outcomes), 0))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        estimate = numer.sum(axis=0) / denom.sum(axis=0)
+    low, high = percentile_intervals(
+        bootstrap_ratios(numer, denom, n_resamples, seed, workers), confidence
+    )
+
+    report = {method: {"topn": {}, "doctor": {}} for method in outcomes.methods}
+    start = 0
+    for method, metric, name, width in slots:
+        cols = slice(start, start + width)
+        entry = {
+            "estimate": _floats(estimate[cols]),
+            "low": _floats(low[cols]),
+            "high": _floats(high[cols]),
+            "n": int(denom[:, start].sum()),
+        }
+        if metric == "doctor":
+            entry = {k: v[0] if isinstance(v, list) else v for k, v in entry.items()}
+        report[method][metric][name] = entry
+        start += width
+    return report
+
+
+def _floats(values):
+    """JSON-safe list (NaN → None)."""
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+# ------------------------------------------------------------------------
+# BATCHED BINOMIAL TESTS
+# ------------------------------------------------------------------------
+def binomial_pvalues(successes, trials, p):
+    """
+    One-sided P(X >= successes) for X ~ Binomial(trials, p), for whole
+    arrays at once. Equal to
+    scipy.stats.binomtest(k, n, p, alternative="greater").pvalue; NaN where
+    there are no trials or p is undefined.
+    """
+    from scipy.stats import binom  # slow to import; only needed here
+
+    successes = np.asarray(successes, dtype=np.float64)
+    trials = np.asarray(trials, dtype=np.float64)
+    p = np.asarray(p, dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        pvalues = binom.sf(successes - 1, trials, p)
+    return np.where((trials > 0) & ~np.isnan(p), pvalues, np.nan)
+
+
+def bintest_batch(x_hits, x_trials, y_hits, y_trials, conf_thresh=DEFAULT_CONF_THRESH):
+    """
+    helpers.bintest over arrays of summed hits: is each method's hit rate
+    significantly above the doctors' rate? Returns (significant, pvalues).
+    With conf_thresh == 0 it compares the raw hit counts, as bintest does.
+    """
+    x_hits, y_hits = np.asarray(x_hits), np.asarray(y_hits)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p = np.asarray(y_hits, dtype=np.float64) / np.asarray(y_trials, dtype=np.float64)
+    if conf_thresh == 0:
+        return x_hits >= y_hits, np.full(x_hits.shape, np.nan)
+    pvalues = binomial_pvalues(x_hits, x_trials, p)
+    return pvalues < conf_thresh, pvalues
+
+
+def doctor_tests(outcomes: Outcomes, N=TOP_N, conf_thresh=DEFAULT_CONF_THRESH):
+    """
+    Method-vs-doctor binomial tests (helpers.bintest) for every method,
+    rank 1..N and rareness stratum, all in one batch. Over the vignettes
+    with doctor answers, a method's top-N hits are tested against the
+    doctors' pooled hit rate. "matched" pairs every doctor answer with the
+    method's top-L hit, L being that doctor's differential length.
+      {method: {stratum: {"method_rate": [N], "pvalue": [N], "significant": [N],
+                          "doctor_rate", "n_vignettes", "n_answers",
+                          "matched": {"method_rate", "pvalue", "significant"}}}}
+    """
+    ks = np.arange(1, N + 1)
+    answered = np.zeros(len(outcomes), dtype=bool)
+    answered[outcomes.answer_row] = True
+    strata = list(outcomes.strata.items())
+    # Stratum of each answer, and doctor hits / answers per stratum
+    answer_in = np.array([mask[outcomes.answer_row] for _, mask in strata]).reshape(
+        len(strata), len(outcomes.answer_row)
+    )
+    y_hits = (answer_in & outcomes.answer_hit).sum(axis=1)
+    y_trials = answer_in.sum(axis=1)
+    rows_in = np.array([mask & answered for _, mask in strata]).reshape(len(strata), -1)
+    n_rows = rows_in.sum(axis=1)
+
+    x_hits, x_trials, y_h, y_n = [], [], [], []
+    for method in outcomes.methods:
+        ranks, valid = outcomes.ranks[method], outcomes.valid[method]
+        top_hit = (ranks[:, None] < ks) & valid[:, None]
+        matched = valid[outcomes.answer_row] & (ranks[outcomes.answer_row] < outcomes.answer_len)
+        # (strata × N) top-N hit counts, then one matched column
+        x_hits.append(np.concatenate(
+            [rows_in.astype(np.int64) @ top_hit, (answer_in & matched).sum(axis=1)[:, None]],
+            axis=1,
+        ))
+        x_trials.append(np.concatenate([np.repeat(n_rows[:, None], N, axis=1), y_trials[:, None]], axis=1))
+        y_h.append(np.repeat(y_hits[:, None], N + 1, axis=1))
+        y_n.append(np.repeat(y_trials[:, None], N + 1, axis=1))
+    x_hits, x_trials = np.array(x_hits), np.array(x_trials)
+    significant, pvalues = bintest_batch(x_hits, x_trials, np.array(y_h), np.array(y_n), conf_thresh)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rates = x_hits / x_trials
+        doctor_rate = y_hits / y_trials
+
+    report = {}
+    for m, method in enumerate(outcomes.methods):
+        report[method] = {}
+        for s, (name, _) in enumerate(strata):
+            report[method][name] = {
+                "method_rate": _floats(rates[m, s, :N]),
+                "pvalue": _floats(pvalues[m, s, :N]),
+                "significant": [bool(v) for v in significant[m, s, :N]],
+                "doctor_rate": _floats(doctor_rate[s:s + 1])[0],
+                "n_vignettes": int(n_rows[s]),
+                "n_answers": int(y_trials[s]),
+                "matched": {
+                    "method_rate": _floats(rates[m, s, N:])[0],
+                    "pvalue": _floats(pvalues[m, s, N:])[0],
+                    "significant": bool(significant[m, s, N]),
+                },
+            }
+    return report
+
+
+# ------------------------------------------------------------------------
+# CACHED REPORT
+# ------------------------------------------------------------------------
+def statistics_report(results, vignettes, methods=METHODS, N=TOP_N,
+                      n_resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE,
+                      seed=DEFAULT_SEED, conf_thresh=DEFAULT_CONF_THRESH, workers=1,
+                      cache_path=None, pruned_top_k=None):
+    """
+    {"intervals": bootstrap_intervals(...), "tests": doctor_tests(...)} for
+    full, JSON or top-K results. With `cache_path`, the report is stored
+    there as JSON keyed on the per-row outcomes and the settings, and
+    reused while neither changes. For a --prune-top-k run, N must not
+    exceed its K (`pruned_top_k`).
+    """
+    check_pruned_top_n(N, pruned_top_k)
+    outcomes = Outcomes(results, vignettes, methods, pruned_top_k)
+    key = hashlib.sha256(json.dumps(
+        [STATS_VERSION, outcomes.digest(), N, n_resamples, confidence, seed, conf_thresh]
+    ).encode("utf-8")).hexdigest()
+    if cache_path is not None and Path(cache_path).exists():
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            return cached["report"]
+
+    report = {
+        "intervals": bootstrap_intervals(outcomes, N, n_resamples, confidence, seed, workers),
+        "tests": doctor_tests(outcomes, N, conf_thresh),
+    }
+    if cache_path is not None:
+        cache_path = Path(cache_path)
+        tmp = cache_path.with_name(cache_path.name + f".tmp{os.getpid()}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "report": report}, f)
+        os.replace(tmp, cache_path)
+    return report
@@ -0,0 +1,214 @@
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+
+from columnar import (
+    DEFAULT_STORE_TOP_K,
+    STORE_FULL,
+    STORE_TOP_K,
+    ColumnarBuilder,
+    SCORE_DTYPE,
+    TopKBuilder,
+    disease_scores,
+    save_columnar,
+    save_top_k,
+    top_k_entry,
+)
+from constants import (
+    RESULTS_COLUMNAR_FILE,
+    RESULTS_FILE,
+    RESULTS_TOP_K_FILE,
+    RESULTS_TOP_K_JSON_FILE,
+    RESULTS_OBS_FILE,
+    RESULTS_CF_DISABLEMENT_FILE,
+    RESULTS_CF_SUFFICIENCY_FILE,
+)
+from utils import write_to_pickle
+
+METHODS = ("posterior", "disablement", "sufficiency")
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------------------
+# APPEND-ONLY RESULT STREAM (JSON Lines)
+# ------------------------------------------------------------------------
+class ResultStreamWriter:
+    """
+    Appends one JSON line per vignette:
+      {"id": v_id, "posterior": {...}, "disablement": {...}, "sufficiency": {...}}
+    Each line is flushed as soon as it is written, so a crash loses at most
+    the vignette in flight.
+
+    `store` (columnar.STORE_MODES) shrinks each record as it is written:
+    "diseases" drops the Symptom / Risk posteriors, and "top_k" keeps, per
+    method, {"top": [[id, score], ...], "true_rank": r, "true_score": s}
+    for the `top_k` best diseases (true_id is then needed per write).
+    """
+
+    def __init__(self, path, fsync_every=100, store=STORE_FULL, top_k=DEFAULT_STORE_TOP_K):
+        self.path = Path(path)
+        self.fsync_every = fsync_every
+        self.store = store
+        self.top_k = top_k
+        self._count = 0
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def write(self, v_id, posterior, disablement, sufficiency, true_id=None):
+        if self.store != STORE_FULL:
+            posterior = disease_scores(posterior, disablement)
+        record = {
+            "id": v_id,
+            "posterior": posterior,
+            "disablement": disablement,
+            "sufficiency": sufficiency,
+        }
+        if self.store == STORE_TOP_K:
+            for method in METHODS:
+                record[method] = top_k_entry(record[method], self.top_k, true_id)
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+        self._count += 1
+        if self.fsync_every and self._count % self.fsync_every == 0:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _iter_lines(path):
+    """Yield (offset, record) for every complete, parseable line."""
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            start, offset = offset, offset + len(line)
+            if not line.endswith(b"\n"):
+                break  # partially written last line from an interrupted run
+            try:
+                yield start, json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"skipping corrupt line at byte {start} in {path}")
+
+
+def iter_result_stream(path):
+    """Yield each record of a result stream, in file order."""
+    path = Path(path)
+    if not path.exists():
+        return
+    for _, record in _iter_lines(path):
+        yield record
+
+
+def completed_ids(path) -> set:
+    """IDs of vignettes already present in a result stream."""
+    return {record["id"] for record in iter_result_stream(path)}
+
+
+def repair_stream(path):
+    """Drop a trailing partial line left by a crash so appends stay line-aligned."""
+    path = Path(path)
+    if not path.exists():
+        return
+    with open(path, "r+b") as f:
+        pos = f.seek(0, os.SEEK_END)
+        while pos > 0:
+            step = min(1 << 16, pos)
+            pos -= step
+            f.seek(pos)
+            newline = f.read(step).rfind(b"\n")
+            if newline != -1:
+                f.truncate(pos + newline + 1)
+                return
+        f.truncate(0)
+
+
+def _latest_offsets(path):
+    """{v_id: offset of its last record}, ordered by first appearance."""
+    offsets = {}
+    for offset, record in _iter_lines(path):
+        offsets[record["id"]] = offset
+    return offsets
+
+
+def _read_at(f, offset):
+    f.seek(offset)
+    return json.loads(f.readline())
+
+
+# ------------------------------------------------------------------------
+# FINAL OUTPUTS FROM THE STREAM
+# ------------------------------------------------------------------------
+def save_results_from_stream(stream_path, output_dir, json_export=True, dtype=SCORE_DTYPE,
+                             store=STORE_FULL, top_k=DEFAULT_STORE_TOP_K):
+    """
+    Produce the columnar .npz, the three pickles and (optionally) the merged
+    experimental_results.json from a result stream. Only offsets are kept in
+    memory for the JSON, and the per-method dicts are built one at a time.
+
+    A "top_k" stream instead gives experimental_results_topk.npz (and
+    experimental_results_topk.json); its entries do not fit the per-node
+    pickles, nor the {node_id: score} layout results.py reads from
+    experimental_results.json.
+    """
+    stream_path = Path(stream_path)
+    output_dir = Path(output_dir)
+    offsets = _latest_offsets(stream_path)
+    # Drop the other store's matrices from an earlier run into this folder
+    if store == STORE_TOP_K:
+        stale, json_file = (RESULTS_COLUMNAR_FILE, RESULTS_FILE), RESULTS_TOP_K_JSON_FILE
+    else:
+        stale, json_file = (RESULTS_TOP_K_FILE, RESULTS_TOP_K_JSON_FILE), RESULTS_FILE
+    for filename in stale:
+        (output_dir / filename).unlink(missing_ok=True)
+
+    if json_export:
+        # Merged JSON, written entry by entry in the same layout as save_as_json
+        with open(stream_path, "rb") as src, \
+                open(output_dir / json_file, "w", encoding="utf-8") as out:
+            out.write("{")
+            for i, (v_id, offset) in enumerate(offsets.items()):
+                record = _read_at(src, offset)
+                entry = {method: record[method] for method in METHODS}
+                body = json.dumps(entry, indent=2).replace("\n", "\n  ")
+                out.write(("," if i else "") + f"\n  {json.dumps(v_id)}: {body}")
+            out.write("\n}" if offsets else "}")
+
+    if store == STORE_TOP_K:
+        builder = TopKBuilder(top_k)
+        with open(stream_path, "rb") as src:
+            for v_id, offset in offsets.items():
+                record = _read_at(src, offset)
+                if "top" not in record["posterior"]:
+                    raise ValueError(f"{stream_path} holds full records; rerun without --resume")
+                builder.add(v_id, record)
+        save_top_k(builder.build(dtype), output_dir / RESULTS_TOP_K_FILE)
+        return
+
+    pickles = {
+        "posterior": RESULTS_OBS_FILE,
+        "disablement": RESULTS_CF_DISABLEMENT_FILE,
+        "sufficiency": RESULTS_CF_SUFFICIENCY_FILE,
+    }
+    builder = ColumnarBuilder(offsets)
+    with open(stream_path, "rb") as src:
+        for method, filename in pickles.items():
+            # Interned keys let pickle share one string per node ID
+            data = {
+                v_id: {sys.intern(k): v for k, v in _read_at(src, offset)[method].items()}
+                for v_id, offset in offsets.items()
+            }
+            write_to_pickle(data, output_dir / filename)
+            builder.add_method(method, data)
+            del data
+    save_columnar(builder.build(dtype), output_dir / RESULTS_COLUMNAR_FILE)
@@ -0,0 +1,220 @@
+import argparse
+import csv
+import itertools
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from constants import VIGNETTES_FILE
+from utils import load_from_json
+from helpers import THRESH, load_compiled_networks
+from compiled import compile_networks
+from counterfactual import engine_for
+from evidence import EvidenceTemplate
+from columnar import METHODS, ColumnarResults
+from evaluation import EvaluationData, TOP_N, top_n_curve, true_disease_ranks
+from inference import RISK_BOOST
+from preprocessing import SEVERITY_MAPPING
+from instrumentation import LOG_LEVELS, configure_logging
+
+SWEEP_FILE = "sweep_results.csv"
+ROW_CHUNK = 256  # evidence rows (vignettes × settings) pushed through inference together
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------------------
+# SWEEP
+# ------------------------------------------------------------------------
+def run_sweep(vignettes_data, network_data, risk_boosts=(RISK_BOOST,),
+              threshs=(None,), severity_mappings=None, N=TOP_N, row_chunk=ROW_CHUNK):
+    """
+    Evaluate every (severity mapping, RISK_BOOST, THRESH) combination in one
+    run. Casecards are parsed and networks compiled once, and each (mapping,
+    boost) setting is encoded once. The evidence of all settings is stacked
+    and pushed through the posterior and counterfactual engines together,
+    `row_chunk` rows at a time (row_chunk // settings vignettes × every
+    setting). Every chunk is reduced to true-disease ranks straight away, so
+    memory is bounded by the chunk, not by the size of the grid. THRESH
+    only changes the counterfactuals, so the posterior is ranked once per
+    setting.
+
+    Returns a list of rows:
+      {"severity", "risk_boost", "thresh", "method", "topn": array(N)}
+    """
+    if severity_mappings is None:
+        severity_mappings = {"default": SEVERITY_MAPPING}
+    settings = list(itertools.product(severity_mappings, risk_boosts))
+    compiled_networks = compile_networks(network_data)
+
+    # Group vignettes by network so every group shares one node index
+    groups = {}
+    for v_id, vignette in vignettes_data.items():
+        net_name = vignette["card"]["network_name"]
+        if net_name not in compiled_networks:
+            logger.error(f"Missing network '{net_name}' for case {v_id}")
+            continue
+        groups.setdefault(net_name, []).append(v_id)
+
+    # ranks[(setting, thresh, method)] -> list of (ranks, valid) per chunk;
+    # the posterior is stored once per setting under thresh None
+    ranks = {}
+    for net_name, v_ids in groups.items():
+        compiled = compiled_networks[net_name]
+        engine = engine_for(compiled)
+        template = EvidenceTemplate(compiled, [vignettes_data[v]["card"] for v in v_ids])
+        encoded = {
+            setting: template.encode(severity_mappings[setting[0]], setting[1])
+            for setting in settings
+        }
+
+        # Score matrices share the posterior's column set (Disease, Symptom, Risk)
+        ids = [compiled.node_ids[i] for i in compiled.scored_idx]
+        col_of = {i: c for c, i in enumerate(compiled.scored_idx)}
+        disease_cols = np.array([col_of[i] for i in compiled.disease_idx], dtype=np.intp)
+
+        step = max(1, row_chunk // len(settings))
+        for start in range(0, len(v_ids), step):
+            chunk_ids = v_ids[start:start + step]
+            n = len(chunk_ids)
+            data = EvaluationData(ColumnarResults(chunk_ids, ids, {}), vignettes_data)
+            # Rows of setting k are x[k * n:(k + 1) * n]
+            x = np.concatenate([encoded[setting].dense(start, start + n) for setting in settings])
+            blocks = [(setting, slice(k * n, (k + 1) * n)) for k, setting in enumerate(settings)]
+            factual = engine.factual(x)
+            for setting, rows in blocks:
+                ranks.setdefault((setting, None, "posterior"), []).append(
+                    true_disease_ranks(factual[rows, compiled.scored_idx], data)
+                )
+            matrix = np.full((n, len(ids)), np.nan)
+            for t in threshs:
+                for method, mode in (("disablement", "disable"), ("sufficiency", "force")):
+                    scores = engine.scores(
+                        x, compiled.disease_idx, compiled.symptom_idx, mode,
+                        factual=factual, thresh=t,
+                    )
+                    for setting, rows in blocks:
+                        matrix[:, disease_cols] = scores[rows]
+                        ranks.setdefault((setting, t, method), []).append(
+                            true_disease_ranks(matrix, data)
+                        )
+
+    table = []
+    for (name, boost), t, method in itertools.product(settings, threshs, METHODS):
+        parts = ranks.get(((name, boost), None if method == "posterior" else t, method), [])
+        if parts:
+            r = np.concatenate([p[0] for p in parts])
+            valid = np.concatenate([p[1] for p in parts])
+        else:
+            r = valid = np.zeros(0, dtype=bool)
+        table.append({
+            "severity": name,
+            "risk_boost": boost,
+            "thresh": t,
+            "method": method,
+            "topn": top_n_curve(r, valid, N),
+        })
+    return table
+
+
+def save_sweep(table, path, N=TOP_N):
+    """Write the sweep table as CSV (one row per setting × method)."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["severity", "risk_boost", "thresh", "method"] + [f"top_{k}" for k in range(1, N + 1)]
+        )
+        for row in table:
+            thresh = "none" if row["thresh"] is None else row["thresh"]
+            writer.writerow(
+                [row["severity"], row["risk_boost"], thresh, row["method"]]
+                + [f"{v:.6f}" for v in row["topn"]]
+            )
+
+
+def print_sweep(table, ks=(1, 5, 10, 20)):
+    header = f"{'severity':12} {'boost':>6} {'thresh':>6} {'method':12}" + "".join(
+        f" {'top' + str(k):>7}" for k in ks
+    )
+    print(header)
+    for row in table:
+        thresh = "none" if row["thresh"] is None else f"{row['thresh']:g}"
+        print(
+            f"{row['severity']:12} {row['risk_boost']:>6g} {thresh:>6} {row['method']:12}"
+            + "".join(f" {row['topn'][k - 1]:7.3f}" for k in ks if k <= len(row["topn"]))
+        )
+
+
+# ------------------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------------------
+def _thresh(value):
+    return None if value.lower() == "none" else float(value)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sweep RISK_BOOST, THRESH and SEVERITY_MAPPING")
+    parser.add_argument(
+        "--datapath", type=Path, default=Path("data"),
+        help="Path to folder containing input data (networks, vignettes, etc.)"
+    )
+    parser.add_argument(
+        "--results", type=Path, default=Path("my_results"),
+        help="Output folder for the sweep table"
+    )
+    parser.add_argument(
+        "--first", type=int, default=None,
+        help="Use only the first N vignettes"
+    )
+    parser.add_argument(
+        "--risk-boost", type=float, nargs="+", default=[RISK_BOOST],
+        help="RISK_BOOST values to try"
+    )
+    parser.add_argument(
+        "--thresh", type=_thresh, nargs="+", default=[None],
+        help=f"Symptom presence thresholds to try ('none' = count every symptom; helpers.THRESH is {THRESH})"
+    )
+    parser.add_argument(
+        "--severity-grid", type=Path, default=None,
+        help="JSON file of {name: {LEVEL: value}}; each mapping is merged over SEVERITY_MAPPING"
+    )
+    parser.add_argument(
+        "--log-level", type=str.upper, choices=LOG_LEVELS, default="WARNING",
+        help="Logging level"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_logging(args.log_level)
+    args.results.mkdir(parents=True, exist_ok=True)
+
+    severity_mappings = {"default": SEVERITY_MAPPING}
+    if args.severity_grid is not None:
+        with open(args.severity_grid, "r", encoding="utf-8") as f:
+            grid = json.load(f)
+        severity_mappings = {
+            name: {**SEVERITY_MAPPING, **{k.upper(): v for k, v in levels.items()}}
+            for name, levels in grid.items()
+        }
+
+    vignette_data = load_from_json(args.datapath / VIGNETTES_FILE)
+    if args.first is not None:
+        vignette_data = dict(list(vignette_data.items())[:args.first])
+    network_data = load_compiled_networks(args.datapath)
+
+    table = run_sweep(
+        vignette_data, network_data,
+        risk_boosts=args.risk_boost, threshs=args.thresh,
+        severity_mappings=severity_mappings,
+    )
+    print_sweep(table)
+    save_sweep(table, args.results / SWEEP_FILE)
+    print(f"\n>> Sweep table written to {args.results / SWEEP_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import random
+
+# ------------------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------------------
+RARENESS_LEVELS = ["very_common", "common", "uncommon", "rare", "very_rare"]
+SEVERITY_LEVELS = ["MILD", "MODERATE", "PRESENT", "SEVERE"]
+
+
+# ------------------------------------------------------------------------
+# SYNTHETIC NETWORKS
+# ------------------------------------------------------------------------
+def generate_network(n_risks=50, n_diseases=100, n_symptoms=150,
+                     risk_parents=(0, 4), disease_parents=(1, 25), seed=0):
+    """
+    Random Risk → Disease → Symptom network in the example_networks.json
+    schema ({node_id: {"label", "parents", "cpt"}}). Parent counts are drawn
+    uniformly from the given (min, max) ranges; leak/link values follow the
+    rough shape of the real networks (leaks close to 1).
+    """
+    rng = random.Random(seed)
+    risks = [f"risk-{seed}-{i}" for i in range(n_risks)]
+    diseases = [f"disease-{seed}-{i}" for i in range(n_diseases)]
+    symptoms = [f"symptom-{seed}-{i}" for i in range(n_symptoms)]
+
+    network = {}
+    for rid in risks:
+        p = rng.uniform(0.001, 0.6)
+        network[rid] = {"label": "Risk", "parents": [], "cpt": [1.0 - p, p]}
+
+    for did in diseases:
+        k = min(rng.randint(*risk_parents), n_risks)
+        parents = rng.sample(risks, k)
+        leak = rng.uniform(0.9, 0.99999)
+        network[did] = {
+            "label": "Disease",
+            "parents": parents,
+            "cpt": [leak] + [rng.uniform(leak, 1.0) for _ in parents],
+        }
+
+    for sid in symptoms:
+        k = min(rng.randint(*disease_parents), n_diseases)
+        parents = rng.sample(diseases, k)
+        leak = rng.uniform(0.6, 0.9999)
+        network[sid] = {
+            "label": "Symptom",
+            "parents": parents,
+            "cpt": [leak] + [rng.uniform(leak, 1.0) for _ in parents],
+        }
+    return network
+
+
+def _children(network):
+    children = {}
+    for nid, node in network.items():
+        for pid in node.get("parents", []):
+            children.setdefault(pid, []).append(nid)
+    return children
+
+
+# ------------------------------------------------------------------------
+# SYNTHETIC CASECARDS
+# ------------------------------------------------------------------------
+def generate_vignettes(network, n_vignettes=100, network_name="A", seed=0,
+                       n_doctors=3, start_id=0):
+    """
+    Casecards in the vignettes.json schema for a network: each picks a true
+    disease, reports a few of its symptoms at random severities (plus a few
+    NOT_PRESENT distractors), marks some of its risk factors PRESENT and adds
+    doctor differentials that include the true disease most of the time.
+    """
+    rng = random.Random(seed)
+    children = _children(network)
+    diseases = [nid for nid, node in network.items() if node["label"] == "Disease"]
+    symptoms = [nid for nid, node in network.items() if node["label"] == "Symptom"]
+
+    vignettes = {}
+    for k in range(n_vignettes):
+        v_id = start_id + k
+        true_id = rng.choice(diseases)
+        own = [c for c in children.get(true_id, []) if network[c]["label"] == "Symptom"]
+        shown = rng.sample(own, min(len(own), rng.randint(1, 8))) if own else []
+        absent = rng.sample(symptoms, min(len(symptoms), rng.randint(0, 3)))
+
+        card_symptoms = [
+            {"concept": {"id": sid}, "label": "Symptom", "severity": rng.choice(SEVERITY_LEVELS)}
+            for sid in shown
+        ] + [
+            {"concept": {"id": sid}, "label": "Symptom", "severity": "NOT_PRESENT"}
+            for sid in absent if sid not in shown
+        ]
+        card_risks = [
+            {"concept": {"id": rid}, "label": "Risk",
+             "presence": "PRESENT" if rng.random() < 0.5 else "NOT_PRESENT"}
+            for rid in network[true_id]["parents"]
+        ]
+
+        outcomes = []
+        for d in range(n_doctors):
+            differential = rng.sample(diseases, min(len(diseases), rng.randint(1, 4)))
+            if rng.random() < 0.6 and true_id not in differential:
+                differential[0] = true_id
+            outcomes.append({
+                "card": v_id,
+                "doctor_diseases": [{"concept": {"id": did}} for did in differential],
+                "id": v_id * n_doctors + d,
+                "user": {"id": f"doctor-{d}"},
+            })
+
+        vignettes[str(v_id)] = {
+            "card": {
+                "diseases": [{"id": true_id, "rareness": rng.choice(RARENESS_LEVELS)}],
+                "id": v_id,
+                "symptoms": card_symptoms,
+                "risk_factors": card_risks,
+                "network_name": network_name,
+            },
+            "outcomes": outcomes,
+        }
+    return vignettes
+
+
+def generate_dataset(sizes: dict, n_vignettes=100, seed=0):
+    """
+    Networks and vignettes for several named sizes, e.g.
+      {"A": (50, 100, 150)} → network "A" with 50 risks, 100 diseases, 150 symptoms.
+    Returns (network_data, vignettes) shaped like the real data files.
+    """
+    network_data, vignettes = {}, {}
+    for k, (name, (n_risks, n_diseases, n_symptoms)) in enumerate(sizes.items()):
+        network_data[name] = generate_network(n_risks, n_diseases, n_symptoms, seed=seed + k)
+        vignettes.update(generate_vignettes(
+            network_data[name], n_vignettes, network_name=name,
+            seed=seed + k, start_id=k * n_vignettes,
+        ))
+    return network_data, vignettes
@@ -0,0 +1,74 @@
+import copy
+import pickle
+
+import pytest
+
+from cache import ResultCache, evidence_key
+from experiments import iter_vignettes_experiment
+from synthetic import generate_dataset
+
+
+def _dataset():
+    """Synthetic vignettes where every casecard appears twice."""
+    network_data, vignettes = generate_dataset({"A": (5, 10, 15)}, n_vignettes=6, seed=2)
+    vignettes.update({f"{v_id}-again": copy.deepcopy(v) for v_id, v in list(vignettes.items())})
+    return network_data, vignettes
+
+
+# ------------------------------------------------------------------------
+# KEYS AND STORAGE
+# ------------------------------------------------------------------------
+def test_evidence_key_is_canonical():
+    assert evidence_key("A", {"x": 1.0, "y": 0.5}) == evidence_key("A", {"y": 0.5, "x": 1.0})
+    assert evidence_key("A", {"x": 1.0}) != evidence_key("B", {"x": 1.0})
+    assert evidence_key("A", {"x": 1.0}, top_k=None) == evidence_key("A", {"x": 1.0})
+    assert evidence_key("A", {"x": 1.0}, top_k=5) != evidence_key("A", {"x": 1.0})
+
+
+def test_memory_layer_evicts_least_recently_used():
+    cache = ResultCache("f" * 64, maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_disk_layer_is_namespaced_by_fingerprint(tmp_path):
+    ResultCache("a" * 64, maxsize=0, directory=tmp_path).put("key", {"d": 0.5})
+    assert ResultCache("a" * 64, maxsize=0, directory=tmp_path).get("key") == {"d": 0.5}
+    assert ResultCache("b" * 64, maxsize=0, directory=tmp_path).get("key") is None
+
+
+def test_pickled_cache_starts_empty():
+    cache = ResultCache("f" * 64, maxsize=4)
+    cache.put("a", 1)
+    shipped = pickle.loads(pickle.dumps(cache))
+    assert len(shipped) == 0 and shipped.get("a") is None
+
+
+# ------------------------------------------------------------------------
+# PIPELINE
+# ------------------------------------------------------------------------
+@pytest.mark.parametrize("batch_size", [1, 4])
+def test_cached_results_match_and_do_not_alias(batch_size):
+    network_data, vignettes = _dataset()
+    expected = {
+        v_id: result
+        for v_id, *result in iter_vignettes_experiment(vignettes, network_data, batch_size=batch_size)
+    }
+
+    cache = ResultCache("f" * 64, maxsize=64)
+    seen = {}
+    for v_id, *result in iter_vignettes_experiment(
+        vignettes, network_data, cache=cache, batch_size=batch_size,
+    ):
+        assert result == expected[v_id]
+        for scores in result:
+            scores.clear()  # must not reach the cache or later hits
+        seen[v_id] = result
+
+    assert cache.hits == len(vignettes) // 2
+    assert all(not scores for result in seen.values() for scores in result)
@@ -0,0 +1,107 @@
+import json
+
+import numpy as np
+
+from columnar import (
+    METHODS,
+    STORE_TOP_K,
+    TopKResults,
+    build_columnar,
+    disease_scores,
+    load_columnar,
+    save_columnar,
+    top_k_entry,
+)
+from constants import RESULTS_COLUMNAR_FILE, RESULTS_FILE
+from evaluation import evaluate
+from experiments import run_vignettes_experiment_raw
+from results import load_results
+from streaming import ResultStreamWriter, save_results_from_stream
+from synthetic import generate_dataset
+
+
+def _results():
+    """JSON-shaped results of a run over two networks (different node sets)."""
+    network_data, vignettes = generate_dataset(
+        {"A": (5, 10, 15), "B": (4, 8, 12)}, n_vignettes=12, seed=6
+    )
+    posterior, disablement, sufficiency = run_vignettes_experiment_raw(vignettes, network_data)
+    results = {
+        v_id: {
+            "posterior": posterior[v_id],
+            "disablement": disablement[v_id],
+            "sufficiency": sufficiency[v_id],
+        }
+        for v_id in posterior
+    }
+    return results, (posterior, disablement, sufficiency)
+
+
+# ------------------------------------------------------------------------
+# COLUMNAR RESULTS
+# ------------------------------------------------------------------------
+def test_columnar_round_trip_matches_the_dicts(tmp_path):
+    results, per_method = _results()
+    columnar = build_columnar(*per_method)
+    save_columnar(columnar, tmp_path / "r.npz")
+    loaded = load_columnar(tmp_path / "r.npz")
+
+    assert list(loaded) == list(results)
+    assert {v_id: loaded[v_id] for v_id in loaded} == results
+    assert loaded.matrix("posterior").dtype == np.float64
+
+
+def test_nodes_of_other_networks_are_nan():
+    results, per_method = _results()
+    columnar = build_columnar(*per_method)
+    matrix = columnar.matrix("posterior")
+    for v_id, result in results.items():
+        row = matrix[columnar.row[v_id]]
+        assert np.count_nonzero(~np.isnan(row)) == len(result["posterior"])
+
+
+def test_load_results_prefers_the_npz(tmp_path):
+    results, per_method = _results()
+    (tmp_path / RESULTS_FILE).write_text(json.dumps({}), encoding="utf-8")
+    save_columnar(build_columnar(*per_method), tmp_path / RESULTS_COLUMNAR_FILE)
+    loaded = load_results(tmp_path)
+    assert {v_id: loaded[v_id] for v_id in loaded} == results
+
+
+# ------------------------------------------------------------------------
+# TOP-K STORE
+# ------------------------------------------------------------------------
+def test_top_k_entry_matches_sorted():
+    scores = {"a": 0.2, "b": 0.9, "c": 0.2, "d": 0.5, "e": 0.2}
+    order = sorted(scores, key=scores.get, reverse=True)
+    for true_id in scores:
+        entry = top_k_entry(scores, 3, true_id)
+        assert entry["top"] == [[d, scores[d]] for d in order[:3]]
+        assert entry["true_rank"] == order.index(true_id)
+        assert entry["true_score"] == scores[true_id]
+    assert top_k_entry(scores, 3, "missing")["true_rank"] == -1
+
+
+def test_top_k_store_evaluates_like_full_results(tmp_path):
+    results, _ = _results()
+    _, vignettes = generate_dataset({"A": (5, 10, 15), "B": (4, 8, 12)}, n_vignettes=12, seed=6)
+    stream = tmp_path / "s.jsonl"
+    with ResultStreamWriter(stream, store=STORE_TOP_K, top_k=4) as writer:
+        for v_id, result in results.items():
+            true_id = vignettes[v_id]["card"]["diseases"][0]["id"]
+            writer.write(v_id, *(result[method] for method in METHODS), true_id=true_id)
+    save_results_from_stream(stream, tmp_path, store=STORE_TOP_K, top_k=4)
+    top_k = load_results(tmp_path)
+
+    assert isinstance(top_k, TopKResults)
+    assert top_k.top_cols["posterior"].shape == (len(results), 4)
+    # The top-K store ranks the posterior over the diseases only
+    diseases = {
+        v_id: {**r, "posterior": disease_scores(r["posterior"], r["disablement"])}
+        for v_id, r in results.items()
+    }
+    full = evaluate(diseases, vignettes)
+    for method, report in evaluate(top_k, vignettes).items():
+        np.testing.assert_allclose(report["topn"], full[method]["topn"])
+        assert report["doctor"] == full[method]["doctor"]
+        assert report["rareness"] == full[method]["rareness"]
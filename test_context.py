@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from compiled import compile_network
+from context import InferenceContext
+from instrumentation import StageTimer, get_timer
+from synthetic import generate_dataset
+
+
+def _context(**settings):
+    network_data, vignettes = generate_dataset({"A": (10, 30, 40)}, n_vignettes=24, seed=1)
+    context = InferenceContext({"A": compile_network(network_data["A"])}, **settings)
+    return context, [v["card"] for v in vignettes.values()]
+
+
+# ------------------------------------------------------------------------
+# TIMING
+# ------------------------------------------------------------------------
+def test_context_scoring_skips_the_process_wide_timer():
+    context, cards = _context()
+    before = get_timer().snapshot()
+    context.scores("A", cards)
+    assert get_timer().snapshot() == before
+
+
+def test_context_timer_records_its_own_stages():
+    timer = StageTimer()
+    context, cards = _context(timer=timer)
+    context.scores("A", cards)
+    stages = {name for _, name in timer.snapshot()}
+    assert {"counterfactual.disable", "counterfactual.force"} <= stages
+    assert context.replace(thresh=0.5).timer is timer
+
+
+# ------------------------------------------------------------------------
+# THREADS
+# ------------------------------------------------------------------------
+def test_threaded_scores_match_serial():
+    context, cards = _context(block_rows=5)
+    serial = context.scores("A", cards)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        threaded = list(pool.map(lambda _: context.scores("A", cards), range(8)))
+    for scores in threaded:
+        for method, matrix in serial.items():
+            np.testing.assert_array_equal(scores[method], matrix)
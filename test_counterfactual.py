@@ -0,0 +1,95 @@
+import math
+
+import pytest
+
+from compiled import MULTILAYER, compile_network
+from conftest import SEEDS, node_ids, noisy_or_case
+from counterfactual import counterfactual_scores, engine_for
+from inference import expected_disablement, expected_sufficiency
+
+
+# ------------------------------------------------------------------------
+# BATCHED ENGINE VS DICT PATH
+# ------------------------------------------------------------------------
+def test_counterfactual_scores_match_dict_path(case):
+    network, evidence, diseases, symptoms = case
+    batched = counterfactual_scores(
+        engine_for(compile_network(network)), evidence, diseases, symptoms
+    )
+    disablement = expected_disablement(network, evidence, diseases, symptoms)
+    sufficiency = expected_sufficiency(network, evidence, diseases, symptoms)
+
+    assert any(disablement.values()) and any(sufficiency.values())
+    assert batched["disable"] == pytest.approx(disablement, abs=1e-9)
+    assert batched["force"] == pytest.approx(sufficiency, abs=1e-9)
+
+
+def test_compiled_wrappers_match_dict_path(case):
+    network, evidence, diseases, symptoms = case
+    compiled = compile_network(network)
+    for score in (expected_disablement, expected_sufficiency):
+        assert score(compiled, evidence, diseases, symptoms) == pytest.approx(
+            score(network, evidence, diseases, symptoms), abs=1e-9
+        )
+
+
+# ------------------------------------------------------------------------
+# TOP-K PRUNING
+# ------------------------------------------------------------------------
+@pytest.mark.parametrize("leaks", [(-1.5, 2.0), (-1.5, 0.0)])
+@pytest.mark.parametrize("top_k", [1, 2, 4])
+@pytest.mark.parametrize("seed", SEEDS)
+def test_pruned_scores_are_exact_or_nan(seed, top_k, leaks):
+    network, evidence = noisy_or_case(seed, leaks)
+    diseases, symptoms = node_ids(network, "Disease"), node_ids(network, "Symptom")
+    engine = engine_for(compile_network(network))
+    exact = counterfactual_scores(engine, evidence, diseases, symptoms)
+    pruned = counterfactual_scores(engine, evidence, diseases, symptoms, top_k=top_k)
+
+    for mode, scores in exact.items():
+        kth = sorted(scores.values(), reverse=True)[top_k - 1]
+        for did, score in pruned[mode].items():
+            if math.isnan(score):
+                assert scores[did] < kth
+            else:
+                assert score == pytest.approx(scores[did], abs=1e-12)
+
+
+def test_pruning_skips_diseases_outside_top_k():
+    # Disease leaks below 0 keep every Noisy-OR term positive: finite bounds
+    network, evidence = noisy_or_case(SEEDS[2], leaks=(-1.5, 0.0))
+    diseases, symptoms = node_ids(network, "Disease"), node_ids(network, "Symptom")
+    pruned = counterfactual_scores(
+        engine_for(compile_network(network)), evidence, diseases, symptoms, top_k=1
+    )
+    assert any(math.isnan(score) for score in pruned["force"].values())
+
+
+# ------------------------------------------------------------------------
+# MULTILAYER PROPAGATION
+# ------------------------------------------------------------------------
+def test_multilayer_scores_match_dict_path(case):
+    network, evidence, diseases, symptoms = case
+    compiled = compile_network(network)
+    batched = counterfactual_scores(
+        engine_for(compiled), evidence, diseases, symptoms, propagation=MULTILAYER
+    )
+    disablement = expected_disablement(network, evidence, diseases, symptoms, MULTILAYER)
+    sufficiency = expected_sufficiency(network, evidence, diseases, symptoms, MULTILAYER)
+
+    assert any(disablement.values()) and any(sufficiency.values())
+    assert batched["disable"] == pytest.approx(disablement, abs=1e-9)
+    assert batched["force"] == pytest.approx(sufficiency, abs=1e-9)
+    for score in (expected_disablement, expected_sufficiency):
+        assert score(compiled, evidence, diseases, symptoms, MULTILAYER) == pytest.approx(
+            score(network, evidence, diseases, symptoms, MULTILAYER), abs=1e-9
+        )
+
+
+def test_pruning_needs_one_hop(case):
+    network, evidence, diseases, symptoms = case
+    with pytest.raises(ValueError):
+        counterfactual_scores(
+            engine_for(compile_network(network)), evidence, diseases, symptoms,
+            top_k=3, propagation=MULTILAYER,
+        )
@@ -0,0 +1,99 @@
+import random
+
+import numpy as np
+import pytest
+
+from columnar import TopKBuilder, top_k_entry
+from evaluation import COUNTERFACTUAL_METHODS, evaluate
+from experiments import run_vignettes_experiment_raw
+from stats import statistics_report
+from synthetic import generate_dataset
+
+TOP_K = 5
+
+
+def _results(seed=0):
+    """
+    Posteriors of a synthetic run, with random counterfactual scores (so
+    that every row has a strict top K), and the vignettes.
+    """
+    network_data, vignettes = generate_dataset({"A": (20, 30, 40)}, n_vignettes=60, seed=seed)
+    posterior, disablement, _ = run_vignettes_experiment_raw(vignettes, network_data)
+    rng = random.Random(seed)
+    results = {
+        v_id: {"posterior": posterior[v_id]} | {
+            method: {did: rng.random() for did in disablement[v_id]}
+            for method in COUNTERFACTUAL_METHODS
+        }
+        for v_id in posterior
+    }
+    return results, vignettes
+
+
+def _pruned(results, k):
+    """What --prune-top-k leaves: NaN for every score below the K-th best."""
+    pruned = {}
+    for v_id, result in results.items():
+        pruned[v_id] = dict(result)
+        for method in COUNTERFACTUAL_METHODS:
+            kth = sorted(result[method].values(), reverse=True)[k - 1]
+            pruned[v_id][method] = {
+                did: score if score >= kth else np.nan for did, score in result[method].items()
+            }
+    return pruned
+
+
+def _top_k_results(results, vignettes, k):
+    builder = TopKBuilder(k)
+    for v_id, result in results.items():
+        true_id = vignettes[v_id]["card"]["diseases"][0]["id"]
+        builder.add(v_id, {
+            method: top_k_entry(scores, k, true_id) for method, scores in result.items()
+        })
+    return builder.build(np.float64)
+
+
+# ------------------------------------------------------------------------
+# PRUNED RUNS
+# ------------------------------------------------------------------------
+def test_pruned_evaluation_matches_exact_up_to_k():
+    results, vignettes = _results()
+    exact = evaluate(results, vignettes, N=TOP_K)
+    pruned = _pruned(results, TOP_K)
+
+    for report in (
+        evaluate(pruned, vignettes, N=TOP_K, pruned_top_k=TOP_K),
+        evaluate(_top_k_results(pruned, vignettes, 2 * TOP_K), vignettes, N=TOP_K,
+                 pruned_top_k=TOP_K),
+    ):
+        for method, expected in exact.items():
+            assert report[method]["topn"] == pytest.approx(expected["topn"])
+            assert report[method]["doctor"] == expected["doctor"]
+        assert report["posterior"]["rareness"] == exact["posterior"]["rareness"]
+        assert all(report[method]["rareness"] == {} for method in COUNTERFACTUAL_METHODS)
+
+    # Without the K, rows whose true disease was pruned would just be dropped
+    unaware = evaluate(pruned, vignettes, N=TOP_K)
+    assert unaware["disablement"]["topn"][-1] > exact["disablement"]["topn"][-1]
+
+
+def test_pruned_statistics_match_exact_up_to_k():
+    results, vignettes = _results()
+    kwargs = {"N": TOP_K, "n_resamples": 50}
+    assert statistics_report(
+        _pruned(results, TOP_K), vignettes, pruned_top_k=TOP_K, **kwargs
+    ) == statistics_report(results, vignettes, **kwargs)
+
+
+def test_pruned_top_n_beyond_k_is_refused():
+    results, vignettes = _results()
+    pruned = _pruned(results, TOP_K)
+    with pytest.raises(ValueError):
+        evaluate(pruned, vignettes, N=TOP_K + 1, pruned_top_k=TOP_K)
+    with pytest.raises(ValueError):
+        statistics_report(pruned, vignettes, N=TOP_K + 1, pruned_top_k=TOP_K)
+
+
+def test_top_k_entry_skips_pruned_scores():
+    entry = top_k_entry({"a": np.nan, "b": 0.5, "c": np.nan, "d": 0.7}, 3, true_id="c")
+    assert entry == {"top": [["d", 0.7], ["b", 0.5]], "true_rank": -1, "true_score": None}
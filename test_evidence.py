@@ -0,0 +1,91 @@
+import copy
+import random
+
+import numpy as np
+
+from compiled import compile_network
+from context import InferenceContext
+from evidence import EncodedEvidence, encode_casecards, parse_casecard
+from inference import get_evidence_from_casecard
+from preprocessing import convert_card_severity
+from synthetic import generate_dataset
+
+SOFT_MAPPING = {"MILD": 0.05, "MODERATE": 0.1, "PRESENT": 0.2, "SEVERE": 0.3}
+
+
+def _dataset(numeric=False):
+    """Synthetic vignettes; with `numeric`, some symptoms carry their own severity_numeric."""
+    network_data, vignettes = generate_dataset({"A": (5, 10, 15)}, n_vignettes=10, seed=3)
+    if numeric:
+        rng = random.Random(3)
+        for vignette in vignettes.values():
+            for symptom in vignette["card"]["symptoms"][::2]:
+                symptom["severity_numeric"] = round(rng.uniform(0.1, 1.5), 3)
+    return network_data, vignettes
+
+
+# ------------------------------------------------------------------------
+# ENCODER VS DICT PATH
+# ------------------------------------------------------------------------
+def test_encoder_matches_dict_path():
+    network_data, vignettes = _dataset()
+    compiled = compile_network(network_data["A"])
+    cards = [v["card"] for v in vignettes.values()]
+    before = copy.deepcopy(cards)
+
+    encoded = encode_casecards(compiled, cards)
+    np.testing.assert_array_equal(
+        encoded.dense(),
+        np.stack([
+            compiled.evidence_vector(get_evidence_from_casecard(convert_card_severity(c, copy=True)))
+            for c in cards
+        ]),
+    )
+    assert cards == before
+
+
+def test_own_severity_numeric_wins_over_the_mapping():
+    network_data, vignettes = _dataset(numeric=True)
+    compiled = compile_network(network_data["A"])
+    card = next(iter(vignettes.values()))["card"]
+    own = {s["concept"]["id"]: s["severity_numeric"] for s in card["symptoms"] if "severity_numeric" in s}
+    assert own
+
+    symptoms, _ = parse_casecard(card)
+    assert {sid: level for sid, level in symptoms if sid in own} == own
+
+    dense = encode_casecards(compiled, [card], severity_mapping=SOFT_MAPPING).dense()[0]
+    for sid, value in own.items():
+        assert dense[compiled.index[sid]] == value
+    for sid, level in symptoms:
+        if sid not in own:
+            assert dense[compiled.index[sid]] == SOFT_MAPPING[level]
+
+    context = InferenceContext({"A": compiled}, severity_mapping=SOFT_MAPPING)
+    assert {sid: context.evidence(card)[sid] for sid in own} == own
+
+
+def test_encoder_matches_dict_path_on_numeric_cards():
+    network_data, vignettes = _dataset(numeric=True)
+    compiled = compile_network(network_data["A"])
+    cards = [v["card"] for v in vignettes.values()]
+    np.testing.assert_array_equal(
+        encode_casecards(compiled, cards).dense(),
+        np.stack([compiled.evidence_vector(get_evidence_from_casecard(c)) for c in cards]),
+    )
+
+
+# ------------------------------------------------------------------------
+# ENCODED EVIDENCE
+# ------------------------------------------------------------------------
+def test_encoded_evidence_round_trip(tmp_path):
+    network_data, vignettes = _dataset()
+    compiled = compile_network(network_data["A"])
+    encoded = encode_casecards(compiled, [v["card"] for v in vignettes.values()], row_ids=list(vignettes))
+    encoded.save(tmp_path / "e.npz")
+    loaded = EncodedEvidence.load(tmp_path / "e.npz")
+
+    loaded.check(compiled)
+    assert loaded.row_ids == list(vignettes)
+    np.testing.assert_array_equal(loaded.dense(), encoded.dense())
+    np.testing.assert_array_equal(loaded.dense(3, 7), encoded.dense()[3:7])
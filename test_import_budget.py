@@ -0,0 +1,15 @@
+from import_budget import IMPORT_BUDGETS, check_import_budget
+
+# Headroom over the budgets for slower or busier CI machines; the
+# heavy-module check is not loosened
+CI_SLACK = 2.0
+
+
+def test_entry_points_import_within_budget():
+    budgets = {module: budget * CI_SLACK for module, budget in IMPORT_BUDGETS.items()}
+    assert check_import_budget(budgets) == []
+
+
+def test_heavy_module_at_load_time_fails():
+    failures = check_import_budget({"tqdm": 60.0}, repeat=1)
+    assert failures == ["tqdm: imports tqdm at load time"]
@@ -0,0 +1,34 @@
+from compiled import compile_network
+from conftest import SEEDS, node_ids, noisy_or_case
+from counterfactual import counterfactual_scores, engine_for
+from montecarlo import MonteCarloSettings, monte_carlo_scores
+
+
+# ------------------------------------------------------------------------
+# MONTE CARLO VS EXACT
+# ------------------------------------------------------------------------
+def _sampled(settings):
+    # Links above 1 keep every edge probability in [0, 1], which sampling needs
+    network, evidence = noisy_or_case(SEEDS[0], leaks=(-1.5, 0.0))
+    diseases, symptoms = node_ids(network, "Disease"), node_ids(network, "Symptom")
+    compiled = compile_network(network)
+    exact = counterfactual_scores(engine_for(compiled), evidence, diseases, symptoms)
+    return exact, monte_carlo_scores(compiled, evidence, diseases, symptoms, settings)
+
+
+def test_monte_carlo_converges_to_exact():
+    exact, (sampled, stderr, _) = _sampled(MonteCarloSettings(20000, seed=3))
+
+    assert any(exact["force"].values())
+    for mode, scores in exact.items():
+        for did, score in scores.items():
+            assert abs(sampled[mode][did] - score) <= 5 * stderr[mode][did] + 1e-3
+
+
+def test_monte_carlo_seed_fixes_the_estimates():
+    _, (first, _, _) = _sampled(MonteCarloSettings(500, seed=7))
+    _, (again, _, _) = _sampled(MonteCarloSettings(500, seed=7))
+    _, (other, _, _) = _sampled(MonteCarloSettings(500, seed=8))
+
+    assert first == again
+    assert first != other
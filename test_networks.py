@@ -0,0 +1,98 @@
+import json
+
+import numpy as np
+import pytest
+
+from compiled import compile_network
+from conftest import node_ids, noisy_or_case
+from counterfactual import CounterfactualEngine, engine_for
+from networks import (
+    NETWORK_CACHE_META, NetworkValidationError, load_network_cache, network_cache_path,
+    read_network_cache, validate_networks,
+)
+
+FILENAME = "networks.json"
+
+
+def _bad_networks():
+    network, _ = noisy_or_case(1)
+    disease = node_ids(network, "Disease")[0]
+    symptom = node_ids(network, "Symptom")[0]
+
+    missing_parent = json.loads(json.dumps(network))
+    missing_parent[symptom]["parents"].append("no-such-node")
+
+    cycle = json.loads(json.dumps(network))
+    child = next(sid for sid in node_ids(network, "Symptom") if disease in network[sid]["parents"])
+    cycle[disease]["parents"].append(child)
+
+    bad_leak = json.loads(json.dumps(network))
+    bad_leak[disease]["cpt"][0] = "high"
+
+    bad_cpt = json.loads(json.dumps(network))
+    bad_cpt[symptom]["cpt"] = []
+
+    return {
+        "missing parent": (missing_parent, "is not in the network"),
+        "cycle": (cycle, "form a cycle"),
+        "bad leak": (bad_leak, "finite number"),
+        "bad cpt": (bad_cpt, "non-empty list"),
+        "not an object": ([], "expected an object of nodes"),
+    }
+
+
+@pytest.mark.parametrize("problem", list(_bad_networks()))
+def test_invalid_networks_are_rejected(problem):
+    network, message = _bad_networks()[problem]
+    with pytest.raises(NetworkValidationError, match=message):
+        validate_networks({"N": network})
+
+
+@pytest.fixture
+def datapath(tmp_path):
+    network_data = {name: noisy_or_case(seed)[0] for name, seed in (("A", 1), ("B", 2))}
+    (tmp_path / FILENAME).write_text(json.dumps(network_data), encoding="utf-8")
+    return tmp_path
+
+
+def _assert_same_networks(loaded, network_data):
+    assert list(loaded) == list(network_data)
+    for name, network in network_data.items():
+        expected = compile_network(network)
+        compiled = loaded[name]
+        assert compiled.node_ids == expected.node_ids
+        assert compiled.labels == expected.labels
+        for field, array in expected.to_arrays().items():
+            np.testing.assert_array_equal(compiled.to_arrays()[field], array)
+        np.testing.assert_array_equal(compiled.topological_levels(), expected.topological_levels())
+        engine = CounterfactualEngine(expected)
+        for field, array in engine.to_arrays().items():
+            np.testing.assert_array_equal(engine_for(compiled).to_arrays()[field], array)
+
+
+def test_network_cache_round_trip(datapath):
+    network_data = json.loads((datapath / FILENAME).read_text(encoding="utf-8"))
+    first = load_network_cache(datapath, FILENAME)
+    path = network_cache_path(datapath, FILENAME)
+    assert (path / NETWORK_CACHE_META).exists()
+
+    cached = load_network_cache(datapath, FILENAME)
+    _assert_same_networks(first, network_data)
+    _assert_same_networks(cached, network_data)
+    # Loaded from the memory-mapped cache, not compiled again
+    assert not cached["A"].link.flags.writeable
+
+
+@pytest.mark.parametrize("contents", [
+    {NETWORK_CACHE_META: json.dumps({"version": 0, "networks": []})},   # stale
+    {"0.link.npy": ""},                                                 # partial
+])
+def test_broken_network_cache_is_replaced(datapath, contents):
+    path = network_cache_path(datapath, FILENAME)
+    path.mkdir(parents=True)
+    for name, text in contents.items():
+        (path / name).write_text(text, encoding="utf-8")
+
+    network_data = json.loads((datapath / FILENAME).read_text(encoding="utf-8"))
+    _assert_same_networks(load_network_cache(datapath, FILENAME), network_data)
+    _assert_same_networks(read_network_cache(path), network_data)
@@ -0,0 +1,87 @@
+import copy
+import io
+import json
+
+import pytest
+
+from experiments import iter_vignettes_experiment
+from preprocessing import (
+    SEVERITY_MAPPING,
+    _iter_json_object,
+    convert_card_severity,
+    iter_casecards,
+    iter_vignettes,
+    save_vignettes_jsonl,
+)
+from synthetic import generate_dataset
+
+
+def _dataset(n_vignettes=12):
+    return generate_dataset({"A": (5, 10, 15)}, n_vignettes=n_vignettes, seed=0)
+
+
+# ------------------------------------------------------------------------
+# STREAMING LOADER
+# ------------------------------------------------------------------------
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_streaming_parser_matches_json_load(chunk_size):
+    _, vignettes = _dataset()
+    vignettes["float"] = {"value": 1.25e-3, "nested": [1, {"a": None}], "text": "}{,\"\\"}
+    text = json.dumps(vignettes, indent=2)
+    assert dict(_iter_json_object(io.StringIO(text), chunk_size)) == json.loads(text)
+
+
+def test_streaming_parser_empty_and_malformed():
+    assert list(_iter_json_object(io.StringIO(" { } "), 2)) == []
+    with pytest.raises(ValueError):
+        list(_iter_json_object(io.StringIO('["not", "an", "object"]'), 4))
+    with pytest.raises(ValueError):
+        list(_iter_json_object(io.StringIO('{"a": 1 "b": 2}'), 4))
+
+
+def test_json_and_jsonl_files_stream_the_same(tmp_path):
+    _, vignettes = _dataset()
+    json_path, jsonl_path = tmp_path / "v.json", tmp_path / "v.jsonl"
+    json_path.write_text(json.dumps(vignettes), encoding="utf-8")
+    save_vignettes_jsonl(vignettes, jsonl_path)
+
+    assert dict(iter_vignettes(json_path)) == vignettes
+    assert dict(iter_vignettes(jsonl_path)) == vignettes
+    assert [v_id for v_id, _ in iter_vignettes(jsonl_path, first_n=3)] == list(vignettes)[:3]
+
+
+def test_first_n_stops_reading(tmp_path):
+    _, vignettes = _dataset()
+    text = json.dumps(vignettes)
+    # Everything after the third entry is garbage: --first 3 must not reach it
+    cut = text.index(json.dumps(list(vignettes)[3]))
+    path = tmp_path / "v.json"
+    path.write_text(text[:cut] + "not json at all", encoding="utf-8")
+
+    casecards = list(iter_casecards(path, first_n=3))
+    assert [v_id for v_id, _ in casecards] == list(vignettes)[:3]
+    assert all("severity_numeric" in s for _, card in casecards for s in card["symptoms"])
+
+
+# ------------------------------------------------------------------------
+# SEVERITY CONVERSION
+# ------------------------------------------------------------------------
+def test_convert_card_severity_copy_leaves_card_untouched():
+    _, vignettes = _dataset()
+    card = next(iter(vignettes.values()))["card"]
+    before = copy.deepcopy(card)
+    converted = convert_card_severity(card, copy=True)
+
+    assert card == before
+    assert [s["severity_numeric"] for s in converted["symptoms"]] == [
+        SEVERITY_MAPPING[s["severity"]] for s in card["symptoms"]
+    ]
+
+
+def test_experiment_does_not_modify_caller_vignettes():
+    network_data, vignettes = _dataset()
+    before = copy.deepcopy(vignettes)
+    records = list(iter_vignettes_experiment(vignettes, network_data, first_n=5))
+
+    assert len(records) == 5
+    assert vignettes == before
@@ -0,0 +1,74 @@
+import random
+
+import numpy as np
+import pytest
+
+import preprocessing
+from compiled import MULTILAYER, ONE_HOP, compile_network
+from conftest import node_ids
+from counterfactual import counterfactual_scores, engine_for
+from session import DiagnosisSession
+
+
+def _expected(compiled, evidence, propagation):
+    """Posterior and counterfactuals of a fresh pass over `evidence`."""
+    diseases = compiled.disease_ids
+    symptoms = [compiled.node_ids[i] for i in compiled.symptom_idx]
+    scores = counterfactual_scores(
+        engine_for(compiled), evidence, diseases, symptoms, propagation=propagation
+    )
+    if propagation == MULTILAYER:
+        values = compiled.propagate(
+            compiled.evidence_vector(evidence), compiled.observed_mask(evidence)
+        )
+    else:
+        values = compiled.posterior(compiled.evidence_vector(evidence))
+    return {
+        "posterior": values[compiled.disease_idx],
+        "disablement": np.array([scores["disable"][d] for d in diseases]),
+        "sufficiency": np.array([scores["force"][d] for d in diseases]),
+    }
+
+
+# ------------------------------------------------------------------------
+# INCREMENTAL VS FULL
+# ------------------------------------------------------------------------
+@pytest.mark.parametrize("propagation", [ONE_HOP, MULTILAYER])
+def test_incremental_updates_match_a_full_pass(case, propagation):
+    network, evidence, diseases, symptoms = case
+    compiled = compile_network(network)
+    session = DiagnosisSession(compiled, propagation=propagation)
+    rng = random.Random(len(evidence))
+    risks = node_ids(network, "Risk")
+
+    steps = list(evidence.items()) + [(sid, None) for sid in rng.sample(list(evidence), 4)]
+    steps += [(rng.choice(symptoms), rng.uniform(0.1, 1.5)) for _ in range(6)]
+    steps += [(rng.choice(risks), 1.0), (rng.choice(diseases), 0.7)]
+    for nid, value in steps:
+        session.update({nid: value})
+        expected = _expected(compiled, session.evidence, propagation)
+        for method, scores in expected.items():
+            np.testing.assert_allclose(session.scores(method), scores, atol=1e-9)
+    assert any(session.scores("disablement")) or any(session.scores("sufficiency"))
+
+
+def test_named_updates_and_unknown_ids(case):
+    network, _, _, symptoms = case
+    session = DiagnosisSession(compile_network(network), severity_mapping={"MILD": 0.3})
+    session.add_symptom(symptoms[0], "mild")
+    session.change_severity(symptoms[0], "SEVERE")  # not in the mapping: 1.0
+    assert session.evidence == {symptoms[0]: 1.0}
+    with pytest.raises(KeyError):
+        session.update({symptoms[1]: 0.5, "not-a-node": 1.0})
+    assert session.evidence == {symptoms[0]: 1.0}
+    with pytest.raises(KeyError):
+        session.remove(symptoms[1])
+
+
+def test_mapping_is_read_when_the_session_is_created(case, monkeypatch):
+    network, _, _, symptoms = case
+    session = DiagnosisSession(compile_network(network))
+    monkeypatch.setattr(preprocessing, "SEVERITY_MAPPING", {"MILD": 0.123})
+    session.add_symptom(symptoms[0], "MILD")
+    assert session.evidence[symptoms[0]] != 0.123
+    assert DiagnosisSession(compile_network(network)).severity_value("MILD") == 0.123
@@ -0,0 +1,102 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from scipy.stats import binomtest
+
+from evaluation import evaluate
+from experiments import run_vignettes_experiment_raw
+from stats import (
+    ALL_STRATA, binomial_pvalues, bootstrap_intervals, bootstrap_ratios, resample_counts,
+    statistics_report, Outcomes,
+)
+from synthetic import generate_dataset
+
+HERE = Path(__file__).resolve().parent
+TOP_N = 5
+
+
+@pytest.fixture(scope="module")
+def run():
+    network_data, vignettes = generate_dataset({"A": (20, 30, 40)}, n_vignettes=60, seed=0)
+    posterior, disablement, sufficiency = run_vignettes_experiment_raw(vignettes, network_data)
+    results = {
+        v_id: {
+            "posterior": posterior[v_id],
+            "disablement": disablement[v_id],
+            "sufficiency": sufficiency[v_id],
+        }
+        for v_id in posterior
+    }
+    return results, vignettes
+
+
+def test_resample_counts_draw_every_row_set():
+    counts = resample_counts(7, 40, np.random.default_rng(0))
+    assert counts.shape == (40, 7)
+    assert (counts.sum(axis=1) == 7).all()
+
+
+def test_bootstrap_does_not_depend_on_workers():
+    rng = np.random.default_rng(0)
+    numer = rng.integers(0, 2, size=(50, 3)).astype(float)
+    denom = np.ones_like(numer)
+    serial = bootstrap_ratios(numer, denom, n_resamples=600, seed=3, workers=1)
+    parallel = bootstrap_ratios(numer, denom, n_resamples=600, seed=3, workers=2)
+    assert serial.shape == (600, 3)
+    np.testing.assert_array_equal(serial, parallel)
+
+
+def test_interval_estimates_match_evaluate(run):
+    results, vignettes = run
+    report = evaluate(results, vignettes, N=TOP_N)
+    intervals = bootstrap_intervals(Outcomes(results, vignettes), N=TOP_N, n_resamples=100)
+    for method, expected in report.items():
+        overall = intervals[method]
+        assert overall["topn"][ALL_STRATA]["estimate"] == pytest.approx(list(expected["topn"]))
+        assert overall["doctor"][ALL_STRATA]["estimate"] == pytest.approx(expected["doctor"])
+        for entry in overall["topn"].values():
+            assert all(lo <= hi for lo, hi in zip(entry["low"], entry["high"]) if lo is not None)
+
+
+def test_binomial_pvalues_match_scipy():
+    successes, trials, p = [3, 0, 9, 4], [10, 5, 12, 0], [0.2, 0.5, 0.6, 0.3]
+    pvalues = binomial_pvalues(successes, trials, p)
+    for k, n, q, value in zip(successes[:3], trials[:3], p[:3], pvalues[:3]):
+        assert value == pytest.approx(binomtest(k, n, q, alternative="greater").pvalue)
+    assert np.isnan(pvalues[3])
+
+
+def test_statistics_report_cache(run, tmp_path):
+    results, vignettes = run
+    cache_path = tmp_path / "stats.json"
+    kwargs = {"N": TOP_N, "n_resamples": 50, "cache_path": cache_path}
+    report = statistics_report(results, vignettes, **kwargs)
+    assert json.loads(cache_path.read_text(encoding="utf-8"))["report"] == report
+
+    # Same outcomes and settings: the stored report is returned as is
+    cached = json.loads(cache_path.read_text(encoding="utf-8"))
+    cached["report"]["marker"] = True
+    cache_path.write_text(json.dumps(cached), encoding="utf-8")
+    assert statistics_report(results, vignettes, **kwargs)["marker"] is True
+
+    # Different settings: recomputed and the cache replaced
+    recomputed = statistics_report(results, vignettes, **kwargs | {"seed": 1})
+    assert "marker" not in recomputed
+    assert "marker" not in json.loads(cache_path.read_text(encoding="utf-8"))["report"]
+
+
+@pytest.mark.parametrize("args, message", [
+    (["--resamples", "0"], "--resamples"),
+    (["--confidence", "1.5"], "--confidence"),
+])
+def test_results_cli_rejects_bad_settings(args, message):
+    proc = subprocess.run(
+        [sys.executable, "results.py", *args], cwd=HERE, capture_output=True, text=True,
+        timeout=120,
+    )
+    assert proc.returncode != 0
+    assert message in proc.stderr
@@ -0,0 +1,96 @@
+import json
+import sys
+
+import pytest
+
+import run
+from constants import NETWORKS_FILE, RESULTS_FILE, RESULTS_STREAM_FILE, VIGNETTES_FILE
+from experiments import run_vignettes_experiment
+from streaming import (
+    ResultStreamWriter,
+    completed_ids,
+    iter_result_stream,
+    repair_stream,
+    save_results_from_stream,
+)
+from synthetic import generate_dataset
+from utils import load_from_json
+
+
+def _record(v_id, value):
+    return v_id, {"S1": value, "D1": value / 2}, {"D1": value}, {"D1": -value}
+
+
+def _write(path, *records):
+    with ResultStreamWriter(path) as writer:
+        for record in records:
+            writer.write(*record)
+
+
+# ------------------------------------------------------------------------
+# STREAM
+# ------------------------------------------------------------------------
+def test_partial_last_line_is_ignored_and_repaired(tmp_path):
+    path = tmp_path / "s.jsonl"
+    _write(path, _record("a", 0.5), _record("b", 0.25))
+    with open(path, "ab") as f:
+        f.write(b'{"id": "c", "posterior": {"S1"')  # crash mid-write
+
+    assert completed_ids(path) == {"a", "b"}
+    repair_stream(path)
+    _write(path, _record("c", 1.0))
+    assert [record["id"] for record in iter_result_stream(path)] == ["a", "b", "c"]
+
+
+def test_corrupt_line_is_skipped(tmp_path):
+    path = tmp_path / "s.jsonl"
+    _write(path, _record("a", 0.5))
+    with open(path, "ab") as f:
+        f.write(b"not json\n")
+    _write(path, _record("b", 0.25))
+    assert completed_ids(path) == {"a", "b"}
+
+
+def test_final_outputs_keep_the_latest_record(tmp_path):
+    path = tmp_path / "s.jsonl"
+    _write(path, _record("a", 0.5), _record("b", 0.25), _record("a", 0.75))
+    save_results_from_stream(path, tmp_path)
+
+    results = load_from_json(tmp_path / RESULTS_FILE)
+    assert list(results) == ["a", "b"]
+    assert results["a"]["disablement"] == {"D1": 0.75}
+
+
+# ------------------------------------------------------------------------
+# RESUME
+# ------------------------------------------------------------------------
+@pytest.fixture
+def datapath(tmp_path):
+    network_data, vignettes = generate_dataset({"A": (5, 10, 15)}, n_vignettes=8, seed=5)
+    path = tmp_path / "data"
+    path.mkdir()
+    (path / NETWORKS_FILE).write_text(json.dumps(network_data), encoding="utf-8")
+    (path / VIGNETTES_FILE).write_text(json.dumps(vignettes), encoding="utf-8")
+    return path
+
+
+def _run(monkeypatch, datapath, results, *flags):
+    argv = ["run.py", "--datapath", str(datapath), "--results", str(results), *flags]
+    monkeypatch.setattr(sys, "argv", argv)
+    args = run.parse_args()
+    results.mkdir(parents=True, exist_ok=True)
+    run_vignettes_experiment(args=args)
+    return load_from_json(results / RESULTS_FILE)
+
+
+def test_resumed_run_matches_a_clean_run(monkeypatch, datapath, tmp_path):
+    clean = _run(monkeypatch, datapath, tmp_path / "clean")
+
+    resumed_dir = tmp_path / "resumed"
+    _run(monkeypatch, datapath, resumed_dir, "--first", "3")
+    stream = resumed_dir / RESULTS_STREAM_FILE
+    with open(stream, "ab") as f:
+        f.write(b'{"id": "half-written')
+    resumed = _run(monkeypatch, datapath, resumed_dir, "--resume")
+
+    assert resumed == clean
@@ -0,0 +1,63 @@
+import random
+
+import numpy as np
+import pytest
+
+from preprocessing import SEVERITY_MAPPING
+from sweep import run_sweep
+from synthetic import SEVERITY_LEVELS, generate_dataset
+
+SEVERITY_MAPPINGS = {
+    "default": SEVERITY_MAPPING,
+    "soft": {**SEVERITY_MAPPING, "MILD": 0.05, "MODERATE": 0.1, "PRESENT": 0.2, "SEVERE": 0.3},
+}
+RISK_BOOSTS = (0.2, 20.0)
+THRESHS = (None, 0.9)
+
+
+def _dataset(seed=4):
+    """
+    Synthetic vignettes that also report a few disease nodes, on a network
+    with disease leaks outside [0, 1]: otherwise every counterfactual is 0.0
+    and the severity mapping never reaches a score.
+    """
+    network_data, vignettes = generate_dataset({"A": (10, 30, 40)}, n_vignettes=40, seed=seed)
+    rng = random.Random(seed)
+    network = network_data["A"]
+    diseases = [nid for nid, node in network.items() if node["label"] == "Disease"]
+    for did in diseases:
+        network[did]["cpt"][0] = rng.uniform(-1.5, 2.0)
+    for vignette in vignettes.values():
+        vignette["card"]["symptoms"] += [
+            {"concept": {"id": did}, "label": "Symptom", "severity": rng.choice(SEVERITY_LEVELS)}
+            for did in rng.sample(diseases, 3)
+        ]
+    return network_data, vignettes
+
+
+def _table(table):
+    return {
+        (row["severity"], row["risk_boost"], row["thresh"], row["method"]): row["topn"]
+        for row in table
+    }
+
+
+@pytest.mark.parametrize("row_chunk", [1, 3, 8, 1000])
+def test_stacked_settings_match_one_setting_at_a_time(row_chunk):
+    network_data, vignettes = _dataset()
+    table = _table(run_sweep(
+        vignettes, network_data, risk_boosts=RISK_BOOSTS, threshs=THRESHS,
+        severity_mappings=SEVERITY_MAPPINGS, row_chunk=row_chunk,
+    ))
+
+    assert len(table) == len(SEVERITY_MAPPINGS) * len(RISK_BOOSTS) * len(THRESHS) * 3
+    # The settings must disagree somewhere, or a mixed-up block would go unnoticed
+    assert len({tuple(topn) for topn in table.values()}) > 3
+    for name, mapping in SEVERITY_MAPPINGS.items():
+        for boost in RISK_BOOSTS:
+            alone = _table(run_sweep(
+                vignettes, network_data, risk_boosts=(boost,), threshs=THRESHS,
+                severity_mappings={name: mapping},
+            ))
+            for key, topn in alone.items():
+                np.testing.assert_array_equal(table[key], topn)